@@ -21,10 +21,10 @@ def find_hot_deals():
         pipeline = [
             {'$match': {
                 'is_advertisement': True,
-                'resale_score': {'$gte': 75},
+                'resale_total_score': {'$gte': 75},
                 'price': {'$lte': 6000}  # Até R$ 6k
             }},
-            {'$sort': {'resale_score': -1}},
+            {'$sort': {'resale_total_score': -1}},
             {'$limit': 10}
         ]
         
@@ -38,7 +38,7 @@ def find_hot_deals():
         print("=" * 80)
         
         for i, ad in enumerate(hot_deals, 1):
-            score = ad.get('resale_score', 0)
+            score = ad.get('resale_total_score', 0)
             emoji = "🔥🔥🔥" if score >= 85 else "🔥🔥"
             
             print(f"\n{i}. {emoji} {ad.get('brand', 'N/A')} {ad.get('model', 'N/A')}")
@@ -60,7 +60,7 @@ def compare_deals():
             'brand': {'$regex': 'Duotone', '$options': 'i'},
             'size': '12m',
             'equipment_type': 'kite'
-        }).sort('resale_score', -1).limit(5))
+        }).sort('resale_total_score', -1).limit(5))
         
         if len(kites) < 2:
             print("❌ Poucos kites Duotone 12m para comparar")
@@ -68,7 +68,7 @@ def compare_deals():
         
         print("=" * 80)
         for i, kite in enumerate(kites, 1):
-            score = kite.get('resale_score', 0)
+            score = kite.get('resale_total_score', 0)
             price = kite.get('price', 0)
             
             print(f"\n{i}. {kite.get('model', 'N/A')} ({kite.get('year', 'N/A')})")
@@ -90,15 +90,15 @@ def analyze_brand_potential():
             {'$match': {
                 'is_advertisement': True,
                 'brand': {'$ne': None},
-                'resale_score': {'$ne': None}
+                'resale_total_score': {'$ne': None}
             }},
             {'$group': {
                 '_id': '$brand',
-                'avg_score': {'$avg': '$resale_score'},
+                'avg_score': {'$avg': '$resale_total_score'},
                 'avg_price': {'$avg': '$price'},
                 'count': {'$sum': 1},
                 'high_potential': {
-                    '$sum': {'$cond': [{'$gte': ['$resale_score', 70]}, 1, 0]}
+                    '$sum': {'$cond': [{'$gte': ['$resale_total_score', 70]}, 1, 0]}
                 }
             }},
             {'$sort': {'avg_score': -1}},
@@ -134,8 +134,8 @@ def recent_opportunities():
         recent = list(db.db.equipment_ads.find({
             'is_advertisement': True,
             'analyzed_at': {'$gte': cutoff},
-            'resale_score': {'$gte': 65}
-        }).sort('resale_score', -1).limit(10))
+            'resale_total_score': {'$gte': 65}
+        }).sort('resale_total_score', -1).limit(10))
         
         if not recent:
             print("❌ Nenhuma oportunidade nas últimas 48h")
@@ -148,7 +148,7 @@ def recent_opportunities():
             hours_ago = (datetime.utcnow() - ad['analyzed_at']).total_seconds() / 3600
             
             print(f"\n{i}. {ad.get('brand', 'N/A')} {ad.get('model', 'N/A')}")
-            print(f"   Score: {ad.get('resale_score', 0)}/100")
+            print(f"   Score: {ad.get('resale_total_score', 0)}/100")
             print(f"   Preço: R$ {ad.get('price', 0):.2f}")
             print(f"   ⏰ Há {hours_ago:.1f}h")
             print(f"   📍 {ad.get('city', 'N/A')}/{ad.get('state', 'N/A')}")
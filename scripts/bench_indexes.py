@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Benchmark do perfil de índices de equipment_ads
+
+Compara o conjunto antigo de índices (8 simples + composto + texto) com o
+perfil atual (parciais em is_advertisement) em:
+  - throughput de upserts em lote (como save_equipment_ads)
+  - plano de execução (explain) dos formatos de consulta de search_ads,
+    get_recent_ads, get_high_potential_ads e query_db
+
+Usa databases separados (kitesurf_bench_idx_*). Requer MongoDB rodando.
+
+USO:
+  python scripts/bench_indexes.py [n_anuncios] [--keep]
+"""
+import sys
+import time
+from pathlib import Path
+from datetime import datetime, timedelta
+
+# Adicionar path do projeto
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+from src.database import MongoDBPersistence
+from bench_statistics import synthetic_ad
+
+BATCH = 500
+
+# Índices de equipment_ads antes do perfil parcial
+LEGACY_INDEXES = [
+    [("post_id", ASCENDING)],
+    [("analyzed_at", DESCENDING)],
+    [("is_advertisement", ASCENDING)],
+    [("equipment_type", ASCENDING)],
+    [("brand", ASCENDING)],
+    [("state", ASCENDING)],
+    [("price", ASCENDING)],
+    [("resale_score", DESCENDING)],
+    [("is_advertisement", ASCENDING), ("equipment_type", ASCENDING), ("brand", ASCENDING)],
+    [("description", "text"), ("brand", "text"), ("model", "text")],
+]
+
+
+def query_shapes():
+    """Formatos de consulta usados pelo código (filtro, ordenação)"""
+    recent = [('posted_at', DESCENDING), ('_id', DESCENDING)]
+    score = [('resale_total_score', DESCENDING), ('_id', DESCENDING)]
+    cutoff = datetime.utcnow() - timedelta(hours=24)
+    not_sold = {'$nin': ['reservado', 'vendido']}
+    return {
+        'search (sem filtro)': ({'is_advertisement': True}, recent),
+        'search type=kite': ({'is_advertisement': True, 'equipment_type': 'kite'}, recent),
+        'search brand=duotone': ({'is_advertisement': True, 'brand_key': 'duotone'}, recent),
+        'search state+preço': (
+            {'is_advertisement': True, 'state': 'CE', 'price': {'$lte': 5000}}, recent
+        ),
+        'recent 24h': ({'is_advertisement': True, 'posted_at': {'$gte': cutoff}}, recent),
+        'potential 70': (
+            {'is_advertisement': True, 'resale_total_score': {'$gte': 70},
+             'availability_status': not_sold}, score
+        ),
+        'potential 70 type=kite': (
+            {'is_advertisement': True, 'resale_total_score': {'$gte': 70},
+             'equipment_type': 'kite', 'availability_status': not_sold}, score
+        ),
+    }
+
+
+def write_throughput(collection, n: int) -> float:
+    """Upserts em lote não ordenados (documentos/segundo)"""
+    start = time.perf_counter()
+    operations = []
+    for i in range(n):
+        doc = synthetic_ad(i)
+        operations.append(UpdateOne({'post_id': doc['post_id']}, {'$set': doc}, upsert=True))
+        if len(operations) == BATCH:
+            collection.bulk_write(operations, ordered=False)
+            operations = []
+    if operations:
+        collection.bulk_write(operations, ordered=False)
+    return n / (time.perf_counter() - start)
+
+
+def plan_summary(collection, query, sort) -> str:
+    """Índice usado, chaves e documentos examinados"""
+    explain = collection.find(query).sort(sort).limit(20).explain()
+    stats = explain.get('executionStats', {})
+
+    stage = explain['queryPlanner']['winningPlan']
+    index_name = None
+    stages = []
+    while stage:
+        stages.append(stage.get('stage'))
+        index_name = stage.get('indexName', index_name)
+        stage = stage.get('inputStage') or (stage.get('inputStages') or [None])[0]
+
+    return (
+        f"{'>'.join(s for s in stages if s):<28} {index_name or '-':<22} "
+        f"keys={stats.get('totalKeysExamined', '?'):<6} docs={stats.get('totalDocsExamined', '?')}"
+    )
+
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    n = int(args[0]) if args else 100_000
+    keep = '--keep' in sys.argv
+
+    legacy = MongoDBPersistence(database_name="kitesurf_bench_idx_legacy")
+    profile = MongoDBPersistence(database_name="kitesurf_bench_idx_profile")
+
+    try:
+        # Perfil antigo: recria só os índices legados
+        legacy.db.equipment_ads.drop_indexes()
+        for keys in LEGACY_INDEXES:
+            legacy.db.equipment_ads.create_index(keys, unique=keys == [("post_id", ASCENDING)])
+
+        profile.ensure_indexes(force=True)
+
+        print(f"\n⏱️  BENCHMARK DE ÍNDICES ({n} anúncios, lotes de {BATCH})\n")
+        for label, db in (('antigo', legacy), ('parcial', profile)):
+            indexes = len(db.db.equipment_ads.index_information())
+            rate = write_throughput(db.db.equipment_ads, n)
+            size = db.db.command('collStats', 'equipment_ads').get('totalIndexSize', 0)
+            print(f"  {label:<8} {indexes:>2} índices | {rate:>9.0f} upserts/s | "
+                  f"índices: {size / 1024 / 1024:.1f} MB")
+
+        # Segunda passada = updates (documentos já existem)
+        print("\n  Re-upsert (documentos existentes):")
+        for label, db in (('antigo', legacy), ('parcial', profile)):
+            rate = write_throughput(db.db.equipment_ads, n)
+            print(f"  {label:<8} {rate:>9.0f} upserts/s")
+
+        print("\n🔎 PLANOS (perfil parcial)\n")
+        for name, (query, sort) in query_shapes().items():
+            print(f"  {name:<24} {plan_summary(profile.db.equipment_ads, query, sort)}")
+
+        print("\n🔎 PLANOS (antigo)\n")
+        for name, (query, sort) in query_shapes().items():
+            print(f"  {name:<24} {plan_summary(legacy.db.equipment_ads, query, sort)}")
+
+    finally:
+        if not keep:
+            legacy.client.drop_database("kitesurf_bench_idx_legacy")
+            profile.client.drop_database("kitesurf_bench_idx_profile")
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Benchmark de estatísticas: versão antiga (~8 consultas + mediana em
+Python) vs pipeline único com $facet (compute_statistics) vs leitura
+da collection materializada (get_statistics)
+
+Popula um database separado (kitesurf_bench) com anúncios sintéticos.
+Requer MongoDB 7+ (ex: docker-compose up -d mongodb).
+
+USO:
+  python scripts/bench_statistics.py [tamanhos...] [--keep]
+  python scripts/bench_statistics.py 100000 1000000
+"""
+import sys
+import time
+import random
+import statistics
+from pathlib import Path
+from datetime import datetime, timedelta
+
+# Adicionar path do projeto
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from src.database import MongoDBPersistence
+from src.brand_normalizer import BrandNormalizer
+
+BENCH_DB = "kitesurf_bench"
+RUNS = 5
+
+TYPES = ['kite', 'board', 'bar', 'harness', 'wetsuit', 'complete_set']
+BRANDS = ['Duotone', 'North', 'Core', 'Cabrinha', 'Slingshot', 'Ozone', 'Naish', 'F-One', None]
+STATES = ['CE', 'SP', 'RJ', 'SC', 'BA', 'RN', 'PI', None]
+
+
+def synthetic_ad(i: int) -> dict:
+    """Gera um anúncio sintético com distribuição parecida com a real"""
+    price = random.choice([None, round(random.lognormvariate(8.2, 0.6), 2)])
+    brand = random.choice(BRANDS)
+    return {
+        'post_id': f'bench_{i}',
+        'post_url': f'https://facebook.com/groups/bench/posts/{i}',
+        'is_advertisement': random.random() < 0.8,
+        'confidence_score': random.random(),
+        'equipment_type': random.choice(TYPES),
+        'brand': brand,
+        'brand_key': BrandNormalizer.canonical_key(brand),
+        'model': 'Model X',
+        'year': random.randint(2015, 2025),
+        'condition': random.choice(['novo', 'seminovo', 'usado']),
+        'has_repair': random.random() < 0.15,
+        'price': price,
+        'state': random.choice(STATES),
+        'description': 'Vendo equipamento em ótimo estado ' * 5,
+        'resale_total_score': round(random.uniform(20, 95), 1),
+        'analyzed_at': datetime.utcnow() - timedelta(minutes=i),
+        'posted_at': datetime.utcnow() - timedelta(minutes=i, hours=random.randint(0, 48)),
+    }
+
+
+def seed(db: MongoDBPersistence, size: int):
+    """Popula equipment_ads até ter `size` documentos"""
+    current = db.db.equipment_ads.estimated_document_count()
+    if current >= size:
+        return
+
+    print(f"  Populando {size - current} anúncios...")
+    batch = []
+    for i in range(current, size):
+        batch.append(synthetic_ad(i))
+        if len(batch) == 10000:
+            db.db.equipment_ads.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        db.db.equipment_ads.insert_many(batch, ordered=False)
+
+
+def legacy_statistics(db) -> dict:
+    """Implementação anterior (uma consulta por bloco, mediana em Python)"""
+    stats = {
+        'total_raw_posts': db.raw_posts.count_documents({}),
+        'total_ads': db.equipment_ads.count_documents({'is_advertisement': True}),
+    }
+
+    stats['by_equipment_type'] = list(db.equipment_ads.aggregate([
+        {'$match': {'is_advertisement': True}},
+        {'$group': {'_id': '$equipment_type', 'count': {'$sum': 1}, 'avg_price': {'$avg': '$price'}}}
+    ]))
+    stats['top_brands'] = list(db.equipment_ads.aggregate([
+        {'$match': {'is_advertisement': True, 'brand': {'$ne': None}}},
+        {'$group': {'_id': '$brand', 'count': {'$sum': 1}}},
+        {'$sort': {'count': -1}},
+        {'$limit': 10}
+    ]))
+    stats['by_state'] = list(db.equipment_ads.aggregate([
+        {'$match': {'is_advertisement': True, 'state': {'$ne': None}}},
+        {'$group': {'_id': '$state', 'count': {'$sum': 1}}},
+        {'$sort': {'count': -1}}
+    ]))
+
+    price_stats = list(db.equipment_ads.aggregate([
+        {'$match': {'is_advertisement': True, 'price': {'$ne': None}}},
+        {'$group': {
+            '_id': None,
+            'avg': {'$avg': '$price'},
+            'min': {'$min': '$price'},
+            'max': {'$max': '$price'},
+            'median': {'$push': '$price'}
+        }}
+    ], allowDiskUse=True))
+    if price_stats:
+        prices = sorted(price_stats[0]['median'])
+        stats['median'] = prices[len(prices) // 2] if prices else None
+
+    stats['with_repair'] = db.equipment_ads.count_documents({
+        'is_advertisement': True, 'has_repair': True
+    })
+    stats['resale'] = list(db.equipment_ads.aggregate([
+        {'$match': {'is_advertisement': True, 'resale_total_score': {'$ne': None}}},
+        {'$group': {
+            '_id': None,
+            'avg_score': {'$avg': '$resale_total_score'},
+            'high': {'$sum': {'$cond': [{'$gte': ['$resale_total_score', 70]}, 1, 0]}}
+        }}
+    ]))
+    return stats
+
+
+def measure(fn) -> tuple:
+    """Executa fn RUNS vezes; retorna (mediana, melhor) em ms"""
+    timings = []
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), min(timings)
+
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    sizes = [int(a) for a in args] or [100_000, 1_000_000]
+    keep = '--keep' in sys.argv
+
+    db = MongoDBPersistence(database_name=BENCH_DB)
+
+    print(f"\n⏱️  BENCHMARK estatísticas ({RUNS} execuções por cenário)\n")
+    print(f"{'anúncios':>10} | {'antigo (ms)':>16} | {'$facet (ms)':>16} | "
+          f"{'materializado (ms)':>18} | ganho")
+    print("-" * 83)
+
+    try:
+        for size in sorted(sizes):
+            seed(db, size)
+
+            try:
+                old_median, old_best = measure(lambda: legacy_statistics(db.db))
+                old = f"{old_median:8.1f} ({old_best:.0f})"
+            except Exception as e:
+                # Com muitos preços o $push passa de 16MB e a versão antiga falha
+                old_median, old = None, f"falhou: {type(e).__name__}"
+
+            new_median, new_best = measure(db.compute_statistics)
+            gain = f"{old_median / new_median:.1f}x" if old_median else "-"
+
+            # Dados semeados direto na collection: reconstrói os contadores
+            db.rebuild_statistics()
+            mat_median, mat_best = measure(db.get_statistics)
+
+            print(f"{size:>10} | {old:>16} | {new_median:8.1f} ({new_best:.0f}) | "
+                  f"{mat_median:12.2f} ({mat_best:.1f}) | {gain}")
+
+    finally:
+        if not keep:
+            db.client.drop_database(BENCH_DB)
+        db.close()
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Benchmark de working set: anúncios com os campos volumosos inline (versão
+antiga) vs documentos compactos em equipment_ads + ad_details
+
+Popula um database separado (kitesurf_bench_ws) com o layout antigo, mede,
+roda migrate_ad_details() + compact e mede de novo. O "lido para o cache"
+é o delta de bytes read into cache do WiredTiger durante as consultas:
+para ver o efeito, suba o mongod com cache menor que a collection inline
+(ex: --wiredTigerCacheSizeGB 0.25). Requer MongoDB.
+
+USO:
+  python scripts/bench_working_set.py [anúncios] [--keep]
+  python scripts/bench_working_set.py 1000000
+"""
+import sys
+import time
+import random
+import statistics
+from pathlib import Path
+from datetime import datetime, timedelta
+
+# Adicionar path do projeto
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from pymongo.errors import OperationFailure
+from src.database import MongoDBPersistence
+from src.brand_normalizer import BrandNormalizer
+from src.resale_scorer import ResaleScorer
+
+BENCH_DB = "kitesurf_bench_ws"
+RUNS = 5
+MB = 1024 * 1024
+
+TYPES = ['kite', 'board', 'bar', 'harness', 'wetsuit', 'complete_set']
+BRANDS = ['Duotone', 'North', 'Core', 'Cabrinha', 'Slingshot', 'Ozone', 'Naish', 'F-One', None]
+STATES = ['CE', 'SP', 'RJ', 'SC', 'BA', 'RN', 'PI', None]
+SENTENCES = [
+    'Vendo equipamento em ótimo estado, sempre lavado com água doce após o uso.',
+    'Acompanha bolsa original, bomba e cordinha de segurança.',
+    'Nunca teve reparo, sem furos na bladder e costuras íntegras.',
+    'Usado em poucas sessões no Cumbuco e em Jeri durante a temporada.',
+    'Aceito troca por prancha twintip menor ou kite de 9m com volta.',
+    'Entrego em Fortaleza e região; envio para outros estados pelos Correios.',
+]
+
+
+def synthetic_ad(i: int) -> dict:
+    """Anúncio sintético com os campos volumosos de uma análise real"""
+    price = random.choice([None, round(random.lognormvariate(8.2, 0.6), 2)])
+    brand = random.choice(BRANDS)
+    score = round(random.uniform(20, 95), 1)
+    posted_at = datetime.utcnow() - timedelta(minutes=i, hours=random.randint(0, 48))
+    return {
+        'post_id': f'bench_{i}',
+        'post_url': f'https://facebook.com/groups/bench/posts/{i}',
+        'is_advertisement': random.random() < 0.8,
+        'confidence_score': random.random(),
+        'equipment_type': random.choice(TYPES),
+        'brand': brand,
+        'brand_key': BrandNormalizer.canonical_key(brand),
+        'model': 'Model X',
+        'year': random.randint(2015, 2025),
+        'size': f'{random.randint(5, 14)}m',
+        'condition': random.choice(['novo', 'seminovo', 'usado']),
+        'has_repair': random.random() < 0.15,
+        'price': price,
+        'state': random.choice(STATES),
+        'city': 'Fortaleza',
+        'seller_name': f'Vendedor {i % 5000}',
+        'description': ' '.join(random.choices(SENTENCES, k=random.randint(6, 14))),
+        'analysis_notes': ' '.join(random.choices(SENTENCES, k=3)),
+        'additional_items_detailed': random.choices(SENTENCES, k=random.randint(0, 4)),
+        'resale_score': {
+            'total_score': score,
+            'classification': 'good',
+            'recommendation': ' '.join(random.choices(SENTENCES, k=2)),
+            'breakdown': ResaleScorer._generate_breakdown({
+                'brand_score': random.uniform(0, 25),
+                'condition_score': random.uniform(0, 25),
+                'price_score': random.uniform(0, 25),
+                'interest_score': random.uniform(0, 25)
+            })
+        },
+        'resale_total_score': score,
+        'analyzed_at': posted_at,
+        'posted_at': posted_at,
+    }
+
+
+def seed(db: MongoDBPersistence, size: int):
+    """Popula equipment_ads no layout antigo (campos volumosos inline)"""
+    print(f"  Populando {size} anúncios (layout inline)...")
+    random.seed(42)
+    batch = []
+    for i in range(size):
+        batch.append(synthetic_ad(i))
+        if len(batch) == 10000:
+            db.db.equipment_ads.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        db.db.equipment_ads.insert_many(batch, ordered=False)
+
+
+def collection_sizes(db: MongoDBPersistence, name: str) -> dict:
+    """collStats resumido (MB)"""
+    stats = db.db.command('collStats', name)
+    return {
+        'count': stats.get('count', 0),
+        'avg': stats.get('avgObjSize', 0),
+        'size': stats.get('size', 0) / MB,
+        'storage': stats.get('storageSize', 0) / MB,
+    }
+
+
+def cache_bytes_read(db: MongoDBPersistence) -> int:
+    """Bytes lidos do disco para o cache do WiredTiger (serverStatus)"""
+    status = db.client.admin.command('serverStatus')
+    return status['wiredTiger']['cache']['bytes read into cache']
+
+
+def workload(db: MongoDBPersistence):
+    """Consultas das listagens e estatísticas (não pedem campos frios)"""
+    db.compute_statistics()
+    db.search_ads(equipment_type='kite', max_price=8000, limit=100, projection='summary')
+    db.get_high_potential_ads(min_score=70, limit=100, projection='summary')
+    db.get_recent_ads(hours=72, limit=100, projection='card')
+
+
+def measure(db: MongoDBPersistence) -> tuple:
+    """Executa o workload RUNS vezes; retorna (mediana ms, MB lidos para o cache)"""
+    timings = []
+    before = cache_bytes_read(db)
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        workload(db)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), (cache_bytes_read(db) - before) / MB
+
+
+def report(label: str, db: MongoDBPersistence):
+    ads = collection_sizes(db, 'equipment_ads')
+    details = collection_sizes(db, 'ad_details')
+    median, cache_mb = measure(db)
+    print(f"{label:>8} | {ads['avg']:>9.0f} B | {ads['size']:>9.1f} MB | {ads['storage']:>9.1f} MB | "
+          f"{details['size']:>10.1f} MB | {median:>9.0f} | {cache_mb:>8.1f} MB")
+
+
+def compact(db: MongoDBPersistence, name: str):
+    """Devolve ao disco o espaço liberado pela migração"""
+    try:
+        db.db.command('compact', name)
+    except OperationFailure as e:
+        print(f"  compact {name} indisponível: {e}")
+
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    size = int(args[0]) if args else 1_000_000
+    keep = '--keep' in sys.argv
+
+    db = MongoDBPersistence(database_name=BENCH_DB)
+
+    print(f"\n⏱️  BENCHMARK working set: {size} anúncios ({RUNS} execuções do workload)\n")
+
+    try:
+        db.client.drop_database(BENCH_DB)
+        db.ensure_indexes(force=True)
+        seed(db, size)
+        db.rebuild_statistics()
+
+        print()
+        print(f"{'layout':>8} | {'doc médio':>11} | {'ads (dados)':>12} | {'ads (disco)':>12} | "
+              f"{'ad_details':>13} | {'tempo (ms)':>9} | {'lido p/ cache':>11}")
+        print("-" * 95)
+        report('inline', db)
+
+        start = time.perf_counter()
+        db.migrate_ad_details(batch_size=5000)
+        compact(db, 'equipment_ads')
+        migration = time.perf_counter() - start
+
+        report('split', db)
+        print(f"\n  Migração + compact: {migration:.0f}s")
+
+    finally:
+        if not keep:
+            db.client.drop_database(BENCH_DB)
+        db.close()
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Benchmark de escrita em coletas sobrepostas: upsert com $set do documento
+inteiro (versão antiga) vs content_hash (pula documentos sem alteração e
+grava só os campos alterados)
+
+Cada rodada salva os mesmos posts/anúncios de novo com uma fração deles
+alterada, como numa coleta incremental que repete as últimas horas.
+Popula um database separado (kitesurf_bench_writes). Requer MongoDB.
+
+USO:
+  python scripts/bench_writes.py [posts] [fração_alterada] [--keep]
+  python scripts/bench_writes.py 20000 0.05
+"""
+import sys
+import time
+import random
+from pathlib import Path
+from datetime import datetime
+from bson import BSON
+
+# Adicionar path do projeto
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from pymongo import UpdateOne
+from src.database import MongoDBPersistence
+from src.models import FacebookPost, EquipmentAd, AnalysisStatus
+
+BENCH_DB = "kitesurf_bench_writes"
+ROUNDS = 3
+
+
+def synthetic_post(i: int, revision: int) -> FacebookPost:
+    """Post sintético; revision muda o engajamento (e a cada 3 o texto)"""
+    return FacebookPost(
+        post_id=f'bench_{i}',
+        url=f'https://facebook.com/groups/bench/posts/{i}',
+        time='2024-05-10T12:00:00.000Z',
+        user_name=f'Vendedor {i % 500}',
+        text='Vendo kite Duotone Rebel 12m, ótimo estado, sem reparos. ' * 4
+             + ('Baixei o preço!' if revision % 3 == 2 else ''),
+        title=None,
+        price='R$ 5.000',
+        location='Fortaleza, CE',
+        group_url='https://facebook.com/groups/bench',
+        group_title='Kitesurf Classificados',
+        likes_count=i % 40 + revision,
+        comments_count=2,
+        shares_count=0,
+        images=[f'https://scontent.example/{i}_{n}.jpg' for n in range(4)],
+        comments=[{'text': 'Ainda disponível?', 'author': 'x'}, {'text': 'Aceita troca?', 'author': 'y'}]
+    )
+
+
+def synthetic_ad(i: int, revision: int) -> EquipmentAd:
+    """Anúncio sintético; revision muda o preço"""
+    return EquipmentAd(
+        post_id=f'bench_{i}',
+        post_url=f'https://facebook.com/groups/bench/posts/{i}',
+        scraped_at='2024-05-10T12:00:00.000Z',
+        analyzed_at='',
+        is_advertisement=True,
+        confidence_score=0.95,
+        equipment_type='kite',
+        brand='Duotone',
+        model='Rebel',
+        size='12m',
+        price=5000.0 - 100 * revision,
+        state='CE',
+        city='Fortaleza',
+        description='Kite Duotone Rebel 12m em ótimo estado, acompanha bolsa e bomba. ' * 3,
+        seller_name=f'Vendedor {i % 500}'
+    )
+
+
+def legacy_operations(posts, ads):
+    """Operações da versão antiga ($set do documento inteiro)"""
+    post_ops = []
+    for post in posts:
+        doc = post.to_dict()
+        doc['scraped_at'] = datetime.utcnow()
+        post_ops.append(UpdateOne(
+            {'post_id': post.post_id},
+            {'$set': doc, '$setOnInsert': {'analysis_status': AnalysisStatus.PENDING.value}},
+            upsert=True
+        ))
+    ad_ops = []
+    for ad in ads:
+        doc = ad.to_dict()
+        doc['analyzed_at'] = datetime.utcnow()
+        ad_ops.append(UpdateOne({'post_id': ad.post_id}, {'$set': doc}, upsert=True))
+    return post_ops, ad_ops
+
+
+def update_bytes(operations) -> int:
+    """Tamanho (BSON) dos documentos de update enviados"""
+    return sum(len(BSON.encode(op._doc)) for op in operations)
+
+
+def documents_updated(db: MongoDBPersistence) -> int:
+    """Contador de documentos alterados do servidor (serverStatus)"""
+    return db.client.admin.command('serverStatus')['metrics']['document']['updated']
+
+
+def round_data(size: int, changed: float, revision: int):
+    """Posts/anúncios de uma rodada: só a fração `changed` tem revisão nova"""
+    rng = random.Random(revision)
+    revisions = [revision if rng.random() < changed else 0 for _ in range(size)]
+    posts = [synthetic_post(i, rev) for i, rev in enumerate(revisions)]
+    ads = [synthetic_ad(i, rev) for i, rev in enumerate(revisions)]
+    return posts, ads
+
+
+def run_legacy(db: MongoDBPersistence, posts, ads) -> tuple:
+    post_ops, ad_ops = legacy_operations(posts, ads)
+    before = documents_updated(db)
+    start = time.perf_counter()
+    db.db.raw_posts.bulk_write(post_ops, ordered=False)
+    db.db.equipment_ads.bulk_write(ad_ops, ordered=False)
+    elapsed = (time.perf_counter() - start) * 1000
+    return len(post_ops) + len(ad_ops), update_bytes(post_ops + ad_ops), \
+        documents_updated(db) - before, elapsed
+
+
+def run_hashed(db: MongoDBPersistence, posts, ads) -> tuple:
+    sent = []
+    bulk_upsert = db._bulk_upsert
+
+    def spy(collection, operations, batch_size, label):
+        sent.extend(op for _, op in operations)
+        return bulk_upsert(collection, operations, batch_size, label)
+
+    db._bulk_upsert = spy
+    before = documents_updated(db)
+    start = time.perf_counter()
+    try:
+        db.save_raw_posts(posts)
+        db.save_equipment_ads(ads)
+    finally:
+        db._bulk_upsert = bulk_upsert
+    elapsed = (time.perf_counter() - start) * 1000
+    return len(sent), update_bytes(sent), documents_updated(db) - before, elapsed
+
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    size = int(args[0]) if args else 20000
+    changed = float(args[1]) if len(args) > 1 else 0.05
+    keep = '--keep' in sys.argv
+
+    db = MongoDBPersistence(database_name=BENCH_DB)
+
+    print(f"\n⏱️  BENCHMARK escrita: {size} posts + {size} anúncios, "
+          f"{changed:.0%} alterados por rodada ({ROUNDS} rodadas)\n")
+    print(f"{'modo':>14} | {'operações':>10} | {'bytes de update':>16} | "
+          f"{'docs alterados':>14} | {'tempo (ms)':>10}")
+    print("-" * 78)
+
+    try:
+        for label, run in (('$set inteiro', run_legacy), ('content_hash', run_hashed)):
+            db.client.drop_database(BENCH_DB)
+            db.ensure_indexes(force=True)
+            # Carga inicial (fora da medição)
+            posts, ads = round_data(size, 1.0, 0)
+            run(db, posts, ads)
+
+            totals = [0, 0, 0, 0.0]
+            for revision in range(1, ROUNDS + 1):
+                posts, ads = round_data(size, changed, revision)
+                for n, value in enumerate(run(db, posts, ads)):
+                    totals[n] += value
+
+            ops, size_bytes, updated, elapsed = totals
+            print(f"{label:>14} | {ops:>10} | {size_bytes / 1024 / 1024:>13.1f} MB | "
+                  f"{updated:>14} | {elapsed:>10.0f}")
+
+    finally:
+        if not keep:
+            db.client.drop_database(BENCH_DB)
+        db.close()
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
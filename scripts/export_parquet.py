@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Script para arquivar anúncios e posts brutos em Parquet
+Incremental por padrão: grava só o que entrou desde a última execução
+
+USO:
+  python scripts/export_parquet.py [ads|raw|all] [--full] [--root data/archive]
+"""
+import sys
+import logging
+from pathlib import Path
+
+# Adicionar diretório raiz ao path
+root_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(root_dir))
+
+from src.database import get_db
+from src.parquet_archive import ParquetArchive
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+
+logger = logging.getLogger(__name__)
+
+TARGETS = {
+    'ads': ['equipment_ads'],
+    'raw': ['raw_posts'],
+    'all': list(ParquetArchive.COLLECTIONS)
+}
+
+
+def main():
+    """Executa a exportação"""
+    args = [a for a in sys.argv[1:] if not a.startswith('--')]
+    target = args[0] if args else 'all'
+    full = '--full' in sys.argv
+
+    archive_root = str(root_dir / "data" / "archive")
+    if '--root' in sys.argv:
+        archive_root = sys.argv[sys.argv.index('--root') + 1]
+        args = [a for a in args if a != archive_root]
+        target = args[0] if args else 'all'
+
+    if target not in TARGETS:
+        print(f"Alvo desconhecido: {target} (use {', '.join(TARGETS)})")
+        return 1
+
+    try:
+        with get_db() as db:
+            archive = ParquetArchive(db, root=archive_root)
+            for collection in TARGETS[target]:
+                archive.export(collection, full=full)
+        return 0
+
+    except Exception as e:
+        logger.error(f"❌ ERRO: {str(e)}", exc_info=True)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
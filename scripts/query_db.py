@@ -10,7 +10,8 @@ from datetime import datetime, timedelta
 # Adicionar path do projeto
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from src.database import get_db
+from src.database import get_db, migrate_database
+from src.watcher import WatchCriteria, AdWatcher, build_sink
 
 
 def print_json(data):
@@ -18,12 +19,19 @@ def print_json(data):
     print(json.dumps(data, indent=2, default=str, ensure_ascii=False))
 
 
-def stats_command():
-    """Mostra estatísticas do banco"""
+def stats_command(mode=None):
+    """Mostra estatísticas do banco (materializadas, exatas ou reconstruídas)"""
     with get_db() as db:
-        stats = db.get_statistics()
+        if mode == 'rebuild':
+            stats = db.rebuild_statistics()
+        elif mode == 'exact':
+            stats = db.compute_statistics()
+        else:
+            stats = db.get_statistics()
         
         print("\n📊 ESTATÍSTICAS DO BANCO\n")
+        if stats.get('updated_at'):
+            print(f"Atualizado em: {stats['updated_at']}")
         print(f"Posts brutos: {stats['total_raw_posts']}")
         print(f"Anúncios: {stats['total_ads']}")
         print(f"Com reparo: {stats['with_repair']}")
@@ -32,6 +40,9 @@ def stats_command():
             print(f"\n💰 PREÇOS:")
             print(f"  Médio: R$ {stats['prices']['avg']:.2f}")
             print(f"  Mediana: R$ {stats['prices']['median']:.2f}")
+            if stats['prices'].get('p25') is not None:
+                print(f"  P25/P75/P90: R$ {stats['prices']['p25']:.0f} / "
+                      f"R$ {stats['prices']['p75']:.0f} / R$ {stats['prices']['p90']:.0f}")
             print(f"  Min/Max: R$ {stats['prices']['min']:.0f} - R$ {stats['prices']['max']:.0f}")
         
         print(f"\n🏷️  POR TIPO:")
@@ -61,7 +72,13 @@ def stats_command():
             print(f"  ⚠️  Baixo (<50): {rp['low_potential']} anúncios")
 
 
-def search_command(args):
+def print_next_page(results):
+    """Mostra o token da próxima página (paginação por keyset)"""
+    if getattr(results, 'next_token', None):
+        print(f"➡️  Próxima página: page={results.next_token}")
+
+
+def search_command(args, page_token=None):
     """Busca anúncios"""
     filters = {}
     
@@ -84,7 +101,7 @@ def search_command(args):
                 filters['has_repair'] = value.lower() in ['true', '1', 'yes']
     
     with get_db() as db:
-        results = db.search_ads(**filters, limit=20)
+        results = db.search_ads(**filters, limit=20, page_token=page_token, projection='summary')
         
         print(f"\n🔍 BUSCA: {len(results)} resultados\n")
         
@@ -96,12 +113,14 @@ def search_command(args):
             print(f"   Local: {ad.get('city', 'N/A')}/{ad.get('state', 'N/A')}")
             print(f"   URL: {ad.get('post_url', 'N/A')}")
             print()
+        
+        print_next_page(results)
 
 
-def recent_command(hours=24):
+def recent_command(hours=24, page_token=None):
     """Mostra anúncios recentes"""
     with get_db() as db:
-        results = db.get_recent_ads(hours=int(hours))
+        results = db.get_recent_ads(hours=int(hours), page_token=page_token, projection='summary')
         
         print(f"\n⏰ ANÚNCIOS DAS ÚLTIMAS {hours}H: {len(results)}\n")
         
@@ -110,27 +129,34 @@ def recent_command(hours=24):
             if ad.get('price'):
                 print(f"   R$ {ad['price']:.2f}")
             print(f"   {ad.get('city', 'N/A')}/{ad.get('state', 'N/A')}")
-            if ad.get('resale_score'):
-                emoji = "🔥" if ad['resale_score'] >= 70 else "👍" if ad['resale_score'] >= 50 else "⚠️"
-                print(f"   {emoji} Score: {ad['resale_score']}/100")
+            score = ad.get('resale_total_score')
+            if score is not None:
+                emoji = "🔥" if score >= 70 else "👍" if score >= 50 else "⚠️"
+                print(f"   {emoji} Score: {score}/100")
             analyzed = ad.get('analyzed_at')
             if analyzed:
                 print(f"   Analisado: {analyzed}")
             print()
+        
+        print_next_page(results)
 
 
-def high_potential_command(min_score=70, equipment_type=None):
+def high_potential_command(min_score=70, equipment_type=None, include_unavailable=False,
+                           page_token=None):
     """Mostra anúncios com alto potencial de revenda"""
     with get_db() as db:
         results = db.get_high_potential_ads(
             min_score=int(min_score),
-            equipment_type=equipment_type
+            equipment_type=equipment_type,
+            include_unavailable=include_unavailable,
+            page_token=page_token,
+            projection='card'
         )
         
         print(f"\n🔥 ALTO POTENCIAL (≥{min_score}): {len(results)}\n")
         
         for i, ad in enumerate(results, 1):
-            score = ad.get('resale_score', 0)
+            score = ad.get('resale_total_score') or 0
             emoji = "🔥🔥🔥" if score >= 80 else "🔥🔥" if score >= 70 else "🔥"
             
             print(f"{i}. {emoji} {ad.get('brand', 'N/A')} {ad.get('model', 'N/A')} ({ad.get('year', 'N/A')})")
@@ -139,26 +165,73 @@ def high_potential_command(min_score=70, equipment_type=None):
             if ad.get('price'):
                 print(f"   Preço: R$ {ad['price']:.2f}")
             print(f"   Local: {ad.get('city', 'N/A')}/{ad.get('state', 'N/A')}")
-            print(f"   Notas: {ad.get('resale_notes', 'N/A')}")
+            if ad.get('availability_status', 'disponivel') != 'disponivel':
+                print(f"   Status: {ad['availability_status'].upper()}")
+            print(f"   Notas: {(ad.get('resale_score') or {}).get('recommendation', 'N/A')}")
             print(f"   URL: {ad.get('post_url', 'N/A')}")
             print()
+        
+        print_next_page(results)
+
+
+def price_drops_command(min_drop_pct=10, days=30, include_unavailable=False):
+    """Mostra anúncios cujo preço caiu (histórico de versões)"""
+    with get_db() as db:
+        drops = db.get_price_drops(
+            min_drop_pct=float(min_drop_pct),
+            days=int(days),
+            include_unavailable=include_unavailable
+        )
+        
+        print(f"\n📉 QUEDAS DE PREÇO (≥{min_drop_pct}% em {days} dias): {len(drops)}\n")
+        
+        for i, drop in enumerate(drops, 1):
+            ad = drop.get('ad') or {}
+            print(f"{i}. {ad.get('brand', 'N/A')} {ad.get('model', 'N/A')} ({ad.get('year', 'N/A')})")
+            print(f"   R$ {drop['peak_price']:.2f} → R$ {drop['price']:.2f} (-{drop['drop_pct']}%)")
+            print(f"   {drop['price_changes']} mudança(s) de preço, última em {drop['last_change_at']}")
+            print(f"   Local: {ad.get('city', 'N/A')}/{ad.get('state', 'N/A')}")
+            print(f"   URL: {ad.get('post_url', 'N/A')}")
+            print()
+
+
+def history_command(post_id):
+    """Mostra o histórico de versões do anúncio de um post"""
+    with get_db() as db:
+        versions = db.get_listing_history(post_id)
+        
+        print(f"\n🕓 HISTÓRICO DE {post_id}: {len(versions)} versões\n")
+        
+        for version in versions:
+            relisted = version.get('relisted_from')
+            suffix = f" (repost de {relisted})" if relisted else ""
+            print(f"{version['recorded_at']} - post {version['post_id']}{suffix}")
+            for field, change in version['changes'].items():
+                print(f"   {field}: {change['from']} → {change['to']}")
+            print()
 
 
-def export_command(filename, query_str=None):
-    """Exporta para CSV"""
+def export_command(filename, query_str=None, columns=None):
+    """Exporta para CSV (streaming)"""
     query = None
     if query_str:
         query = json.loads(query_str)
     
     with get_db() as db:
-        db.export_to_csv(filename, query)
-        print(f"✓ Exportado para: {filename}")
+        exported = db.export_to_csv(filename, query, columns)
+        print(f"✓ {exported} anúncios exportados para: {filename}")
+
+
+def migrate_command():
+    """Aplica migrações de dados pendentes"""
+    migrate_database()
+    print("✓ Migrações aplicadas")
 
 
-def text_search_command(text):
+def text_search_command(text, page_token=None):
     """Busca por texto"""
     with get_db() as db:
-        results = db.text_search(text, limit=20)
+        results = db.text_search(text, limit=20, page_token=page_token)
         
         print(f"\n🔎 BUSCA POR '{text}': {len(results)} resultados\n")
         
@@ -168,6 +241,52 @@ def text_search_command(text):
             if ad.get('price'):
                 print(f"   R$ {ad['price']:.2f}")
             print()
+        
+        print_next_page(results)
+
+
+def watch_command(args):
+    """Acompanha anúncios novos/alterados em tempo real (change stream)"""
+    criteria = WatchCriteria()
+    sink_spec = None
+    name = 'default'
+    
+    for arg in args:
+        if arg == 'all':
+            criteria.include_unavailable = True
+            continue
+        if '=' not in arg:
+            criteria.min_score = int(arg)
+            continue
+        
+        key, value = arg.split('=', 1)
+        if key == 'type':
+            criteria.equipment_type = value
+        elif key == 'brand':
+            criteria.brand = value
+        elif key == 'state':
+            criteria.state = value.upper()
+        elif key == 'min_price':
+            criteria.min_price = float(value)
+        elif key == 'max_price':
+            criteria.max_price = float(value)
+        elif key == 'repair':
+            criteria.has_repair = value.lower() in ['true', '1', 'yes']
+        elif key == 'sink':
+            sink_spec = value
+        elif key == 'name':
+            name = value
+    
+    sink = build_sink(sink_spec)
+    with get_db() as db:
+        watcher = AdWatcher(db, criteria, sink, name)
+        print(f"\n👀 WATCH '{name}' (Ctrl+C para parar)\n")
+        try:
+            watcher.run()
+        except KeyboardInterrupt:
+            print("\n✓ Watcher parado (retoma deste ponto na próxima execução)")
+        finally:
+            sink.close()
 
 
 def main():
@@ -180,14 +299,27 @@ USO:
   python scripts/query_db.py <comando> [args]
 
 COMANDOS:
-  stats                     - Estatísticas gerais
+  stats [rebuild|exact]     - Estatísticas gerais (materializadas)
+                              rebuild: reconstrói os contadores
+                              exact: recalcula com varredura completa
   search [filters]          - Buscar anúncios
                               Ex: brand=Duotone type=kite max_price=5000
   recent [hours]            - Anúncios recentes (default: 24h)
   potential [min_score]     - Anúncios com alto potencial de revenda
                               Ex: potential 70, potential 80 type=kite
+                              (vendidos/reservados só com "all")
   text "<busca>"           - Busca por texto
-  export <file> [query]     - Exportar para CSV
+  drops [pct] [days] [all]  - Anúncios com queda de preço (default: 10% em 30 dias)
+  history <post_id>         - Histórico de versões do anúncio (inclui reposts)
+  export <file> [query] [columns=...]
+                            - Exportar para CSV (columns=a,b,c ou summary/card)
+  watch [min_score] [filters] [sink=...] [name=...]
+                            - Anúncios novos/alterados em tempo real (requer
+                              replica set); sink=stdout, file:<arquivo> ou URL
+  
+  search/recent/potential/text aceitam page=<token> (mostrado ao fim
+  de cada página) para continuar a listagem
+  migrate                   - Aplicar migrações de dados (idempotente)
 
 EXEMPLOS:
   # Estatísticas
@@ -208,49 +340,96 @@ EXEMPLOS:
   # Busca por texto
   python scripts/query_db.py text "rebel sls 2024"
 
+  # Quedas de preço de 15% ou mais na última semana
+  python scripts/query_db.py drops 15 7
+
   # Exportar tudo
   python scripts/query_db.py export ads.csv
 
   # Exportar filtrado
   python scripts/query_db.py export kites.csv '{"equipment_type": "kite"}'
+
+  # Exportar só algumas colunas
+  python scripts/query_db.py export precos.csv columns=brand,model,price,state
+
+  # Kites com score ≥ 75 até R$ 6000, notificados num webhook
+  python scripts/query_db.py watch 75 type=kite max_price=6000 sink=https://exemplo.com/hook
         """)
         return 1
     
     command = sys.argv[1]
     
+    # page=<token> vale para qualquer comando de listagem
+    page_token = None
+    args = []
+    for arg in sys.argv[2:]:
+        if arg.startswith('page='):
+            page_token = arg.split('=', 1)[1]
+        else:
+            args.append(arg)
+    
     try:
         if command == 'stats':
-            stats_command()
+            stats_command(args[0] if args else None)
         
         elif command == 'search':
-            search_command(sys.argv[2:])
+            search_command(args, page_token)
         
         elif command == 'recent':
-            hours = sys.argv[2] if len(sys.argv) > 2 else 24
-            recent_command(hours)
+            hours = args[0] if args else 24
+            recent_command(hours, page_token)
         
         elif command == 'potential' or command == 'high':
-            min_score = int(sys.argv[2]) if len(sys.argv) > 2 else 70
+            min_score = int(args[0]) if args else 70
             equipment_type = None
-            # Parse type=kite se fornecido
-            for arg in sys.argv[3:]:
+            include_unavailable = False
+            # Parse type=kite / all se fornecido
+            for arg in args[1:]:
                 if arg.startswith('type='):
                     equipment_type = arg.split('=')[1]
-            high_potential_command(min_score, equipment_type)
+                elif arg == 'all':
+                    include_unavailable = True
+            high_potential_command(min_score, equipment_type, include_unavailable, page_token)
         
         elif command == 'text':
-            if len(sys.argv) < 3:
+            if not args:
                 print("Erro: forneça texto para buscar")
                 return 1
-            text_search_command(sys.argv[2])
+            text_search_command(args[0], page_token)
+        
+        elif command == 'drops':
+            numbers = [arg for arg in args if arg != 'all']
+            min_drop_pct = numbers[0] if numbers else 10
+            days = numbers[1] if len(numbers) > 1 else 30
+            price_drops_command(min_drop_pct, days, 'all' in args)
+        
+        elif command == 'history':
+            if not args:
+                print("Erro: forneça o post_id")
+                return 1
+            history_command(args[0])
         
         elif command == 'export':
-            if len(sys.argv) < 3:
+            if not args:
                 print("Erro: forneça nome do arquivo")
                 return 1
-            filename = sys.argv[2]
-            query = sys.argv[3] if len(sys.argv) > 3 else None
-            export_command(filename, query)
+            filename = args[0]
+            query = None
+            columns = None
+            # columns=brand,model,price ou columns=summary (perfil)
+            for arg in args[1:]:
+                if arg.startswith('columns='):
+                    value = arg.split('=', 1)[1]
+                    columns = value if value in ('summary', 'card', 'full') else value.split(',')
+                else:
+                    query = arg
+            export_command(filename, query, columns)
+        
+        elif command == 'migrate':
+            migrate_command()
+        
+        elif command == 'watch':
+            watch_command(args)
         
         else:
             print(f"Comando desconhecido: {command}")
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Script para atualizar engajamento e score de revenda de anúncios já salvos
+Re-coleta likes/comentários dos posts recentes e recalcula o fator de
+interesse localmente (sem chamadas à OpenAI e sem baixar imagens)
+"""
+import os
+import sys
+import json
+import logging
+from datetime import datetime
+from pathlib import Path
+from dotenv import load_dotenv
+
+# Adicionar diretório raiz ao path
+root_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(root_dir))
+
+from src.apify_scraper import ApifyFacebookScraper, load_groups_config
+from src.data_processor import DataProcessor
+
+# Configurar logging
+log_dir = root_dir / "logs"
+log_dir.mkdir(exist_ok=True)
+
+timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
+log_file = log_dir / f"refresh_{timestamp}.log"
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler(log_file),
+        logging.StreamHandler()
+    ]
+)
+
+logger = logging.getLogger(__name__)
+
+
+def load_scraping(arg: str) -> dict:
+    """
+    Carrega a saída do scraper: de um arquivo JSON já salvo em data/raw
+    ou de um novo scraping (sem imagens) das últimas N horas
+    """
+    if arg.endswith(".json"):
+        logger.info(f"Usando scraping salvo: {arg}")
+        with open(arg, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    env_path = root_dir / "config" / ".env"
+    load_dotenv(env_path)
+
+    apify_token = os.getenv("APIFY_API_TOKEN")
+    if not apify_token:
+        raise ValueError("APIFY_API_TOKEN deve estar definido no .env")
+
+    group_urls = load_groups_config(str(root_dir / "config" / "groups.json"))
+    scraper = ApifyFacebookScraper(apify_token)
+
+    return scraper.run_incremental_scrape(
+        group_urls=group_urls,
+        hours_back=int(arg),
+        download_images=False
+    )
+
+
+def main():
+    """Executa refresh de engajamento"""
+    source = sys.argv[1] if len(sys.argv) > 1 else "72"
+
+    logger.info("=" * 80)
+    logger.info("REFRESH DE ENGAJAMENTO E SCORE DE REVENDA")
+    logger.info("=" * 80)
+
+    start_time = datetime.utcnow()
+
+    try:
+        scraping_result = load_scraping(source)
+
+        processor = DataProcessor(data_dir=str(root_dir / "data"))
+        posts = processor.parse_raw_scraping(scraping_result)
+
+        updated = processor.refresh_engagement(posts)
+
+        duration = (datetime.utcnow() - start_time).total_seconds()
+        logger.info("\n📊 RESUMO:")
+        logger.info(f"  Posts re-coletados: {len(posts)}")
+        logger.info(f"  Scores atualizados: {updated}")
+        logger.info(f"  Tempo de execução: {duration:.1f} segundos")
+
+        processor.close()
+        return 0
+
+    except Exception as e:
+        logger.error(f"\n❌ ERRO: {str(e)}", exc_info=True)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -17,6 +17,7 @@ sys.path.insert(0, str(root_dir))
 from src.apify_scraper import ApifyFacebookScraper, load_groups_config
 from src.openai_analyzer import OpenAIAnalyzer
 from src.data_processor import DataProcessor
+from src.analysis_queue import AnalysisQueue, AnalysisBudget, SchedulingConfig
 from src.models import ScrapingJob
 
 # Configurar logging
@@ -106,43 +107,44 @@ def main():
         logger.info("=" * 80)
         logger.info(f"Modelo: {openai_model}")
         
-        # Converter posts para dicts
-        posts_data = [
-            {
-                "id": p.post_id,
-                "url": p.url,
-                "text": p.text,
-                "title": p.title,
-                "location": p.location,
-                "price": p.price,
-                "user": {"name": p.user_name},
-                "topComments": [{"text": c["text"]} for c in p.comments],
-                "sharedPost": {
-                    "text": p.text,
-                    "title": p.title,
-                    "location": p.location,
-                    "price": p.price,
-                    "attachments": [
-                        {
-                            "__typename": "Photo",
-                            "photo_image": {"uri": img}
-                        }
-                        for img in p.images
-                    ]
-                }
-            }
-            for p in posts
-        ]
-        
-        analyses = analyzer.analyze_batch(posts_data)
+        # Posts já analisados: só comentários/engajamento mudaram -> score local
+        processor.apply_comment_deltas(
+            processor.triage.get("comment_delta", []),
+            analyzer
+        )
+        
+        # Apenas posts novos ou com conteúdo alterado vão para análise completa
+        if processor.triage:
+            posts = processor.triage["new"] + processor.triage["changed"]
+        
+        # Fila priorizada: mais promissores primeiro, para no limite do
+        # orçamento e deixa o restante (persistido) para a próxima execução.
+        # Raia backlog: posts fresh enfileirados pelo incremental passam na frente.
+        queue = AnalysisQueue(processor.db)
+        queue.push(posts, lane=AnalysisQueue.BACKLOG)
+        queue.load_pending()
+        
+        # Cada lote analisado vira anúncio (e sai da fila) assim que conclui
+        ads = []
+        posts, analyses = queue.run(
+            analyzer,
+            AnalysisBudget.from_env(),
+            SchedulingConfig.from_env(),
+            on_result=lambda done, results: ads.extend(
+                processor.create_equipment_ads(done, results)
+            )
+        )
         logger.info(f"✓ {len(analyses)} posts analisados")
+        logger.info(f"  Custo OpenAI: US$ {analyzer.spent_usd:.4f}")
+        if len(queue):
+            logger.info(f"  Pendentes na fila: {len(queue)}")
         
         # 4. CRIAR ANÚNCIOS
         logger.info("\n" + "=" * 80)
         logger.info("FASE 4: CRIAÇÃO DE ANÚNCIOS ESTRUTURADOS")
         logger.info("=" * 80)
         
-        ads = processor.create_equipment_ads(posts, analyses)
+        # Anúncios já criados e salvos lote a lote durante a análise
         logger.info(f"✓ {len(ads)} anúncios identificados")
         
         # 5. SALVAR RESULTADOS
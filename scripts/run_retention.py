@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Script de retenção: arquiva posts brutos antigos em JSONL compactado, limpa
+data/raw e data/backups, remove mídia sem uso e aplica a cota de disco
+Limites em RETENTION_* (config/.env) ou nas opções abaixo
+
+USO:
+  python scripts/run_retention.py [--dry-run] [--no-db] [--raw-posts-days N]
+      [--raw-files-days N] [--backups-days N] [--media-days N] [--quota-mb N]
+  python scripts/run_retention.py restore <arquivo.jsonl.gz> [post_id...]
+"""
+import sys
+import logging
+from pathlib import Path
+from dotenv import load_dotenv
+
+# Adicionar diretório raiz ao path
+root_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(root_dir))
+
+from src.database import get_db
+from src.retention import RetentionPolicy, RetentionManager, RawPostArchive
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+
+logger = logging.getLogger(__name__)
+
+# Opção -> (campo da política, tipo)
+OPTIONS = {
+    '--raw-posts-days': ('raw_posts_days', int),
+    '--raw-files-days': ('raw_files_days', int),
+    '--backups-days': ('backups_days', int),
+    '--media-days': ('media_days', int),
+    '--quota-mb': ('disk_quota_mb', float)
+}
+
+
+def parse_policy(argv) -> RetentionPolicy:
+    """RetentionPolicy do ambiente com as opções da linha de comando por cima"""
+    policy = RetentionPolicy.from_env()
+    for option, (field, cast) in OPTIONS.items():
+        if option in argv:
+            setattr(policy, field, cast(argv[argv.index(option) + 1]))
+    return policy
+
+
+def restore(args) -> int:
+    """Devolve posts de um arquivo .jsonl.gz para raw_posts"""
+    if not args:
+        print("Uso: python scripts/run_retention.py restore <arquivo.jsonl.gz> [post_id...]")
+        return 1
+
+    with get_db() as db:
+        RawPostArchive(db).restore(args[0], args[1:] or None)
+    return 0
+
+
+def main():
+    """Executa a retenção"""
+    load_dotenv(root_dir / "config" / ".env")
+
+    if len(sys.argv) > 1 and sys.argv[1] == 'restore':
+        return restore(sys.argv[2:])
+
+    policy = parse_policy(sys.argv)
+    dry_run = '--dry-run' in sys.argv
+    data_dir = str(root_dir / "data")
+
+    try:
+        if '--no-db' in sys.argv:
+            report = RetentionManager(None, policy, data_dir).run(dry_run)
+        else:
+            with get_db() as db:
+                report = RetentionManager(db, policy, data_dir).run(dry_run)
+
+        print(f"\n🧹 RETENÇÃO{' (simulação)' if dry_run else ''}")
+        print(f"  Posts brutos arquivados: {report['raw_posts_archived']}")
+        print(f"  Dumps removidos:         {report['raw_files']}")
+        print(f"  Backups removidos:       {report['backups']}")
+        print(f"  Pastas de mídia:         {report['media']}")
+        print(f"  Liberado:                {report['freed_mb']:.1f} MB")
+        print(f"  Em uso:                  {report['disk_mb']:.1f} MB")
+        return 0
+
+    except Exception as e:
+        logger.error(f"❌ ERRO: {str(e)}", exc_info=True)
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Teste rápido da camada assíncrona (Motor) contra um MongoDB local
+Grava posts/anúncios sintéticos num database separado e confere que as
+leituras async e síncronas enxergam os mesmos documentos
+"""
+import os
+import sys
+import asyncio
+import logging
+from pathlib import Path
+from dotenv import load_dotenv
+from datetime import datetime
+
+# Adicionar diretório raiz ao path
+root_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(root_dir))
+
+from src.models import FacebookPost, EquipmentAd, AnalysisStatus
+from src.database import MongoDBPersistence
+from src.async_database import AsyncMongoDBPersistence, AsyncBufferedWriter
+
+# Configurar logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+TEST_DB = "kitesurf_async_test"
+N = 20
+
+
+def make_post(i: int) -> FacebookPost:
+    return FacebookPost(
+        post_id=f'async_{i}', url=f'https://facebook.com/groups/test/posts/{i}',
+        time=datetime.utcnow().isoformat(), user_name='Teste',
+        text=f'Vendo kite Duotone Rebel {9 + i % 4}m', title='', price='',
+        location='Fortaleza', group_url='test', group_title='Teste',
+        likes_count=0, comments_count=0, shares_count=0, images=[],
+        comments=[]
+    )
+
+
+def make_ad(i: int) -> EquipmentAd:
+    now = datetime.utcnow()
+    return EquipmentAd(
+        post_id=f'async_{i}', post_url=f'https://facebook.com/groups/test/posts/{i}',
+        scraped_at=now, analyzed_at=now, is_advertisement=True,
+        confidence_score=0.9, equipment_type='kite', brand='Duotone',
+        price=3000.0 + 100 * i, state='CE',
+        resale_score={'total_score': 50 + i, 'brand_score': 25}
+    )
+
+
+async def run() -> int:
+    async with AsyncMongoDBPersistence(database_name=TEST_DB) as db:
+        # Gravações em background enquanto o "pipeline" continua
+        async with AsyncBufferedWriter(db, batch_size=5) as writer:
+            for i in range(N):
+                writer.add_raw_posts([make_post(i)])
+                await asyncio.sleep(0)
+            writer.add_equipment_ads([make_ad(i) for i in range(N)])
+        print(f"\n✓ Gravados: {writer.saved}")
+
+        pending = [doc['post_id'] async for doc in db.get_unanalyzed_posts(limit=None)]
+        print(f"✓ Pendentes de análise: {len(pending)}")
+
+        await db.record_analysis_outcomes(
+            {post_id: AnalysisStatus.AD.value for post_id in pending}, 'test'
+        )
+
+        page = await db.search_ads(brand='duotone', limit=5, projection='summary')
+        print(f"✓ search_ads: {len(page)} anúncios (próxima página: {bool(page.next_token)})")
+
+        high = await db.get_high_potential_ads(min_score=60, limit=50)
+        print(f"✓ Alto potencial: {len(high)}")
+
+        stats = await db.get_statistics()
+        print(f"✓ Estatísticas: {stats['total_ads']} anúncios")
+
+    # A camada síncrona lê o mesmo estado
+    sync_db = MongoDBPersistence(database_name=TEST_DB)
+    sync_page = sync_db.search_ads(brand='duotone', limit=5, projection='summary')
+    same = [ad['post_id'] for ad in sync_page] == [ad['post_id'] for ad in page]
+    print(f"{'✓' if same else '✗'} Mesma página na camada síncrona")
+
+    sync_db.client.drop_database(TEST_DB)
+    return 0 if same else 1
+
+
+def main():
+    """Teste da camada assíncrona"""
+    print("=" * 80)
+    print("TESTE DA CAMADA ASSÍNCRONA (MOTOR)")
+    print("=" * 80)
+
+    load_dotenv(root_dir / "config" / ".env")
+    print(f"\nMongoDB: {os.getenv('MONGODB_URI', 'mongodb://localhost:27017/')}")
+    print(f"Database de teste: {TEST_DB}")
+
+    return asyncio.run(run())
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Teste dos upserts com content_hash contra um MongoDB local
+Regrava com mudança documentos aos quais falta um campo imutável (posted_at
+antes do backfill, post reduzido a tombstone) e confere que o servidor
+aceita o update (sem conflito entre $set e $setOnInsert) e que o campo volta
+"""
+import os
+import sys
+import logging
+from pathlib import Path
+from dotenv import load_dotenv
+from datetime import datetime
+
+# Adicionar diretório raiz ao path
+root_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(root_dir))
+
+from src.models import FacebookPost, EquipmentAd
+from src.database import MongoDBPersistence
+from src.content_hash import ContentHash
+from src.retention import RawPostArchive
+
+# Configurar logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+TEST_DB = "kitesurf_hash_test"
+
+
+def make_post(i: int, text: str) -> FacebookPost:
+    return FacebookPost(
+        post_id=f'hash_{i}', url=f'https://facebook.com/groups/test/posts/{i}',
+        time='2024-03-10T12:00:00', user_name='Teste',
+        text=text, title='', price='',
+        location='Fortaleza', group_url='test', group_title='Teste',
+        likes_count=0, comments_count=0, shares_count=0, images=[],
+        comments=[]
+    )
+
+
+def make_ad(i: int, price: float) -> EquipmentAd:
+    now = datetime.utcnow()
+    return EquipmentAd(
+        post_id=f'hash_{i}', post_url=f'https://facebook.com/groups/test/posts/{i}',
+        scraped_at='2024-03-10T12:00:00', analyzed_at=now, is_advertisement=True,
+        confidence_score=0.9, equipment_type='kite', brand='Duotone',
+        price=price, state='CE', resale_score={'total_score': 60}
+    )
+
+
+def conflicts(update) -> set:
+    """Campos em $set e $setOnInsert ao mesmo tempo (o servidor rejeita)"""
+    return set(update.get('$set', {})) & set(update.get('$setOnInsert', {}))
+
+
+def main():
+    """Teste dos upserts com content_hash"""
+    print("=" * 80)
+    print("TESTE DOS UPSERTS COM CONTENT_HASH")
+    print("=" * 80)
+
+    load_dotenv(root_dir / "config" / ".env")
+    print(f"\nMongoDB: {os.getenv('MONGODB_URI', 'mongodb://localhost:27017/')}")
+    print(f"Database de teste: {TEST_DB}")
+
+    db = MongoDBPersistence(database_name=TEST_DB)
+    db.client.drop_database(TEST_DB)
+    checks = []
+
+    def check(ok: bool, label: str):
+        checks.append(ok)
+        print(f"{'✓' if ok else '✗'} {label}")
+
+    # Post e anúncio gravados antes do backfill de posted_at
+    db.save_raw_posts([make_post(1, 'Vendo kite 9m')])
+    db.save_equipment_ads([make_ad(1, 4000.0)])
+    db.db.raw_posts.update_one({'post_id': 'hash_1'}, {'$unset': {'posted_at': ''}})
+    db.db.equipment_ads.update_one({'post_id': 'hash_1'}, {'$unset': {'posted_at': ''}})
+
+    saved = db.save_raw_posts([make_post(1, 'Vendo kite 9m, baixei')])
+    doc = db.db.raw_posts.find_one({'post_id': 'hash_1'})
+    check(saved == 1 and doc['text'] == 'Vendo kite 9m, baixei' and doc.get('posted_at'),
+          "Post sem posted_at regravado com mudança")
+
+    saved = db.save_equipment_ads([make_ad(1, 3500.0)])
+    doc = db.db.equipment_ads.find_one({'post_id': 'hash_1'})
+    check(saved == 1 and doc['price'] == 3500.0 and doc.get('posted_at'),
+          "Anúncio sem posted_at regravado com mudança")
+
+    # Tombstone: sem url/time/user_name/group_* e sem o conteúdo
+    db.save_raw_posts([make_post(2, 'Vendo prancha')])
+    stored = db.db.raw_posts.find_one({'post_id': 'hash_2'})
+    db.db.raw_posts.update_one(
+        {'post_id': 'hash_2'}, RawPostArchive.tombstone(stored, datetime.utcnow())
+    )
+    post = make_post(2, 'Vendo prancha, com alça')
+    doc = MongoDBPersistence._raw_post_doc(post)
+    update = ContentHash.upsert(
+        doc, db.db.raw_posts.find_one({'post_id': 'hash_2'}), True,
+        ContentHash.RAW_POST_IMMUTABLE, ('scraped_at',)
+    )
+    check(not conflicts(update),
+          "Update do tombstone sem conflito de caminho")
+
+    saved = db.save_raw_posts([post])
+    doc = db.db.raw_posts.find_one({'post_id': 'hash_2'})
+    check(saved == 1 and doc.get('url') == post.url and doc.get('text') == post.text,
+          "Tombstone regravado com o post inteiro")
+
+    db.client.drop_database(TEST_DB)
+    return 0 if all(checks) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
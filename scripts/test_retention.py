@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Teste do arquivamento de raw_posts contra um MongoDB local
+Arquiva posts sintéticos num database separado e confere a triagem dos
+tombstones re-coletados, a regravação do post inteiro (sem archived_at) e
+o restore a partir do .jsonl.gz
+"""
+import os
+import sys
+import glob
+import logging
+import tempfile
+from pathlib import Path
+from dotenv import load_dotenv
+from datetime import datetime, timedelta
+
+# Adicionar diretório raiz ao path
+root_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(root_dir))
+
+from src.models import FacebookPost, AnalysisStatus
+from src.database import MongoDBPersistence
+from src.data_processor import DataProcessor
+from src.retention import RawPostArchive
+
+# Configurar logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+TEST_DB = "kitesurf_retention_test"
+
+
+def make_post(i: int, text: str, likes: int = 0, sig: str = 'a') -> FacebookPost:
+    return FacebookPost(
+        post_id=f'ret_{i}', url=f'https://facebook.com/groups/test/posts/{i}',
+        time='2024-03-10T12:00:00', user_name='Teste',
+        text=text, title='', price='',
+        location='Fortaleza', group_url='test', group_title='Teste',
+        likes_count=likes, comments_count=0, shares_count=0,
+        images=[f'https://scontent.cdn/v/{i}_foto.jpg?sig={sig}'],
+        comments=[]
+    )
+
+
+def main():
+    """Teste do arquivamento de raw_posts"""
+    print("=" * 80)
+    print("TESTE DO ARQUIVAMENTO DE RAW_POSTS")
+    print("=" * 80)
+
+    load_dotenv(root_dir / "config" / ".env")
+    print(f"\nMongoDB: {os.getenv('MONGODB_URI', 'mongodb://localhost:27017/')}")
+    print(f"Database de teste: {TEST_DB}")
+
+    db = MongoDBPersistence(database_name=TEST_DB)
+    db.client.drop_database(TEST_DB)
+    tmp = tempfile.mkdtemp(prefix="retention_test_")
+    archive = RawPostArchive(db, os.path.join(tmp, "archive"))
+    processor = DataProcessor(use_mongodb=False, data_dir=tmp)
+    processor.db = db
+    checks = []
+
+    def check(ok: bool, label: str):
+        checks.append(ok)
+        print(f"{'✓' if ok else '✗'} {label}")
+
+    def archive_all() -> int:
+        old = datetime.utcnow() - timedelta(days=200)
+        db.db.raw_posts.update_many({}, {'$set': {'scraped_at': old}})
+        return archive.archive(older_than_days=90)
+
+    # Posts analisados (não-anúncios) e antigos viram tombstones
+    db.save_raw_posts([make_post(1, 'Kite 9m parado'), make_post(2, 'Vendo prancha 138')])
+    db.record_analysis_outcomes(
+        {'ret_1': AnalysisStatus.NOT_AD.value, 'ret_2': AnalysisStatus.NOT_AD.value}, 'test'
+    )
+    archived = archive_all()
+    doc = db.db.raw_posts.find_one({'post_id': 'ret_2'})
+    check(archived == 2 and RawPostArchive.is_archived(doc) and 'text' not in doc,
+          f"Posts arquivados: {archived}")
+
+    # Re-coleta: engajamento/URL de CDN novos não reanalisam; texto editado sim
+    recollected = [
+        make_post(1, 'Kite 9m parado', likes=5, sig='b'),
+        make_post(2, 'Vendo prancha 138, baixei o preço', sig='b')
+    ]
+    triage = processor.triage_posts(recollected)
+    check([p.post_id for p in triage['unchanged']] == ['ret_1']
+          and [p.post_id for p in triage['changed']] == ['ret_2'],
+          "Triagem dos tombstones re-coletados")
+
+    # Regravação: os posts voltam inteiros, sem as marcas de arquivado
+    saved = db.save_raw_posts(recollected)
+    doc = db.db.raw_posts.find_one({'post_id': 'ret_2'})
+    check(
+        saved == 2 and doc.get('text') == recollected[1].text
+        and doc.get('url') == recollected[1].url
+        and not any(field in doc for field in RawPostArchive.MARKERS),
+        "Tombstone regravado com o post inteiro"
+    )
+
+    # Restore a partir do arquivo
+    archive_all()
+    files = sorted(glob.glob(os.path.join(tmp, "archive", "*.jsonl.gz")))
+    restored = archive.restore(files[-1], ['ret_1'])
+    doc = db.db.raw_posts.find_one({'post_id': 'ret_1'})
+    check(restored == 1 and doc.get('text') == 'Kite 9m parado'
+          and not RawPostArchive.is_archived(doc),
+          "Post restaurado do .jsonl.gz")
+
+    db.client.drop_database(TEST_DB)
+    return 0 if all(checks) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
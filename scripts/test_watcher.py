@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Teste do watcher (change streams) contra um replica set local
+Grava anúncios sintéticos num database separado e confere que só os que
+passam nos critérios são notificados, inclusive os gravados enquanto o
+watcher estava parado (resume token)
+
+  docker-compose up -d mongodb-rs
+  MONGODB_URI="mongodb://localhost:27018/?directConnection=true" python scripts/test_watcher.py
+"""
+import os
+import sys
+import time
+import logging
+import threading
+from pathlib import Path
+from dotenv import load_dotenv
+from datetime import datetime
+
+# Adicionar diretório raiz ao path
+root_dir = Path(__file__).parent.parent
+sys.path.insert(0, str(root_dir))
+
+from src.models import EquipmentAd
+from src.database import MongoDBPersistence
+from src.watcher import WatchCriteria, AdWatcher, AdSink
+
+# Configurar logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+TEST_DB = "kitesurf_watch_test"
+
+
+class ListSink(AdSink):
+    """Guarda os eventos em memória"""
+
+    def __init__(self):
+        self.events = []
+
+    def emit(self, event):
+        self.events.append(event)
+
+
+def make_ad(i: int, score: float, price: float = 4000.0) -> EquipmentAd:
+    now = datetime.utcnow()
+    return EquipmentAd(
+        post_id=f'watch_{i}', post_url=f'https://facebook.com/groups/test/posts/{i}',
+        scraped_at=now.isoformat(), analyzed_at=now.isoformat(), is_advertisement=True,
+        confidence_score=0.9, equipment_type='kite', brand='Duotone',
+        price=price, state='CE', resale_score={'total_score': score}
+    )
+
+
+def watch_while(db, sink, action) -> int:
+    """Roda o watcher numa thread enquanto action() grava; retorna os eventos entregues"""
+    watcher = AdWatcher(db, WatchCriteria(min_score=70, max_price=5000), sink, name='test')
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(n=watcher.run(idle_timeout=3)))
+    thread.start()
+    time.sleep(1.5)  # stream aberto antes das gravações
+    action()
+    thread.join()
+    return result.get('n', 0)
+
+
+def main():
+    """Teste do watcher"""
+    print("=" * 80)
+    print("TESTE DO WATCHER (CHANGE STREAMS)")
+    print("=" * 80)
+
+    load_dotenv(root_dir / "config" / ".env")
+    print(f"\nMongoDB: {os.getenv('MONGODB_URI', 'mongodb://localhost:27017/')}")
+    print(f"Database de teste: {TEST_DB}")
+
+    db = MongoDBPersistence(database_name=TEST_DB)
+    db.client.drop_database(TEST_DB)
+    sink = ListSink()
+    checks = []
+
+    def first_run():
+        db.save_equipment_ads([make_ad(1, 80), make_ad(2, 50), make_ad(3, 90, price=9000)])
+        db.update_ad_fields('watch_2', {'resale_total_score': 75})  # passa a valer
+        db.update_ad_fields('watch_1', {'seller_name': 'x'})  # campo fora dos critérios
+
+    watch_while(db, sink, first_run)
+    got = [(e['post_id'], e['reason']) for e in sink.events]
+    checks.append(got == [('watch_1', 'new'), ('watch_2', 'updated')])
+    print(f"{'✓' if checks[-1] else '✗'} Eventos com o watcher ativo: {got}")
+
+    # Gravado com o watcher parado: chega no próximo run (resume token)
+    sink.events.clear()
+    db.save_equipment_ads([make_ad(4, 85)])
+    watch_while(db, sink, lambda: None)
+    got = [(e['post_id'], e['reason']) for e in sink.events]
+    checks.append(got == [('watch_4', 'new')])
+    print(f"{'✓' if checks[-1] else '✗'} Eventos retomados após reinício: {got}")
+
+    db.client.drop_database(TEST_DB)
+    return 0 if all(checks) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,221 @@
+"""
+Campos volumosos dos anúncios (collection ad_details)
+Mantém os documentos de equipment_ads compactos (só campos consultáveis);
+descrição, notas, itens detalhados e textos do score são lidos sob demanda
+"""
+import logging
+from typing import Dict, Any, List, Optional, Tuple
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class AdDetails:
+    """Parte fria dos anúncios: um documento de ad_details por post_id"""
+
+    # Campos movidos para ad_details (notação com ponto)
+    FIELDS = (
+        'description',
+        'analysis_notes',
+        'additional_items_detailed',
+        'resale_score.breakdown',
+        'resale_score.recommendation',
+    )
+
+    # Copiados (não movidos) para o índice de texto, que fica em ad_details
+    TEXT_FIELDS = ('is_advertisement', 'brand', 'model')
+
+    def __init__(self, db):
+        """
+        Args:
+            db: Database do pymongo
+        """
+        self.db = db
+        self.collection = db.ad_details
+
+    # ------------------------------------------------------------------
+    # Construtores (sem acesso ao banco)
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def is_detail(cls, path: str) -> bool:
+        """Se o campo (ou um pai dele) fica em ad_details"""
+        return any(path == field or path.startswith(field + '.') for field in cls.FIELDS)
+
+    @classmethod
+    def split(cls, fields: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """
+        Separa um documento (ou um $set com notação de ponto) em parte
+        quente e parte de ad_details
+
+        Args:
+            fields: Documento de EquipmentAd ou campos de um $set
+
+        Returns:
+            (campos de equipment_ads, $set de ad_details); as cópias de
+            TEXT_FIELDS ficam nos dois
+        """
+        hot, details = {}, {}
+        for key, value in fields.items():
+            if cls.is_detail(key):
+                details[key] = value
+                continue
+
+            nested = [field for field in cls.FIELDS if field.startswith(key + '.')]
+            if nested and isinstance(value, dict):
+                value = dict(value)
+                for field in nested:
+                    name = field[len(key) + 1:]
+                    if name in value:
+                        details[field] = value.pop(name)
+
+            hot[key] = value
+            if key in cls.TEXT_FIELDS:
+                details[key] = value
+
+        return hot, details
+
+    @classmethod
+    def projection(cls, fields: Optional[Dict[str, int]]) -> Optional[Dict[str, int]]:
+        """
+        Campos de ad_details pedidos por uma projeção de equipment_ads
+
+        Args:
+            fields: Projeção (None = documento inteiro)
+
+        Returns:
+            Projeção de ad_details, ou None se nenhum campo frio é pedido
+        """
+        if fields is None:
+            needed = list(cls.FIELDS)
+        else:
+            needed = [
+                field for field in cls.FIELDS
+                if any(key == field or field.startswith(key + '.') for key in fields if fields[key])
+            ]
+        if not needed:
+            return None
+        return {'_id': 0, 'post_id': 1, **{field: 1 for field in needed}}
+
+    @classmethod
+    def merge(cls, doc: Dict, details: Optional[Dict]) -> Dict:
+        """Junta os campos de ad_details ao documento de equipment_ads"""
+        for key, value in (details or {}).items():
+            if key in ('_id', 'post_id', 'score') or key in cls.TEXT_FIELDS:
+                continue
+            if isinstance(value, dict) and isinstance(doc.get(key), dict):
+                doc[key] = {**doc[key], **value}
+            else:
+                doc[key] = value
+        return doc
+
+    @classmethod
+    def missing(cls, details: Dict[str, Any], stored: Dict) -> Dict[str, Any]:
+        """
+        Campos de um $set de ad_details que ainda não estão gravados
+        (usado na migração: o que já está em ad_details é mais novo)
+
+        Args:
+            details: $set de ad_details (notação com ponto)
+            stored: Documento atual de ad_details (vazio se não existe)
+
+        Returns:
+            $set só com os campos ausentes (as cópias de TEXT_FIELDS sempre vão)
+        """
+        pending = {}
+        for key, value in details.items():
+            current = stored
+            for part in key.split('.'):
+                current = current.get(part, _MISSING) if isinstance(current, dict) else _MISSING
+            if key in cls.TEXT_FIELDS or current is _MISSING:
+                pending[key] = value
+        return pending
+
+    @staticmethod
+    def operations(details: Dict[str, Dict[str, Any]]) -> List[UpdateOne]:
+        """Upserts de ad_details (post_id -> $set)"""
+        return [
+            UpdateOne({'post_id': post_id}, {'$set': fields}, upsert=True)
+            for post_id, fields in details.items()
+            if fields
+        ]
+
+    # ------------------------------------------------------------------
+    # MongoDB
+    # ------------------------------------------------------------------
+
+    def write(self, details: Dict[str, Dict[str, Any]]) -> int:
+        """
+        Grava a parte fria de vários anúncios
+
+        Args:
+            details: post_id -> campos ($set)
+
+        Returns:
+            Número de documentos gravados
+        """
+        operations = self.operations(details)
+        if not operations:
+            return 0
+        result = self.collection.bulk_write(operations, ordered=False)
+        return result.upserted_count + result.matched_count
+
+    def fetch(self, post_ids: List[str], projection: Dict[str, int]) -> Dict[str, Dict]:
+        """Documentos de ad_details por post_id"""
+        if not post_ids:
+            return {}
+        cursor = self.collection.find({'post_id': {'$in': list(post_ids)}}, projection)
+        return {doc['post_id']: doc for doc in cursor}
+
+    def attach(self, docs: List[Dict], fields: Optional[Dict[str, int]]) -> List[Dict]:
+        """
+        Completa os anúncios com os campos frios pedidos pela projeção
+        (uma consulta por lote; nada é lido se a projeção não pede)
+
+        Args:
+            docs: Documentos de equipment_ads
+            fields: Projeção usada na leitura (None = documento inteiro)
+
+        Returns:
+            Os mesmos documentos, completados
+        """
+        projection = self.projection(fields)
+        if projection is None or not docs:
+            return docs
+
+        details = self.fetch([doc['post_id'] for doc in docs if 'post_id' in doc], projection)
+        for doc in docs:
+            self.merge(doc, details.get(doc.get('post_id')))
+        return docs
+
+
+class AsyncAdDetails(AdDetails):
+    """AdDetails sobre um database do Motor (mesmos documentos, métodos async)"""
+
+    async def write(self, details: Dict[str, Dict[str, Any]]) -> int:
+        """Grava a parte fria de vários anúncios"""
+        operations = self.operations(details)
+        if not operations:
+            return 0
+        result = await self.collection.bulk_write(operations, ordered=False)
+        return result.upserted_count + result.matched_count
+
+    async def fetch(self, post_ids: List[str], projection: Dict[str, int]) -> Dict[str, Dict]:
+        """Documentos de ad_details por post_id"""
+        if not post_ids:
+            return {}
+        cursor = self.collection.find({'post_id': {'$in': list(post_ids)}}, projection)
+        return {doc['post_id']: doc async for doc in cursor}
+
+    async def attach(self, docs: List[Dict], fields: Optional[Dict[str, int]]) -> List[Dict]:
+        """Completa os anúncios com os campos frios pedidos pela projeção"""
+        projection = self.projection(fields)
+        if projection is None or not docs:
+            return docs
+
+        details = await self.fetch([doc['post_id'] for doc in docs if 'post_id' in doc], projection)
+        for doc in docs:
+            self.merge(doc, details.get(doc.get('post_id')))
+        return docs
@@ -0,0 +1,314 @@
+"""
+Histórico de versões de anúncios (ad_versions)
+Registro só de acréscimo com os campos que mudaram a cada gravação, por post
+e por anúncio repostado (listing_key), para detectar quedas de preço
+"""
+import re
+import hashlib
+import logging
+import unicodedata
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
+from src.models import AvailabilityStatus
+
+logger = logging.getLogger(__name__)
+
+
+def _slug(text: Optional[Any]) -> str:
+    """Minúsculas, sem acentos/pontuação (comparação de vendedor/modelo)"""
+    if text is None:
+        return ''
+    text = unicodedata.normalize('NFKD', str(text))
+    text = ''.join(c for c in text if not unicodedata.combining(c)).lower()
+    return re.sub(r'[^a-z0-9]', '', text)
+
+
+class AdHistory:
+    """Versões de equipment_ads (collection ad_versions)"""
+
+    # Campos comparados entre versões (o resto do documento não gera versão)
+    TRACKED_FIELDS = (
+        'price', 'currency', 'price_negotiable', 'availability_status',
+        'condition', 'has_repair', 'comment_interest_level',
+        'resale_total_score', 'brand_key', 'model', 'year', 'size'
+    )
+
+    # Projeção do estado anterior necessária para o diff
+    FIELDS = {
+        '_id': 0, 'post_id': 1, 'listing_key': 1,
+        **{field: 1 for field in TRACKED_FIELDS}
+    }
+
+    def __init__(self, db):
+        """
+        Args:
+            db: Database do pymongo
+        """
+        self.db = db
+        self.collection = db.ad_versions
+
+    # ------------------------------------------------------------------
+    # Construtores (sem acesso ao banco)
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def listing_key(
+        post_id: str,
+        seller_name: Optional[str],
+        equipment_type: Optional[str],
+        brand_key: Optional[str],
+        model: Optional[str],
+        size: Optional[str]
+    ) -> str:
+        """
+        Chave do anúncio entre reposts: mesmo vendedor, tipo, marca, modelo
+        e tamanho. Sem vendedor ou sem marca/modelo não há como agrupar com
+        segurança e a chave é o próprio post.
+
+        Returns:
+            Hash curto (ou "post:<post_id>")
+        """
+        seller = _slug(seller_name)
+        if not seller or not (brand_key or model):
+            return f"post:{post_id}"
+
+        parts = [seller, _slug(equipment_type), _slug(brand_key), _slug(model), _slug(size)]
+        return hashlib.sha1('|'.join(parts).encode()).hexdigest()[:16]
+
+    @classmethod
+    def changes(cls, old: Optional[Dict], new: Dict) -> Dict[str, Dict[str, Any]]:
+        """
+        Campos rastreados que mudaram
+
+        Args:
+            old: Estado anterior (None para anúncio novo)
+            new: Estado gravado
+
+        Returns:
+            Dicionário campo -> {'from': antigo, 'to': novo}
+        """
+        old = old or {}
+        return {
+            field: {'from': old.get(field), 'to': new.get(field)}
+            for field in cls.TRACKED_FIELDS
+            if field in new and new.get(field) != old.get(field)
+        }
+
+    @classmethod
+    def versions(
+        cls,
+        previous: Dict[str, Dict],
+        relisted: Dict[str, Dict],
+        new_docs: List[Dict],
+        recorded_at: datetime = None
+    ) -> List[Dict]:
+        """
+        Versões a registrar para uma gravação de anúncios
+
+        Args:
+            previous: post_id -> estado anterior do mesmo post
+            relisted: listing_key -> último estado de outro post do mesmo
+                anúncio (usado quando o post é novo)
+            new_docs: Documentos gravados
+            recorded_at: Momento da gravação
+
+        Returns:
+            Documentos de ad_versions (só os que têm mudanças)
+        """
+        recorded_at = recorded_at or datetime.utcnow()
+        versions = []
+
+        for doc in new_docs:
+            if not doc or not doc.get('is_advertisement', True):
+                continue
+
+            post_id = doc['post_id']
+            old = previous.get(post_id)
+            relisted_from = None
+            if old is None and doc.get('listing_key') in relisted:
+                old = relisted[doc['listing_key']]
+                relisted_from = old.get('post_id')
+
+            changes = cls.changes(old, doc)
+            if not changes:
+                continue
+
+            version = {
+                'listing_key': doc.get('listing_key') or f"post:{post_id}",
+                'post_id': post_id,
+                'recorded_at': recorded_at,
+                'changes': changes
+            }
+            if relisted_from:
+                version['relisted_from'] = relisted_from
+            versions.append(version)
+
+        return versions
+
+    @staticmethod
+    def drop_pct(peak: Optional[float], price: Optional[float]) -> Optional[float]:
+        """Queda percentual do pico até o preço atual"""
+        if not peak or price is None:
+            return None
+        return round((peak - price) * 100.0 / peak, 1)
+
+    # ------------------------------------------------------------------
+    # MongoDB
+    # ------------------------------------------------------------------
+
+    def fetch_relisted(self, docs: List[Dict], exclude_post_ids: List[str]) -> Dict[str, Dict]:
+        """
+        Último estado de outro post com o mesmo listing_key (repost)
+
+        Args:
+            docs: Documentos novos (sem estado anterior)
+            exclude_post_ids: Posts da gravação atual
+
+        Returns:
+            listing_key -> estado anterior
+        """
+        keys = list({
+            doc['listing_key'] for doc in docs
+            if doc.get('listing_key') and not doc['listing_key'].startswith('post:')
+        })
+        if not keys:
+            return {}
+
+        relisted = {}
+        cursor = self.db.equipment_ads.find(
+            {'listing_key': {'$in': keys}, 'post_id': {'$nin': list(exclude_post_ids)}},
+            self.FIELDS
+        ).sort('analyzed_at', 1)
+        for doc in cursor:
+            relisted[doc['listing_key']] = doc  # o mais recente sobrescreve
+        return relisted
+
+    def record(self, previous: Dict[str, Dict], new_docs: List[Dict]) -> int:
+        """
+        Registra as versões de uma gravação (inclui detecção de repost)
+
+        Args:
+            previous: post_id -> estado anterior (projeção FIELDS)
+            new_docs: Documentos gravados
+
+        Returns:
+            Número de versões registradas
+        """
+        fresh = [doc for doc in new_docs if doc and doc['post_id'] not in previous]
+        relisted = self.fetch_relisted(fresh, [doc['post_id'] for doc in new_docs if doc])
+
+        versions = self.versions(previous, relisted, new_docs)
+        if versions:
+            self.collection.insert_many(versions, ordered=False)
+        return len(versions)
+
+    def listing_history(self, listing_key: str) -> List[Dict]:
+        """Versões de um anúncio (todos os posts do listing), mais antigas primeiro"""
+        return list(
+            self.collection
+            .find({'listing_key': listing_key}, {'_id': 0})
+            .sort('recorded_at', 1)
+        )
+
+    @staticmethod
+    def price_drop_pipeline(
+        min_drop_pct: float,
+        days: int,
+        limit: int,
+        projection: Optional[Dict[str, int]] = None,
+        include_unavailable: bool = False
+    ) -> List[Dict]:
+        """
+        Pipeline de quedas de preço sobre ad_versions
+
+        Usa o índice parcial das versões com mudança de preço (recorded_at);
+        o pico é o maior preço "de" da janela e o preço atual o último "para".
+        """
+        cutoff = datetime.utcnow() - timedelta(days=days)
+        pipeline = [
+            {'$match': {
+                'changes.price': {'$exists': True},
+                'recorded_at': {'$gte': cutoff}
+            }},
+            {'$sort': {'listing_key': 1, 'recorded_at': 1}},
+            {'$group': {
+                '_id': '$listing_key',
+                'peak_price': {'$max': '$changes.price.from'},
+                'price': {'$last': '$changes.price.to'},
+                'post_id': {'$last': '$post_id'},
+                'price_changes': {'$sum': 1},
+                'last_change_at': {'$last': '$recorded_at'}
+            }},
+            {'$match': {'peak_price': {'$gt': 0}, 'price': {'$ne': None}}},
+            {'$addFields': {
+                'drop_pct': {'$multiply': [
+                    {'$divide': [{'$subtract': ['$peak_price', '$price']}, '$peak_price']},
+                    100
+                ]}
+            }},
+            {'$match': {'drop_pct': {'$gte': min_drop_pct}}},
+            {'$lookup': {
+                'from': 'equipment_ads',
+                'localField': 'post_id',
+                'foreignField': 'post_id',
+                'as': 'ad'
+            }},
+            {'$addFields': {'ad': {'$arrayElemAt': ['$ad', 0]}}}
+        ]
+        if not include_unavailable:
+            pipeline.append({'$match': {'ad.availability_status': {
+                '$nin': [AvailabilityStatus.RESERVED.value, AvailabilityStatus.SOLD.value]
+            }}})
+        pipeline += [
+            {'$sort': {'drop_pct': -1, 'last_change_at': -1}},
+            {'$limit': limit}
+        ]
+
+        fields = {
+            'listing_key': '$_id', 'post_id': 1, 'peak_price': 1, 'price': 1,
+            'drop_pct': {'$round': ['$drop_pct', 1]},
+            'price_changes': 1, 'last_change_at': 1, '_id': 0
+        }
+        if projection:
+            fields.update({f'ad.{field}': 1 for field in projection if field != '_id'})
+        else:
+            fields['ad'] = 1
+        pipeline.append({'$project': fields})
+        return pipeline
+
+
+class AsyncAdHistory(AdHistory):
+    """AdHistory sobre um database do Motor (mesmas versões, métodos async)"""
+
+    async def fetch_relisted(self, docs: List[Dict], exclude_post_ids: List[str]) -> Dict[str, Dict]:
+        """Último estado de outro post com o mesmo listing_key (repost)"""
+        keys = list({
+            doc['listing_key'] for doc in docs
+            if doc.get('listing_key') and not doc['listing_key'].startswith('post:')
+        })
+        if not keys:
+            return {}
+
+        relisted = {}
+        cursor = self.db.equipment_ads.find(
+            {'listing_key': {'$in': keys}, 'post_id': {'$nin': list(exclude_post_ids)}},
+            self.FIELDS
+        ).sort('analyzed_at', 1)
+        async for doc in cursor:
+            relisted[doc['listing_key']] = doc
+        return relisted
+
+    async def record(self, previous: Dict[str, Dict], new_docs: List[Dict]) -> int:
+        """Registra as versões de uma gravação (inclui detecção de repost)"""
+        fresh = [doc for doc in new_docs if doc and doc['post_id'] not in previous]
+        relisted = await self.fetch_relisted(fresh, [doc['post_id'] for doc in new_docs if doc])
+
+        versions = self.versions(previous, relisted, new_docs)
+        if versions:
+            await self.collection.insert_many(versions, ordered=False)
+        return len(versions)
+
+    async def listing_history(self, listing_key: str) -> List[Dict]:
+        """Versões de um anúncio (todos os posts do listing), mais antigas primeiro"""
+        cursor = self.collection.find({'listing_key': listing_key}, {'_id': 0}).sort('recorded_at', 1)
+        return [doc async for doc in cursor]
@@ -0,0 +1,506 @@
+"""
+Fila priorizada de análise com orçamento por execução
+Os posts mais promissores são analisados primeiro; quando o orçamento acaba,
+o restante fica na fila (MongoDB) para a próxima execução.
+
+Duas raias: "fresh" (scraping incremental, sensível a tempo) tem prioridade
+estrita e uma fatia reservada de concorrência e rate limit sobre a raia
+"backlog" (scraping histórico).
+"""
+import os
+import re
+import time
+import heapq
+import logging
+import itertools
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dataclasses import dataclass
+from typing import Dict, Any, List, Optional, Tuple, Callable
+from src.models import FacebookPost
+from src.resale_scorer import ResaleScorer
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class AnalysisBudget:
+    """Limite de gasto de uma execução (None = sem limite)"""
+    max_tokens: Optional[int] = None
+    max_cost_usd: Optional[float] = None
+
+    @classmethod
+    def from_env(cls) -> 'AnalysisBudget':
+        """Lê OPENAI_RUN_BUDGET_TOKENS / OPENAI_RUN_BUDGET_USD do ambiente"""
+        max_tokens = os.getenv("OPENAI_RUN_BUDGET_TOKENS")
+        max_cost_usd = os.getenv("OPENAI_RUN_BUDGET_USD")
+        return cls(
+            max_tokens=int(max_tokens) if max_tokens else None,
+            max_cost_usd=float(max_cost_usd) if max_cost_usd else None
+        )
+
+    def allows(self, tokens: int, cost_usd: float) -> bool:
+        """Verifica se um gasto acumulado cabe no orçamento"""
+        if self.max_tokens is not None and tokens > self.max_tokens:
+            return False
+        if self.max_cost_usd is not None and cost_usd > self.max_cost_usd:
+            return False
+        return True
+
+
+@dataclass
+class SchedulingConfig:
+    """Concorrência e rate limit compartilhados entre as raias"""
+    max_concurrent: int = 5
+    fresh_reserved: int = 2  # slots que o backlog nunca ocupa
+    requests_per_minute: Optional[int] = None  # None = sem limite
+    fresh_rate_share: float = 0.3  # fração do rate limit reservada à raia fresh
+    poll_interval: float = 60.0  # segundos entre buscas de posts fresh no MongoDB
+
+    @classmethod
+    def from_env(cls) -> 'SchedulingConfig':
+        """Lê OPENAI_MAX_CONCURRENT, OPENAI_FRESH_RESERVED, OPENAI_REQUESTS_PER_MINUTE
+        e OPENAI_FRESH_RATE_SHARE do ambiente"""
+        rpm = os.getenv("OPENAI_REQUESTS_PER_MINUTE")
+        return cls(
+            max_concurrent=int(os.getenv("OPENAI_MAX_CONCURRENT") or 5),
+            fresh_reserved=int(os.getenv("OPENAI_FRESH_RESERVED") or 2),
+            requests_per_minute=int(rpm) if rpm else None,
+            fresh_rate_share=float(os.getenv("OPENAI_FRESH_RATE_SHARE") or 0.3)
+        )
+
+
+class _LaneRateLimiter:
+    """
+    Token bucket com fatia reservada para a raia fresh
+
+    A raia fresh consome só do balde total; a backlog precisa de token
+    nos dois baldes, e o dela enche a (1 - fresh_rate_share) da taxa.
+
+    Com um StorageBackend, os baldes ficam no banco (KEY) e valem para
+    todos os processos: um histórico e um incremental rodando juntos
+    dividem o mesmo requests_per_minute. A gravação é otimista (version);
+    em conflito o estado é relido.
+    """
+
+    KEY = "openai_requests"
+
+    # Releituras após conflito antes de tratar como sem token
+    MAX_ATTEMPTS = 5
+
+    def __init__(self, requests_per_minute: Optional[int], fresh_rate_share: float, db=None):
+        self.enabled = bool(requests_per_minute)
+        self.db = db
+        rate = (requests_per_minute or 0) / 60.0
+        self._rates = {
+            'total': rate,
+            'backlog': rate * (1 - fresh_rate_share)
+        }
+        self._tokens = self._refill({}, 0.0)
+        self._updated = time.time()
+
+    def _refill(self, tokens: Dict[str, float], elapsed: float) -> Dict[str, float]:
+        """Baldes após elapsed segundos (balde ausente começa com 1s de taxa)"""
+        elapsed = max(0.0, elapsed)
+        return {
+            name: min(max(1.0, rate * 60), tokens.get(name, max(1.0, rate)) + elapsed * rate)
+            for name, rate in self._rates.items()
+        }
+
+    @staticmethod
+    def _take(tokens: Dict[str, float], lane: str) -> bool:
+        """Consome um token de cada balde da raia (False se algum estiver vazio)"""
+        buckets = ['total'] if lane == AnalysisQueue.FRESH else ['total', 'backlog']
+        if all(tokens[b] >= 1 for b in buckets):
+            for b in buckets:
+                tokens[b] -= 1
+            return True
+        return False
+
+    def try_acquire(self, lane: str) -> bool:
+        """Consome um token para a raia (False se precisar esperar)"""
+        if not self.enabled:
+            return True
+
+        if self.db:
+            try:
+                return self._acquire_shared(lane)
+            except Exception as e:
+                logger.warning(f"Rate limit compartilhado indisponível, usando o local: {str(e)}")
+                self.db = None
+
+        now = time.time()
+        self._tokens = self._refill(self._tokens, now - self._updated)
+        self._updated = now
+        return self._take(self._tokens, lane)
+
+    def _acquire_shared(self, lane: str) -> bool:
+        """Consome o token nos baldes gravados no banco"""
+        for _ in range(self.MAX_ATTEMPTS):
+            state = self.db.load_rate_limit(self.KEY)
+            now = time.time()
+            if state:
+                tokens = self._refill(state['tokens'], now - state['updated_at'])
+            else:
+                tokens = self._refill({}, 0.0)
+
+            if not self._take(tokens, lane):
+                return False
+
+            version = state['version'] if state else None
+            if self.db.save_rate_limit(self.KEY, {'tokens': tokens, 'updated_at': now}, version):
+                return True
+        return False
+
+
+class AnalysisQueue:
+    """Fila de posts para o OpenAIAnalyzer ordenada por prioridade local"""
+
+    FRESH = "fresh"
+    BACKLOG = "backlog"
+    LANES = (FRESH, BACKLOG)
+
+    # Tempo que um post reservado por um worker fica invisível para os outros
+    CLAIM_SECONDS = 600
+
+    # Preço no texto: "R$ 3500", "3.500 reais", "4k", "5 mil"
+    PRICE_PATTERN = re.compile(
+        r'r\$\s*\d|\b\d[\d.,]*\s*(?:reais|mil|k)\b|\b\d{1,2}\.\d{3}\b',
+        re.IGNORECASE
+    )
+
+    SALE_PATTERN = re.compile(
+        r'\b(?:vendo|venda|vende-se|for sale|selling|negoci[áa]vel|aceito propostas?)\b',
+        re.IGNORECASE
+    )
+
+    # Pedidos/perguntas raramente são anúncios
+    WANTED_PATTERN = re.compile(
+        r'\b(?:procuro|procurando|algu[ée]m tem|quero comprar|compro|wtb)\b',
+        re.IGNORECASE
+    )
+
+    BRAND_PATTERN = re.compile(
+        r'\b(' + '|'.join(
+            re.escape(brand)
+            for brand in sorted(ResaleScorer.TOP_BRANDS, key=len, reverse=True)
+        ) + r')\b',
+        re.IGNORECASE
+    )
+
+    def __init__(self, db=None):
+        """
+        Args:
+            db: StorageBackend opcional para persistir a fila entre execuções
+        """
+        self.db = db
+        self._heaps = {lane: [] for lane in self.LANES}
+        self._posts: Dict[str, Tuple[str, FacebookPost]] = {}
+        self._counter = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._posts)
+
+    def pending(self, lane: str) -> int:
+        """Número de posts em memória numa raia"""
+        return sum(1 for post_lane, _ in self._posts.values() if post_lane == lane)
+
+    @classmethod
+    def priority(cls, post: FacebookPost) -> float:
+        """
+        Score local (0-100) de "provável anúncio de valor", sem chamar a OpenAI
+
+        Combina presença de preço, intenção de venda, marcas conhecidas,
+        imagens e engajamento.
+        """
+        text = ' '.join(filter(None, [post.title, post.text]))
+        score = 0.0
+
+        # 1. Preço (0-30)
+        if post.price:
+            score += 30
+        elif cls.PRICE_PATTERN.search(text):
+            score += 25
+
+        # 2. Intenção de venda (-20 a 15)
+        if cls.SALE_PATTERN.search(text):
+            score += 15
+        elif cls.WANTED_PATTERN.search(text):
+            score -= 20
+
+        # 3. Marca (0-25, mesma tabela do ResaleScorer)
+        brands = cls.BRAND_PATTERN.findall(text)
+        if brands:
+            score += max(ResaleScorer.TOP_BRANDS[b.lower()] for b in brands)
+
+        # 4. Imagens (0-10)
+        if post.images:
+            score += 10
+
+        # 5. Engajamento (0-20)
+        engagement = post.comments_count + post.likes_count * 0.5
+        score += min(20.0, engagement)
+
+        return max(0.0, min(100.0, score))
+
+    def push(self, posts: List[FacebookPost], lane: str = BACKLOG) -> int:
+        """
+        Adiciona posts à fila (persistindo no MongoDB se disponível)
+
+        Args:
+            posts: Posts a analisar
+            lane: FRESH (incremental) ou BACKLOG (histórico)
+
+        Returns:
+            Número de posts adicionados
+        """
+        priorities = {}
+        for post in posts:
+            priority = self.priority(post)
+            priorities[post.post_id] = priority
+            self._push_local(post, priority, lane)
+
+        if self.db and priorities:
+            self.db.enqueue_for_analysis(priorities, lane)
+
+        logger.info(
+            f"Fila de análise [{lane}]: +{len(priorities)} posts ({len(self)} na fila)"
+        )
+        return len(priorities)
+
+    def load_pending(
+        self,
+        limit: Optional[int] = None,
+        lanes: Optional[Tuple[str, ...]] = None
+    ) -> int:
+        """
+        Carrega posts deixados na fila por execuções anteriores (ou por
+        outro processo, ex: o incremental rodando durante um histórico)
+
+        Args:
+            limit: Número máximo de posts a carregar por raia
+            lanes: Raias a carregar (default: todas)
+
+        Returns:
+            Número de posts carregados
+        """
+        if not self.db:
+            return 0
+
+        loaded = 0
+        for lane in lanes or self.LANES:
+            entries = [
+                e for e in self.db.get_queued_posts(limit, lane)
+                if e['post_id'] not in self._posts
+            ]
+            raw_posts = self.db.get_raw_posts_by_ids([e['post_id'] for e in entries])
+
+            orphans = []
+            for entry in entries:
+                doc = raw_posts.get(entry['post_id'])
+                if not doc:
+                    orphans.append(entry['post_id'])
+                    continue
+                self._push_local(FacebookPost.from_dict(doc), entry['priority'], lane)
+                loaded += 1
+
+            # Entradas sem post bruto não têm o que analisar
+            self.db.dequeue_posts(orphans)
+
+        if loaded:
+            logger.info(f"Fila de análise: {loaded} posts pendentes carregados do MongoDB")
+        return loaded
+
+    def _push_local(self, post: FacebookPost, priority: float, lane: str):
+        """Adiciona ao heap em memória da raia (maior prioridade primeiro)"""
+        self._posts[post.post_id] = (lane, post)
+        heapq.heappush(self._heaps[lane], (-priority, next(self._counter), post.post_id))
+
+    def _peek(self, lane: str) -> Optional[Tuple[float, FacebookPost]]:
+        """Post de maior prioridade da raia (descarta entradas substituídas)"""
+        heap = self._heaps[lane]
+        while heap:
+            neg_priority, _, post_id = heap[0]
+            entry = self._posts.get(post_id)
+            if entry is not None and entry[0] == lane:
+                return -neg_priority, entry[1]
+            heapq.heappop(heap)
+        return None
+
+    def _pop(self, lane: str):
+        """Remove o post do topo da raia"""
+        _, _, post_id = heapq.heappop(self._heaps[lane])
+        self._posts.pop(post_id, None)
+
+    def run(
+        self,
+        analyzer,
+        budget: Optional[AnalysisBudget] = None,
+        config: Optional[SchedulingConfig] = None,
+        lanes: Tuple[str, ...] = LANES,
+        on_result: Optional[Callable[[List[FacebookPost], List[Dict[str, Any]]], Any]] = None
+    ) -> Tuple[List[FacebookPost], List[Dict[str, Any]]]:
+        """
+        Analisa posts por ordem de raia e prioridade até esvaziar a fila ou o orçamento
+
+        A raia fresh sempre é servida primeiro e pode usar todos os slots;
+        a backlog nunca ocupa os config.fresh_reserved slots reservados nem a
+        fatia reservada do rate limit. Com MongoDB, posts fresh enfileirados
+        por outro processo são buscados a cada config.poll_interval segundos,
+        e o rate limit é compartilhado com os outros processos que usam o
+        mesmo banco.
+
+        Antes de cada chamada o custo é estimado; se não couber no orçamento
+        (gasto real + estimativa das chamadas em andamento) a execução para e
+        o restante fica na fila para a próxima.
+
+        Cada lote de análises concluídas vai para on_result (ex:
+        DataProcessor.create_equipment_ads) antes de sair da fila: um post
+        fresh atendido por um histórico fica pronto sem esperar o fim do
+        backlog, e uma interrupção não perde análises já pagas. Se on_result
+        falhar, os posts ficam na fila para a próxima execução.
+
+        Args:
+            analyzer: OpenAIAnalyzer
+            budget: Limite de tokens/USD da execução
+            config: Concorrência e rate limit
+            lanes: Raias atendidas por esta execução
+            on_result: Recebe (posts, análises) de cada lote concluído
+
+        Returns:
+            Tupla (posts analisados, análises) na ordem de conclusão
+        """
+        budget = budget or AnalysisBudget()
+        config = config or SchedulingConfig()
+        limiter = _LaneRateLimiter(config.requests_per_minute, config.fresh_rate_share, self.db)
+        backlog_slots = max(1, config.max_concurrent - config.fresh_reserved)
+
+        usage_start = dict(analyzer.usage)
+        posts, analyses = [], []
+        in_flight = {}  # future -> (lane, post, estimate)
+        budget_exhausted = False
+        last_poll = time.monotonic()
+
+        def spent() -> Tuple[int, float]:
+            prompt = analyzer.usage['prompt_tokens'] - usage_start['prompt_tokens']
+            completion = analyzer.usage['completion_tokens'] - usage_start['completion_tokens']
+            return prompt + completion, analyzer.cost_usd(prompt, completion)
+
+        with ThreadPoolExecutor(max_workers=config.max_concurrent) as executor:
+            while True:
+                if (
+                    self.db and self.FRESH in lanes
+                    and time.monotonic() - last_poll >= config.poll_interval
+                ):
+                    self.load_pending(lanes=(self.FRESH,))
+                    last_poll = time.monotonic()
+
+                # Despachar enquanto houver slot, token e orçamento
+                rate_limited = False
+                while not budget_exhausted and len(in_flight) < config.max_concurrent:
+                    lane = self._next_lane(lanes, in_flight, backlog_slots)
+                    if lane is None:
+                        break
+                    if not limiter.try_acquire(lane):
+                        rate_limited = True
+                        break
+
+                    priority, post = self._peek(lane)
+                    post_data = post.to_analysis_input()
+                    estimate = analyzer.estimate_usage(post_data)
+
+                    tokens, cost = spent()
+                    tokens += sum(e['total_tokens'] for _, _, e in in_flight.values())
+                    cost += sum(e['cost_usd'] for _, _, e in in_flight.values())
+                    if not budget.allows(
+                        tokens + estimate['total_tokens'],
+                        cost + estimate['cost_usd']
+                    ):
+                        budget_exhausted = True
+                        logger.info(
+                            f"Orçamento esgotado ({tokens} tokens, US$ {cost:.4f}): "
+                            f"{len(self)} posts ficam na fila"
+                        )
+                        break
+
+                    self._pop(lane)
+                    if self.db and not self.db.claim_queued_post(post.post_id, self.CLAIM_SECONDS):
+                        continue  # outro processo já pegou este post
+
+                    future = executor.submit(analyzer.analyze_post, post_data)
+                    in_flight[future] = (lane, post, estimate)
+
+                if not in_flight:
+                    if rate_limited:
+                        time.sleep(0.5)
+                        continue
+                    break
+
+                done, _ = wait(in_flight, timeout=1.0, return_when=FIRST_COMPLETED)
+                done_posts, done_analyses = [], []
+                for future in done:
+                    lane, post, _ = in_flight.pop(future)
+                    try:
+                        analysis = future.result()
+                    except Exception as e:
+                        analysis = {
+                            "error": str(e),
+                            "is_advertisement": False,
+                            "confidence_score": 0.0
+                        }
+                    done_posts.append(post)
+                    done_analyses.append(analysis)
+
+                if not done_posts:
+                    continue
+
+                posts.extend(done_posts)
+                analyses.extend(done_analyses)
+
+                persisted = True
+                if on_result:
+                    try:
+                        on_result(done_posts, done_analyses)
+                    except Exception as e:
+                        persisted = False
+                        logger.error(
+                            f"Erro ao gravar {len(done_posts)} análises: {str(e)} "
+                            f"(posts ficam na fila)"
+                        )
+
+                if self.db and persisted:
+                    self.db.dequeue_posts([post.post_id for post in done_posts])
+
+                if len(posts) // 10 > (len(posts) - len(done_posts)) // 10:
+                    tokens, cost = spent()
+                    logger.info(
+                        f"Fila de análise: {len(posts)} analisados "
+                        f"(fresh: {self.pending(self.FRESH)}, "
+                        f"backlog: {self.pending(self.BACKLOG)} restantes) - "
+                        f"{tokens} tokens, US$ {cost:.4f}"
+                    )
+
+        tokens, cost = spent()
+        logger.info(
+            f"✓ Fila de análise: {len(posts)} posts analisados "
+            f"({tokens} tokens, US$ {cost:.4f})"
+        )
+        return posts, analyses
+
+    def _next_lane(
+        self,
+        lanes: Tuple[str, ...],
+        in_flight: Dict,
+        backlog_slots: int
+    ) -> Optional[str]:
+        """Escolhe a raia do próximo despacho (fresh tem prioridade estrita)"""
+        if self.FRESH in lanes and self._peek(self.FRESH):
+            return self.FRESH
+
+        if self.BACKLOG in lanes and self._peek(self.BACKLOG):
+            backlog_running = sum(
+                1 for lane, _, _ in in_flight.values() if lane == self.BACKLOG
+            )
+            if backlog_running < backlog_slots:
+                return self.BACKLOG
+
+        return None
@@ -42,7 +42,8 @@ class ApifyFacebookScraper:
     def run_incremental_scrape(
         self,
         group_urls: List[str],
-        hours_back: int = 12
+        hours_back: int = 12,
+        download_images: bool = True
     ) -> Dict[str, Any]:
         logger.info(f"Iniciando scraping incremental de {len(group_urls)} grupos")
         logger.info(f"Buscando posts das últimas {hours_back} horas")
@@ -55,11 +56,17 @@ class ApifyFacebookScraper:
             "resultsLimit": 500,
         }
         
-        return self._run_scraper(run_input, "incremental")
+        return self._run_scraper(run_input, "incremental", download_images)
     
-    def _run_scraper(self, run_input: Dict[str, Any], job_type: str) -> Dict[str, Any]:
+    def _run_scraper(
+        self,
+        run_input: Dict[str, Any],
+        job_type: str,
+        download_images: bool = True
+    ) -> Dict[str, Any]:
         """
         Executa o actor, baixa imagens, devolve posts enriquecidos
+        (download_images=False para jobs que só precisam de engajamento)
         """
         try:
             logger.info(f"Executando Apify actor: {self.actor_id}")
@@ -71,7 +78,10 @@ class ApifyFacebookScraper:
             logger.info(f"Scraping concluído: {len(items)} posts coletados")
 
             # baixa imagens agora
-            enriched_items = self._download_and_attach_images(items)
+            if download_images:
+                enriched_items = self._download_and_attach_images(items)
+            else:
+                enriched_items = items
 
             return {
                 "job_type": job_type,
@@ -0,0 +1,523 @@
+"""
+Camada de persistência assíncrona (Motor) para o pipeline em asyncio
+Mesma API de leitura/escrita de MongoDBPersistence, com métodos async
+"""
+import os
+import asyncio
+import logging
+import time
+from typing import List, Dict, Any, Optional, Tuple
+from pymongo import DESCENDING, UpdateOne
+from pymongo.errors import BulkWriteError
+from motor.motor_asyncio import AsyncIOMotorClient
+from src.models import FacebookPost, EquipmentAd
+from src.database import MongoDBPersistence, DEFAULT_BATCH_SIZE
+from src.storage import Page
+from src.stats_store import StatsStore, AsyncStatsStore
+from src.ad_history import AdHistory, AsyncAdHistory
+from src.content_hash import ContentHash
+from src.ad_details import AdDetails, AsyncAdDetails
+
+logger = logging.getLogger(__name__)
+
+# Clientes Motor compartilhados (um por connection string). O Motor se liga
+# ao event loop do primeiro uso: use um único loop por processo.
+_clients: Dict[str, AsyncIOMotorClient] = {}
+
+
+def get_async_client(connection_string: str) -> AsyncIOMotorClient:
+    """
+    Retorna o AsyncIOMotorClient compartilhado do processo para a URI
+
+    Usa as mesmas variáveis de pool do cliente síncrono (MONGODB_*).
+
+    Args:
+        connection_string: URI de conexão
+
+    Returns:
+        Cliente Motor compartilhado
+    """
+    client = _clients.get(connection_string)
+    if client is None:
+        client = AsyncIOMotorClient(
+            connection_string,
+            maxPoolSize=int(os.getenv("MONGODB_MAX_POOL_SIZE") or 50),
+            minPoolSize=int(os.getenv("MONGODB_MIN_POOL_SIZE") or 0),
+            maxIdleTimeMS=int(os.getenv("MONGODB_MAX_IDLE_MS") or 60000),
+            serverSelectionTimeoutMS=int(os.getenv("MONGODB_TIMEOUT_MS") or 5000),
+            retryWrites=True
+        )
+        _clients[connection_string] = client
+    return client
+
+
+def close_all_async_clients():
+    """Fecha todos os clientes Motor compartilhados"""
+    for client in _clients.values():
+        client.close()
+    _clients.clear()
+
+
+class AsyncMongoDBPersistence:
+    """
+    Gerenciador de persistência MongoDB assíncrono
+
+    Filtros, pipelines, upserts e paginação vêm dos construtores de
+    MongoDBPersistence, então as duas camadas leem e gravam os mesmos
+    documentos. Os índices continuam com a camada síncrona
+    (init_database / migrate): connect() só confere a versão do schema.
+    """
+
+    def __init__(self, connection_string: str = None, database_name: str = "kitesurf"):
+        """
+        Args:
+            connection_string: URI de conexão (MongoDB Atlas ou local)
+            database_name: Nome do database
+        """
+        self.connection_string = connection_string or os.getenv(
+            "MONGODB_URI",
+            "mongodb://localhost:27017/"
+        )
+        self.database_name = database_name
+
+        self.client = get_async_client(self.connection_string)
+        self.db = self.client[database_name]
+        self.stats = AsyncStatsStore(self.db)
+        self.history = AsyncAdHistory(self.db)
+        self.details = AsyncAdDetails(self.db)
+
+    async def connect(self) -> 'AsyncMongoDBPersistence':
+        """
+        Testa a conexão e confere a versão dos índices
+
+        Returns:
+            A própria instância
+        """
+        await self.client.admin.command('ping')
+
+        meta = await self.db.meta.find_one({'_id': 'schema'}) or {}
+        if meta.get('version') != MongoDBPersistence.SCHEMA_VERSION:
+            logger.warning(
+                f"Índices desatualizados (versão {meta.get('version')}, esperada "
+                f"{MongoDBPersistence.SCHEMA_VERSION}): rode init_database()"
+            )
+
+        logger.debug(f"✓ Conectado ao MongoDB (async): {self.database_name}")
+        return self
+
+    # ------------------------------------------------------------------
+    # Escrita
+    # ------------------------------------------------------------------
+
+    async def save_raw_posts(self, posts: List[FacebookPost], batch_size: int = None) -> int:
+        """
+        Salva posts brutos (upserts em lote, não ordenados)
+
+        Args:
+            posts: Lista de FacebookPost
+            batch_size: Operações por bulk_write (default: MONGODB_BATCH_SIZE)
+
+        Returns:
+            Número de posts salvos
+        """
+        if not posts:
+            return 0
+
+        docs = []
+        for post in posts:
+            try:
+                docs.append(MongoDBPersistence._raw_post_doc(post))
+            except Exception as e:
+                logger.error(f"Erro ao salvar post {post.post_id}: {str(e)}")
+
+        # Posts sem alteração (mesmo content_hash) não são regravados
+        cursor = self.db.raw_posts.find(
+            {'post_id': {'$in': [doc['post_id'] for doc in docs]}},
+            MongoDBPersistence.HASH_PROJECTION
+        )
+        hashes = {doc['post_id']: doc.get(ContentHash.FIELD) async for doc in cursor}
+        stored = await self._stored_for_diff(self.db.raw_posts, docs, hashes)
+        operations = MongoDBPersistence._raw_post_operations(docs, hashes, stored)
+
+        saved = len(await self._bulk_upsert(self.db.raw_posts, operations, batch_size, "post"))
+        unchanged = len(docs) - len(operations)
+
+        logger.info(f"✓ {saved + unchanged} posts salvos no MongoDB ({unchanged} sem alteração)")
+        return saved + unchanged
+
+    async def save_equipment_ads(self, ads: List[EquipmentAd], batch_size: int = None) -> int:
+        """
+        Salva anúncios analisados (upserts em lote, não ordenados)
+
+        Args:
+            ads: Lista de EquipmentAd
+            batch_size: Operações por bulk_write (default: MONGODB_BATCH_SIZE)
+
+        Returns:
+            Número de anúncios salvos
+        """
+        if not ads:
+            return 0
+
+        docs = []
+        details = {}
+        for ad in ads:
+            try:
+                doc, details[ad.post_id] = AdDetails.split(MongoDBPersistence._ad_doc(ad))
+                docs.append(doc)
+            except Exception as e:
+                logger.error(f"Erro ao salvar anúncio {ad.post_id}: {str(e)}")
+
+        previous = await self.stats.fetch_previous(
+            [doc['post_id'] for doc in docs],
+            {**StatsStore.FIELDS, **AdHistory.FIELDS, ContentHash.FIELD: 1}
+        )
+        hashes = {post_id: doc.get(ContentHash.FIELD) for post_id, doc in previous.items()}
+        stored = await self._stored_for_diff(self.db.equipment_ads, docs, hashes)
+        operations = MongoDBPersistence._ad_operations(docs, hashes, stored)
+
+        written = set(await self._bulk_upsert(self.db.equipment_ads, operations, batch_size, "anúncio"))
+        saved = len(written)
+        unchanged = len(docs) - len(operations)
+
+        # Detalhes, estatísticas e histórico só dos anúncios de fato gravados
+        await self.details.write({post_id: details[post_id] for post_id in written})
+
+        # Estatísticas materializadas: soma o novo estado, desconta o antigo
+        new_docs = [doc for doc in docs if doc['post_id'] in written]
+        previous = {post_id: doc for post_id, doc in previous.items() if post_id in written}
+        await self.stats.apply_delta(list(previous.values()), new_docs)
+        await self.history.record(previous, new_docs)
+
+        logger.info(f"✓ {saved + unchanged} anúncios salvos no MongoDB ({unchanged} sem alteração)")
+        return saved + unchanged
+
+    async def _stored_for_diff(self, collection, docs: List[Dict], hashes: Dict[str, Optional[str]]) -> Dict[str, Dict]:
+        """Documentos gravados cujo hash difere (só os campos comparados)"""
+        query = MongoDBPersistence._diff_query(docs, hashes)
+        if not query:
+            return {}
+        return {doc['post_id']: doc async for doc in collection.find(*query)}
+
+    async def _bulk_upsert(
+        self,
+        collection,
+        operations: List[Tuple[str, UpdateOne]],
+        batch_size: Optional[int],
+        label: str
+    ) -> List[str]:
+        """
+        Executa upserts em lotes de bulk_write não ordenados
+
+        Args:
+            collection: Collection de destino (Motor)
+            operations: Lista de (post_id, UpdateOne)
+            batch_size: Operações por bulk_write
+            label: Nome do documento para os logs
+
+        Returns:
+            post_ids gravados (os que falharam ficam de fora)
+        """
+        batch_size = batch_size or DEFAULT_BATCH_SIZE
+        written = []
+
+        for start in range(0, len(operations), batch_size):
+            batch = operations[start:start + batch_size]
+            try:
+                await collection.bulk_write([op for _, op in batch], ordered=False)
+                written.extend(post_id for post_id, _ in batch)
+
+            except BulkWriteError as e:
+                written.extend(MongoDBPersistence._bulk_error_written(e, batch, label))
+
+            except Exception as e:
+                logger.error(f"Erro ao salvar lote de {len(batch)} ({label}): {str(e)}")
+
+        return written
+
+    async def record_analysis_outcomes(
+        self,
+        outcomes: Dict[str, str],
+        prompt_version: str
+    ) -> int:
+        """
+        Registra no ledger de raw_posts o resultado da análise de cada post
+
+        Args:
+            outcomes: Dicionário post_id -> AnalysisStatus
+            prompt_version: OpenAIAnalyzer.PROMPT_VERSION usado
+
+        Returns:
+            Número de posts atualizados
+        """
+        operations = MongoDBPersistence._analysis_outcome_operations(outcomes, prompt_version)
+        if not operations:
+            return 0
+
+        result = await self.db.raw_posts.bulk_write(operations, ordered=False)
+        return result.modified_count
+
+    # ------------------------------------------------------------------
+    # Leitura
+    # ------------------------------------------------------------------
+
+    async def get_raw_posts_by_ids(self, post_ids: List[str]) -> Dict[str, Dict]:
+        """Busca posts brutos já salvos (post_id -> documento)"""
+        if not post_ids:
+            return {}
+
+        cursor = self.db.raw_posts.find({'post_id': {'$in': list(post_ids)}})
+        return {doc['post_id']: doc async for doc in cursor}
+
+    async def get_ads_by_post_ids(
+        self,
+        post_ids: List[str],
+        projection: str = 'full'
+    ) -> Dict[str, Dict]:
+        """Busca anúncios já analisados (post_id -> documento)"""
+        if not post_ids:
+            return {}
+
+        fields = MongoDBPersistence._projection(projection)
+        cursor = self.db.equipment_ads.find({'post_id': {'$in': list(post_ids)}}, fields)
+        docs = await self.details.attach(await cursor.to_list(length=None), fields)
+        return {doc['post_id']: doc for doc in docs}
+
+    def get_unanalyzed_posts(
+        self,
+        limit: Optional[int] = 100,
+        include_errors: bool = False,
+        batch_size: int = 100
+    ):
+        """
+        Busca posts que ainda não foram analisados (ledger de raw_posts)
+
+        Args:
+            limit: Número máximo de posts (None = todos)
+            include_errors: Incluir posts cuja análise falhou
+            batch_size: Documentos por ida ao banco no cursor
+
+        Returns:
+            Cursor Motor (use com async for)
+        """
+        cursor = (
+            self.db.raw_posts
+            .find(MongoDBPersistence._unanalyzed_query(include_errors))
+            .batch_size(batch_size)
+        )
+        if limit:
+            cursor = cursor.limit(limit)
+
+        return cursor
+
+    async def _keyset_page(
+        self,
+        query: Dict,
+        sort_field: str,
+        limit: int,
+        page_token: Optional[str] = None,
+        projection: str = 'full'
+    ) -> Page:
+        """Paginação por keyset (ver MongoDBPersistence._keyset_page)"""
+        fields = MongoDBPersistence._projection(projection)
+        cursor = (
+            self.db.equipment_ads
+            .find(MongoDBPersistence._keyset_query(query, sort_field, page_token), fields)
+            .sort([(sort_field, DESCENDING), ('_id', DESCENDING)])
+            .limit(limit + 1)
+        )
+        docs = await cursor.to_list(length=limit + 1)
+        page = MongoDBPersistence._make_page(docs, sort_field, limit)
+        await self.details.attach(page, fields)
+        return page
+
+    async def search_ads(
+        self,
+        equipment_type: Optional[str] = None,
+        brand: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        state: Optional[str] = None,
+        has_repair: Optional[bool] = None,
+        limit: int = 100,
+        page_token: Optional[str] = None,
+        projection: str = 'full'
+    ) -> Page:
+        """
+        Busca anúncios com filtros (mesmos argumentos de
+        MongoDBPersistence.search_ads)
+
+        Returns:
+            Página de anúncios (mais recentes primeiro)
+        """
+        query = MongoDBPersistence._search_query(
+            equipment_type, brand, min_price, max_price, state, has_repair
+        )
+
+        ads = await self._keyset_page(query, 'posted_at', limit, page_token, projection)
+
+        logger.info(f"Busca retornou {len(ads)} anúncios")
+        return ads
+
+    async def get_recent_ads(
+        self,
+        hours: int = 24,
+        limit: int = 100,
+        page_token: Optional[str] = None,
+        projection: str = 'full'
+    ) -> Page:
+        """Busca anúncios das últimas `hours` horas"""
+        ads = await self._keyset_page(
+            MongoDBPersistence._recent_query(hours), 'posted_at',
+            limit, page_token, projection
+        )
+
+        logger.info(f"{len(ads)} anúncios nas últimas {hours} horas")
+        return ads
+
+    async def get_high_potential_ads(
+        self,
+        min_score: int = 70,
+        equipment_type: Optional[str] = None,
+        limit: int = 100,
+        include_unavailable: bool = False,
+        page_token: Optional[str] = None,
+        projection: str = 'full'
+    ) -> Page:
+        """Busca anúncios com alto potencial de revenda (maior score primeiro)"""
+        query = MongoDBPersistence._high_potential_query(
+            min_score, equipment_type, include_unavailable
+        )
+
+        ads = await self._keyset_page(query, 'resale_total_score', limit, page_token, projection)
+
+        logger.info(f"{len(ads)} anúncios com score ≥ {min_score}")
+        return ads
+
+    async def text_search(
+        self,
+        search_text: str,
+        limit: int = 50,
+        page_token: Optional[str] = None,
+        projection: str = 'full'
+    ) -> Page:
+        """Busca por texto (full-text search), mais relevantes primeiro"""
+        pipeline = MongoDBPersistence._text_search_pipeline(
+            search_text, limit, page_token, projection
+        )
+
+        rows = await self.db.ad_details.aggregate(pipeline).to_list(length=limit + 1)
+
+        post_ids = [row['post_id'] for row in rows[:limit]]
+        cursor = self.db.equipment_ads.find(
+            {'post_id': {'$in': post_ids}}, MongoDBPersistence._projection(projection)
+        )
+        hot = {doc['post_id']: doc async for doc in cursor}
+        ads = MongoDBPersistence._text_search_page(rows, hot, limit)
+
+        logger.info(f"Busca por '{search_text}' retornou {len(ads)} resultados")
+        return ads
+
+    # ------------------------------------------------------------------
+    # Estatísticas
+    # ------------------------------------------------------------------
+
+    async def get_statistics(self) -> Dict[str, Any]:
+        """
+        Estatísticas do banco de dados (leitura O(1) da collection stats)
+
+        Returns:
+            Dicionário no formato de MongoDBPersistence.get_statistics
+        """
+        stats = {
+            'total_raw_posts': await self.db.raw_posts.estimated_document_count()
+        }
+        stats.update(await self.stats.read())
+        return stats
+
+    async def rebuild_statistics(self) -> Dict[str, Any]:
+        """Recalcula as estatísticas materializadas a partir de equipment_ads"""
+        await self.stats.rebuild()
+        return await self.get_statistics()
+
+    def close(self):
+        """Libera a instância (o cliente compartilhado continua aberto)"""
+        self.db = None
+
+    async def __aenter__(self):
+        return await self.connect()
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class AsyncBufferedWriter:
+    """
+    Acumula posts/anúncios e grava em lote sem bloquear o chamador
+
+    Cada flush roda numa task do event loop, então as gravações se
+    sobrepõem às chamadas da OpenAI em andamento. Use como async context
+    manager para garantir o flush final e esperar as tasks pendentes.
+    """
+
+    def __init__(
+        self,
+        db: AsyncMongoDBPersistence,
+        batch_size: int = None,
+        flush_interval: float = 5.0
+    ):
+        self.db = db
+        self.batch_size = batch_size or DEFAULT_BATCH_SIZE
+        self.flush_interval = flush_interval
+        self._raw_posts: List[FacebookPost] = []
+        self._ads: List[EquipmentAd] = []
+        self._last_flush = time.monotonic()
+        self._tasks = set()
+        self.saved = {'raw_posts': 0, 'equipment_ads': 0}
+
+    def add_raw_posts(self, posts: List[FacebookPost]):
+        """Adiciona posts brutos ao buffer"""
+        self._raw_posts.extend(posts)
+        self._maybe_flush()
+
+    def add_equipment_ads(self, ads: List[EquipmentAd]):
+        """Adiciona anúncios ao buffer"""
+        self._ads.extend(ads)
+        self._maybe_flush()
+
+    def _maybe_flush(self):
+        pending = len(self._raw_posts) + len(self._ads)
+        expired = time.monotonic() - self._last_flush >= self.flush_interval
+        if pending >= self.batch_size or (pending and expired):
+            self.flush_nowait()
+
+    def flush_nowait(self):
+        """Agenda a gravação do buffer numa task e retorna imediatamente"""
+        posts, self._raw_posts = self._raw_posts, []
+        ads, self._ads = self._ads, []
+        self._last_flush = time.monotonic()
+        if not posts and not ads:
+            return
+
+        task = asyncio.get_running_loop().create_task(self._write(posts, ads))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _write(self, posts: List[FacebookPost], ads: List[EquipmentAd]):
+        # Posts antes dos anúncios, como no BufferedWriter
+        if posts:
+            self.saved['raw_posts'] += await self.db.save_raw_posts(posts, self.batch_size)
+        if ads:
+            self.saved['equipment_ads'] += await self.db.save_equipment_ads(ads, self.batch_size)
+
+    async def flush(self):
+        """Grava o buffer e espera todas as gravações pendentes"""
+        self.flush_nowait()
+        if self._tasks:
+            await asyncio.gather(*list(self._tasks))
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.flush()
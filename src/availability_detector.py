@@ -0,0 +1,90 @@
+"""
+Detector local de disponibilidade (vendido/reservado)
+Roda em todo scraping sem chamar a OpenAI
+"""
+import re
+from typing import List, Optional, Dict
+from src.models import AvailabilityStatus, FacebookPost
+
+
+class AvailabilityDetector:
+    """Detecta anúncios vendidos ou reservados pelo texto e comentários"""
+
+    SOLD_PATTERN = re.compile(
+        r'\b(?:vendid[oa]s?|sold(?:\s+out)?|j[áa]\s+vendi)\b',
+        re.IGNORECASE
+    )
+
+    RESERVED_PATTERN = re.compile(
+        r'\b(?:reservad[oa]s?|reserved|on\s+hold)\b',
+        re.IGNORECASE
+    )
+
+    # "ainda não foi vendido", "nao vendi" não indicam venda
+    NEGATION_PATTERN = re.compile(r'\b(?:n[ãa]o|nunca|nem)\b', re.IGNORECASE)
+
+    # O status só avança: um anúncio vendido não volta a disponível quando o
+    # comentário "vendido" sai dos comentários coletados
+    RANK = {
+        AvailabilityStatus.AVAILABLE.value: 0,
+        AvailabilityStatus.RESERVED.value: 1,
+        AvailabilityStatus.SOLD.value: 2
+    }
+
+    @classmethod
+    def detect(cls, text: str, comments: Optional[List[str]] = None) -> str:
+        """
+        Detecta o status de disponibilidade
+
+        Args:
+            text: Texto (ou título) do post
+            comments: Lista de comentários
+
+        Returns:
+            Valor de AvailabilityStatus (vendido tem precedência sobre reservado)
+        """
+        status = AvailabilityStatus.AVAILABLE.value
+
+        fragments = (text or '').splitlines() + list(comments or [])
+
+        for fragment in fragments:
+            # Perguntas ("já foi vendido?") e negações não contam
+            if not fragment or '?' in fragment or cls.NEGATION_PATTERN.search(fragment):
+                continue
+
+            if cls.SOLD_PATTERN.search(fragment):
+                return AvailabilityStatus.SOLD.value
+
+            if cls.RESERVED_PATTERN.search(fragment):
+                status = AvailabilityStatus.RESERVED.value
+
+        return status
+
+    @classmethod
+    def detect_post(cls, post: FacebookPost) -> str:
+        """Detecta o status de um FacebookPost (título, texto e comentários)"""
+        text = '\n'.join(filter(None, [post.title, post.text]))
+        return cls.detect(text, [c['text'] for c in post.comments])
+
+    @classmethod
+    def at_least(cls, status: str) -> List[str]:
+        """Status iguais ou mais avançados que status (filtro $nin das atualizações)"""
+        return [value for value, rank in cls.RANK.items() if rank >= cls.RANK[status]]
+
+    @classmethod
+    def upgrades(cls, statuses: Dict[str, str], current: Dict[str, Optional[str]]) -> Dict[str, str]:
+        """
+        Só os status que avançam em relação ao gravado
+
+        Args:
+            statuses: post_id -> status detectado
+            current: post_id -> status gravado (ausente = disponível)
+
+        Returns:
+            post_id -> status a gravar
+        """
+        available = cls.RANK[AvailabilityStatus.AVAILABLE.value]
+        return {
+            post_id: status for post_id, status in statuses.items()
+            if cls.RANK[status] > cls.RANK.get(current.get(post_id), available)
+        }
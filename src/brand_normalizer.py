@@ -0,0 +1,88 @@
+"""
+Normalização de marcas
+Gera uma chave canônica (brand_key) para filtros por igualdade e agregações
+"""
+import re
+import unicodedata
+from typing import Optional
+from src.resale_scorer import ResaleScorer
+
+
+def _compact(text: str) -> str:
+    """Forma sem espaços/pontuação usada nas comparações"""
+    return re.sub(r'[^a-z0-9]', '', text)
+
+
+class BrandNormalizer:
+    """Mapeia variações de marca ("North Kiteboarding", "north ") para uma chave"""
+
+    # Variações que não saem da forma compacta das marcas do ResaleScorer
+    # (TOP_BRANDS tem "crazy fly" e "crazyfly": a chave é "crazy fly")
+    ALIASES = {
+        'crazyfly': 'crazy fly',
+        'oneil': 'oneill',
+        'lf': 'liquid force',
+    }
+
+    # Nomes de exibição que não seguem str.title()
+    DISPLAY_NAMES = {
+        'ion': 'ION',
+        'rrd': 'RRD',
+        'f-one': 'F-One',
+        'oneill': "O'Neill",
+    }
+
+    # Chaves canônicas: as marcas do ResaleScorer, indexadas pela forma compacta
+    CANONICAL_KEYS = {
+        _compact(brand): brand for brand in reversed(list(ResaleScorer.TOP_BRANDS))
+    }
+
+    @staticmethod
+    def _normalize(brand: str) -> str:
+        """Minúsculas, sem acentos/pontuação e com espaços simples"""
+        text = unicodedata.normalize('NFKD', brand)
+        text = ''.join(c for c in text if not unicodedata.combining(c)).lower()
+        text = re.sub(r"[^a-z0-9\-]+", ' ', text.replace("'", ''))
+        return ' '.join(text.split())
+
+    @classmethod
+    def canonical_key(cls, brand: Optional[str]) -> Optional[str]:
+        """
+        Chave canônica de uma marca
+
+        Args:
+            brand: Marca como extraída (qualquer caixa/variação)
+
+        Returns:
+            Chave normalizada (None se não houver marca)
+        """
+        if not brand or not brand.strip():
+            return None
+
+        normalized = cls._normalize(brand)
+        if not normalized:
+            return None
+
+        compact = _compact(normalized)
+        if compact in cls.ALIASES:
+            return cls.ALIASES[compact]
+        if compact in cls.CANONICAL_KEYS:
+            return cls.CANONICAL_KEYS[compact]
+
+        # "north kiteboarding 2023", "core kites": marca conhecida + sufixo
+        words = normalized.split()
+        for size in range(len(words) - 1, 0, -1):
+            prefix = _compact(''.join(words[:size]))
+            if prefix in cls.ALIASES:
+                return cls.ALIASES[prefix]
+            if prefix in cls.CANONICAL_KEYS:
+                return cls.CANONICAL_KEYS[prefix]
+
+        return normalized
+
+    @classmethod
+    def display_name(cls, brand_key: Optional[str]) -> Optional[str]:
+        """Nome para exibição de uma chave canônica"""
+        if not brand_key:
+            return brand_key
+        return cls.DISPLAY_NAMES.get(brand_key, brand_key.title())
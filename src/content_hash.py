@@ -0,0 +1,118 @@
+"""
+Hash de conteúdo dos documentos gravados (content_hash)
+Permite pular upserts de documentos sem alteração e gravar só os campos
+que mudaram ($set parcial), com os campos imutáveis via $setOnInsert
+"""
+import hashlib
+from typing import Dict, Any, List, Optional, Iterable
+from bson import json_util
+
+_MISSING = object()
+
+
+class ContentHash:
+    """Hash e diff de documentos de raw_posts/equipment_ads"""
+
+    FIELD = 'content_hash'
+
+    # Campos que não mudam depois da primeira gravação ($setOnInsert; num
+    # documento existente só são gravados se ainda não existirem, via $set)
+    RAW_POST_IMMUTABLE = ('url', 'time', 'user_name', 'group_url', 'group_title', 'posted_at')
+    AD_IMMUTABLE = ('post_url', 'scraped_at', 'posted_at')
+
+    # Update parcial feito fora do save: o próximo save refaz o diff completo
+    INVALIDATE = {'$unset': {FIELD: ''}}
+
+    @classmethod
+    def compute(cls, doc: Dict, volatile: Iterable[str] = ()) -> str:
+        """
+        Hash do conteúdo de um documento
+
+        Args:
+            doc: Documento (to_dict() do modelo)
+            volatile: Campos ignorados (ex: scraped_at, regravado a cada coleta)
+
+        Returns:
+            SHA-1 (hex) do JSON canônico
+        """
+        skip = {cls.FIELD, '_id', *volatile}
+        content = {key: value for key, value in doc.items() if key not in skip}
+        payload = json_util.dumps(content, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha1(payload.encode()).hexdigest()
+
+    @staticmethod
+    def changed_fields(stored: Dict, doc: Dict, skip: Iterable[str] = ()) -> Dict[str, Any]:
+        """Campos de doc com valor diferente do documento gravado"""
+        skip = set(skip)
+        return {
+            key: value for key, value in doc.items()
+            if key not in skip and stored.get(key, _MISSING) != value
+        }
+
+    @classmethod
+    def needs_diff(cls, hashes: Dict[str, Optional[str]], docs: List[Dict]) -> List[str]:
+        """
+        Posts já gravados cujo hash difere (precisam do documento para o diff)
+
+        Args:
+            hashes: post_id -> content_hash gravado (None em documentos antigos)
+            docs: Documentos novos (com content_hash)
+        """
+        return [
+            doc['post_id'] for doc in docs
+            if doc['post_id'] in hashes and hashes[doc['post_id']] != doc[cls.FIELD]
+        ]
+
+    @classmethod
+    def upsert(
+        cls,
+        doc: Dict,
+        stored: Optional[Dict],
+        exists: bool,
+        immutable: Iterable[str],
+        volatile: Iterable[str] = (),
+        on_insert: Dict[str, Any] = None
+    ) -> Optional[Dict]:
+        """
+        Update mínimo de um documento
+
+        Um campo nunca vai para $set e $setOnInsert ao mesmo tempo (o
+        servidor rejeita o update com conflito de caminho, código 40): um
+        imutável que falta no documento gravado (ex: tombstone de post
+        arquivado, posted_at antes do backfill) vai só no $set.
+
+        Args:
+            doc: Documento novo (com content_hash)
+            stored: Documento gravado (None se não existe ou se o hash bate)
+            exists: Se o documento já existe
+            immutable: Campos gravados só na inserção
+            volatile: Campos fora do hash, regravados junto com qualquer mudança
+            on_insert: Campos extras da inserção (ex: analysis_status)
+
+        Returns:
+            Documento de update ($set/$setOnInsert) ou None se nada mudou
+        """
+        immutable = set(immutable)
+        set_on_insert = {key: doc[key] for key in immutable if key in doc}
+        set_on_insert.update(on_insert or {})
+
+        if not exists:
+            changes = {key: value for key, value in doc.items() if key not in immutable}
+        elif stored is None:
+            return None
+        else:
+            changes = cls.changed_fields(stored, doc, immutable | set(volatile))
+            changes.update({
+                key: doc[key] for key in immutable
+                if key in doc and key not in stored
+            })
+            if not changes:
+                return {'$set': {cls.FIELD: doc[cls.FIELD]}}
+            changes.update({key: doc[key] for key in volatile if key in doc})
+            changes[cls.FIELD] = doc[cls.FIELD]
+
+        update = {'$set': changes}
+        set_on_insert = {key: value for key, value in set_on_insert.items() if key not in changes}
+        if set_on_insert:
+            update['$setOnInsert'] = set_on_insert
+        return update
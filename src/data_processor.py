@@ -2,16 +2,33 @@
 Processador de dados - integra scraping, análise e persistência
 """
 import os
+import re
 import json
 import logging
 import pandas as pd
 from typing import List, Dict, Any
 from datetime import datetime
-from src.models import FacebookPost, EquipmentAd
+from src.models import FacebookPost, EquipmentAd, AnalysisStatus
 from src.database import MongoDBPersistence
+from src.retention import RawPostArchive
+from src.sqlite_storage import SQLiteStorage
+from src.resale_scorer import ResaleScorer
+from src.availability_detector import AvailabilityDetector
+from src.openai_analyzer import OpenAIAnalyzer
 
 logger = logging.getLogger(__name__)
 
+# Comentários que justificam chamar a OpenAI de novo num post já analisado:
+# preço novo ("R$ 3500", "3.500 reais", "baixei pra 3k"). Venda/reserva é
+# detectada localmente pelo AvailabilityDetector.
+PRICE_IN_COMMENT = re.compile(
+    r'r\$\s*\d|\b\d[\d.,]*\s*(?:reais|mil|k)\b|\b(?:baixei|abaixei|por)\s+(?:pra\s+|para\s+)?\d{3,}',
+    re.IGNORECASE
+)
+
+# Campos de conteúdo: se mudarem, o post precisa de reanálise completa
+CONTENT_FIELDS = RawPostArchive.CONTENT_FIELDS
+
 
 class DataProcessor:
     """Processa e organiza dados com MongoDB"""
@@ -20,22 +37,63 @@ class DataProcessor:
         self.use_mongodb = use_mongodb
         self.data_dir = data_dir
         self.backup_dir = os.path.join(data_dir, "backups")
+        self.triage = {}
         
         # Criar diretório de backup
         os.makedirs(self.backup_dir, exist_ok=True)
         
-        # Inicializar MongoDB
+        # Inicializar armazenamento (SQLite embarcado quando não há MongoDB)
         if use_mongodb:
             self.db = MongoDBPersistence()
             logger.info("✓ DataProcessor usando MongoDB")
         else:
-            self.db = None
-            logger.info("⚠️  DataProcessor SEM MongoDB (modo legacy)")
+            self.db = SQLiteStorage(os.path.join(data_dir, "kitesurf.db"))
+            logger.info(f"✓ DataProcessor usando SQLite ({self.db.path})")
     
     def process_raw_scraping(self, raw_data: Dict[str, Any]) -> List[FacebookPost]:
         """
         Processa dados brutos do Apify em objetos FacebookPost
         
+        Args:
+            raw_data: Dados brutos do scraping
+            
+        Returns:
+            Lista de FacebookPost
+        """
+        posts = self.parse_raw_scraping(raw_data)
+        
+        # Classificar antes de salvar (o save sobrescreve o estado anterior)
+        self.triage = self.triage_posts(posts)
+        
+        # Salvar no MongoDB se habilitado
+        if self.db:
+            self.db.save_raw_posts(posts)
+            self.update_availability(posts)
+        
+        return posts
+    
+    def update_availability(self, posts: List[FacebookPost]) -> int:
+        """
+        Marca anúncios vendidos/reservados a partir dos comentários
+        
+        Args:
+            posts: Posts do scraping atual
+            
+        Returns:
+            Número de anúncios com status alterado
+        """
+        if not self.db or not posts:
+            return 0
+        
+        return self.db.update_availability({
+            post.post_id: AvailabilityDetector.detect_post(post)
+            for post in posts
+        })
+    
+    def parse_raw_scraping(self, raw_data: Dict[str, Any]) -> List[FacebookPost]:
+        """
+        Converte dados brutos do Apify em FacebookPost (sem salvar)
+        
         Args:
             raw_data: Dados brutos do scraping
             
@@ -108,12 +166,252 @@ class DataProcessor:
         
         logger.info(f"✓ {len(posts)} posts processados")
         
-        # Salvar no MongoDB se habilitado
-        if self.db:
-            self.db.save_raw_posts(posts)
-        
         return posts
     
+    def triage_posts(self, posts: List[FacebookPost]) -> Dict[str, List[FacebookPost]]:
+        """
+        Separa posts novos de posts já analisados
+        
+        Args:
+            posts: Lista de posts processados
+            
+        Returns:
+            Dicionário com as listas:
+              - new: nunca analisados (análise completa)
+              - changed: conteúdo mudou (análise completa)
+              - comment_delta: só comentários/engajamento mudaram
+              - unchanged: nada mudou
+        """
+        triage = {'new': [], 'changed': [], 'comment_delta': [], 'unchanged': []}
+        
+        if not self.db:
+            triage['new'] = list(posts)
+            return triage
+        
+        post_ids = [p.post_id for p in posts]
+        known_ads = self.db.get_ads_by_post_ids(post_ids, projection='summary')
+        stored_posts = self.db.get_raw_posts_by_ids(post_ids)
+        
+        for post in posts:
+            stored = stored_posts.get(post.post_id)
+            
+            # Conhecido = virou anúncio ou já foi classificado como não-anúncio
+            known = post.post_id in known_ads or (
+                stored and stored.get('analysis_status') == AnalysisStatus.NOT_AD.value
+            )
+            
+            if not known:
+                triage['new'].append(post)
+            elif RawPostArchive.is_archived(stored):
+                # Post antigo já arquivado: só os hashes do tombstone para comparar
+                changed = RawPostArchive.content_changed(post.to_dict(), stored)
+                triage['changed' if changed else 'unchanged'].append(post)
+            elif not stored or self._content_changed(post, stored):
+                triage['changed'].append(post)
+            elif self._engagement_changed(post, stored):
+                triage['comment_delta'].append(post)
+            else:
+                triage['unchanged'].append(post)
+        
+        logger.info(
+            f"Triagem: {len(triage['new'])} novos, {len(triage['changed'])} alterados, "
+            f"{len(triage['comment_delta'])} só comentários, "
+            f"{len(triage['unchanged'])} sem mudança"
+        )
+        return triage
+    
+    @staticmethod
+    def _image_keys(images: List[str]) -> List[str]:
+        """Nome do arquivo de cada imagem (a querystring da CDN muda a cada scraping)"""
+        return RawPostArchive.image_keys(images)
+    
+    def _content_changed(self, post: FacebookPost, stored: Dict) -> bool:
+        """Verifica se o conteúdo analisável do post mudou"""
+        for field in CONTENT_FIELDS:
+            if (getattr(post, field) or '') != (stored.get(field) or ''):
+                return True
+        return self._image_keys(post.images) != self._image_keys(stored.get('images'))
+    
+    @staticmethod
+    def _engagement_changed(post: FacebookPost, stored: Dict) -> bool:
+        """Verifica se comentários ou contadores de engajamento mudaram"""
+        stored_comments = [c.get('text') for c in stored.get('comments') or []]
+        return (
+            [c['text'] for c in post.comments] != stored_comments
+            or post.likes_count != stored.get('likes_count', 0)
+            or post.comments_count != stored.get('comments_count', 0)
+        )
+    
+    def apply_comment_deltas(
+        self,
+        posts: List[FacebookPost],
+        analyzer=None
+    ) -> int:
+        """
+        Atualiza o score de posts já analisados cujos comentários mudaram
+        
+        O fator de interesse é recalculado localmente. A OpenAI só é chamada
+        (sem imagens) quando um comentário novo revela um preço.
+        
+        Args:
+            posts: Posts em triage['comment_delta']
+            analyzer: OpenAIAnalyzer opcional para os casos com preço novo
+            
+        Returns:
+            Número de anúncios atualizados
+        """
+        if not self.db or not posts:
+            return 0
+        
+        post_ids = [p.post_id for p in posts]
+        known_ads = self.db.get_ads_by_post_ids(post_ids)
+        stored_posts = self.db.get_raw_posts_by_ids(post_ids)
+        
+        updates = {}
+        reanalyzed = 0
+        for post in posts:
+            ad = known_ads.get(post.post_id)
+            if not ad:
+                continue
+            
+            stored = stored_posts.get(post.post_id) or {}
+            old_comments = {c.get('text') for c in stored.get('comments') or []}
+            new_comments = [
+                c['text'] for c in post.comments if c['text'] not in old_comments
+            ]
+            
+            try:
+                if analyzer and any(PRICE_IN_COMMENT.search(c) for c in new_comments):
+                    updates[post.post_id] = self._reanalyze_commercial_fields(
+                        post, ad, analyzer
+                    )
+                    reanalyzed += 1
+                else:
+                    updates[post.post_id] = self._rescore_interest(post, ad)
+                    
+            except Exception as e:
+                logger.error(f"Erro ao atualizar anúncio {post.post_id}: {str(e)}")
+        
+        updated = self.db.bulk_update_ad_fields(updates)
+        
+        logger.info(
+            f"✓ {updated} anúncios atualizados por comentários "
+            f"({reanalyzed} com nova chamada à OpenAI)"
+        )
+        return updated
+    
+    def refresh_engagement(self, posts: List[FacebookPost]) -> int:
+        """
+        Atualiza engajamento e recalcula o score de anúncios já salvos
+        
+        Não chama a OpenAI: só o fator de interesse muda, e apenas os
+        campos de score que mudaram são gravados.
+        
+        Args:
+            posts: Posts re-coletados (ex: parse_raw_scraping de um scraping recente)
+            
+        Returns:
+            Número de anúncios com score alterado
+        """
+        if not self.db or not posts:
+            return 0
+        
+        known_ads = self.db.get_ads_by_post_ids([p.post_id for p in posts])
+        known_posts = [p for p in posts if p.post_id in known_ads]
+        
+        self.db.update_engagement(known_posts)
+        self.update_availability(known_posts)
+        
+        updates = {}
+        for post in known_posts:
+            try:
+                updates[post.post_id] = self._rescore_interest(post, known_ads[post.post_id])
+            except Exception as e:
+                logger.error(f"Erro ao recalcular score {post.post_id}: {str(e)}")
+        
+        updated = self.db.bulk_update_ad_fields(updates)
+        
+        logger.info(
+            f"✓ Engajamento atualizado: {len(known_posts)} anúncios conhecidos, "
+            f"{updated} com score alterado"
+        )
+        return updated
+    
+    @staticmethod
+    def _rescore_interest(post: FacebookPost, ad: Dict) -> Dict[str, Any]:
+        """
+        Recalcula localmente o fator de interesse de um anúncio salvo
+        
+        Returns:
+            Apenas os campos de score que mudaram (notação com ponto para $set)
+        """
+        resale_score = ad.get('resale_score')
+        if not resale_score or not resale_score.get('factors'):
+            return {}
+        
+        new_score = ResaleScorer.rescore_interest(
+            resale_score,
+            comments=[c['text'] for c in post.comments],
+            comments_count=post.comments_count,
+            likes_count=post.likes_count,
+            price=ad.get('price'),
+            brand=ad.get('brand'),
+            condition=ad.get('condition')
+        )
+        
+        old_interest = resale_score['factors'].get('interest_score')
+        if new_score['factors']['interest_score'] == old_interest:
+            return {}
+        
+        fields = {
+            'resale_score.factors.interest_score': new_score['factors']['interest_score']
+        }
+        for key in ('total_score', 'classification', 'recommendation', 'breakdown'):
+            if new_score[key] != resale_score.get(key):
+                fields[f'resale_score.{key}'] = new_score[key]
+        
+        # Campos numéricos indexados (sempre em sincronia com o dict)
+        fields['resale_interest_score'] = new_score['factors']['interest_score']
+        fields['resale_total_score'] = new_score['total_score']
+        return fields
+    
+    @staticmethod
+    def _reanalyze_commercial_fields(post: FacebookPost, ad: Dict, analyzer) -> Dict[str, Any]:
+        """
+        Reanalisa só o texto/comentários e atualiza os campos comerciais
+        
+        Marca, modelo e condição vêm da análise original (com imagens) e
+        são mantidos; só preço, interesse e score são atualizados.
+        """
+        analysis = analyzer.analyze_post(post.to_analysis_input(), download_images=False)
+        if analysis.get('error') or not analysis.get('is_advertisement'):
+            return {}
+        
+        # A análise só de texto devolve null no que não encontrou: mantém o valor salvo
+        fields = {
+            'price': analysis.get('price') or ad.get('price'),
+            'price_negotiable': (
+                analysis['price_negotiable'] if analysis.get('price_negotiable') is not None
+                else ad.get('price_negotiable', False)
+            ),
+            'comment_interest_level': analysis.get('comment_interest_level') or ad.get('comment_interest_level'),
+            'extracted_from_comments': True
+        }
+        
+        fields['resale_score'] = ResaleScorer.calculate_score(
+            equipment_type=ad.get('equipment_type') or 'other',
+            brand=ad.get('brand') or '',
+            year=ad.get('year') or 2020,
+            price=fields['price'] or 0.0,
+            condition=ad.get('condition') or 'desconhecido',
+            has_repair=bool(ad.get('has_repair')),
+            comments=[c['text'] for c in post.comments],
+            comments_count=post.comments_count,
+            likes_count=post.likes_count
+        )
+        fields.update(ResaleScorer.flat_fields(fields['resale_score']))
+        return fields
+    
     def create_equipment_ads(
         self,
         posts: List[FacebookPost],
@@ -130,13 +428,22 @@ class DataProcessor:
             Lista de EquipmentAd
         """
         ads = []
+        outcomes = {}
         
         for post, analysis in zip(posts, analyses):
+            if analysis.get('error'):
+                outcomes[post.post_id] = AnalysisStatus.ERROR.value
+            elif analysis.get('is_advertisement'):
+                outcomes[post.post_id] = AnalysisStatus.AD.value
+            else:
+                outcomes[post.post_id] = AnalysisStatus.NOT_AD.value
+            
             try:
                 ad = EquipmentAd.from_analysis(post, analysis)
                 ads.append(ad)
             except Exception as e:
                 logger.error(f"Erro ao criar EquipmentAd: {str(e)}")
+                outcomes[post.post_id] = AnalysisStatus.ERROR.value
                 continue
         
         # Filtrar apenas anúncios verdadeiros
@@ -149,6 +456,7 @@ class DataProcessor:
         # Salvar no MongoDB se habilitado
         if self.db:
             self.db.save_equipment_ads(true_ads)
+            self.db.record_analysis_outcomes(outcomes, OpenAIAnalyzer.PROMPT_VERSION)
         
         return true_ads
     
@@ -207,18 +515,12 @@ class DataProcessor:
     
     def get_statistics(self) -> Dict[str, Any]:
         """
-        Gera estatísticas (do MongoDB ou dados locais)
+        Gera estatísticas (MongoDB ou SQLite)
         
         Returns:
             Dicionário com estatísticas
         """
-        if self.db:
-            # Usar estatísticas do MongoDB
-            return self.db.get_statistics()
-        else:
-            # Modo legacy sem MongoDB
-            logger.warning("MongoDB não disponível, estatísticas limitadas")
-            return {"total_ads": 0}
+        return self.db.get_statistics()
     
     def search_ads(self, **filters) -> List[Dict]:
         """
@@ -230,10 +532,6 @@ class DataProcessor:
         Returns:
             Lista de anúncios
         """
-        if not self.db:
-            logger.error("MongoDB não disponível")
-            return []
-        
         return self.db.search_ads(**filters)
     
     def get_recent_ads(self, hours: int = 24) -> List[Dict]:
@@ -246,25 +544,18 @@ class DataProcessor:
         Returns:
             Lista de anúncios
         """
-        if not self.db:
-            logger.error("MongoDB não disponível")
-            return []
-        
         return self.db.get_recent_ads(hours=hours)
     
-    def export_to_csv(self, output_file: str, query: Dict = None):
+    def export_to_csv(self, output_file: str, query: Dict = None, columns=None):
         """
-        Exporta dados do MongoDB para CSV
+        Exporta anúncios para CSV
         
         Args:
             output_file: Caminho do arquivo
             query: Query opcional
+            columns: Campos a exportar (lista, perfil de projeção ou None)
         """
-        if not self.db:
-            logger.error("MongoDB não disponível")
-            return
-        
-        self.db.export_to_csv(output_file, query)
+        self.db.export_to_csv(output_file, query, columns)
     
     def close(self):
         """Fecha conexões"""
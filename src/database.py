@@ -2,176 +2,1347 @@
 Camada de persistência com MongoDB
 """
 import os
+import csv
+import atexit
 import logging
-from typing import List, Dict, Any, Optional
+import threading
+import time
+from typing import List, Dict, Any, Optional, Tuple, Iterator
 from datetime import datetime, timedelta
-from pymongo import MongoClient, ASCENDING, DESCENDING
-from pymongo.errors import ConnectionFailure, DuplicateKeyError
-from src.models import FacebookPost, EquipmentAd
+from pymongo import MongoClient, ASCENDING, DESCENDING, UpdateOne
+from pymongo.errors import ConnectionFailure, BulkWriteError, OperationFailure, DuplicateKeyError
+from src.models import FacebookPost, EquipmentAd, AvailabilityStatus, AnalysisStatus, parse_post_time
+from src.resale_scorer import ResaleScorer
+from src.availability_detector import AvailabilityDetector
+from src.brand_normalizer import BrandNormalizer
+from src.stats_store import StatsStore
+from src.ad_history import AdHistory
+from src.content_hash import ContentHash
+from src.ad_details import AdDetails
+from src.retention import RawPostArchive
+from src.storage import StorageBackend, Page
 
 logger = logging.getLogger(__name__)
 
+# Operações por bulk_write nos saves
+DEFAULT_BATCH_SIZE = int(os.getenv("MONGODB_BATCH_SIZE") or 500)
 
-class MongoDBPersistence:
+# Clientes compartilhados pelo processo (um pool por connection string)
+_clients: Dict[str, MongoClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(connection_string: str) -> MongoClient:
+    """
+    Retorna o MongoClient compartilhado do processo para a URI
+    
+    O cliente é criado (e testado com ping) só na primeira chamada; as
+    seguintes reaproveitam o mesmo pool de conexões.
+    
+    Args:
+        connection_string: URI de conexão
+        
+    Returns:
+        MongoClient compartilhado
+    """
+    with _clients_lock:
+        client = _clients.get(connection_string)
+        if client is None:
+            client = MongoClient(
+                connection_string,
+                maxPoolSize=int(os.getenv("MONGODB_MAX_POOL_SIZE") or 50),
+                minPoolSize=int(os.getenv("MONGODB_MIN_POOL_SIZE") or 0),
+                maxIdleTimeMS=int(os.getenv("MONGODB_MAX_IDLE_MS") or 60000),
+                serverSelectionTimeoutMS=int(os.getenv("MONGODB_TIMEOUT_MS") or 5000),
+                retryWrites=True
+            )
+            # Testar conexão
+            client.admin.command('ping')
+            _clients[connection_string] = client
+        return client
+
+
+def close_all_clients():
+    """Fecha todos os clientes compartilhados (fim do processo)"""
+    with _clients_lock:
+        for client in _clients.values():
+            client.close()
+        if _clients:
+            logger.info("Conexões MongoDB fechadas")
+        _clients.clear()
+
+
+atexit.register(close_all_clients)
+
+
+class MongoDBPersistence(StorageBackend):
     """Gerenciador de persistência MongoDB"""
     
+    # Versão do conjunto de índices: incremente ao mudar _create_indexes
+    SCHEMA_VERSION = 1
+    
+    # Leitura do content_hash antes dos upserts (pula documentos sem alteração)
+    HASH_PROJECTION = {'_id': 0, 'post_id': 1, ContentHash.FIELD: 1}
+    
+    # Índices de equipment_ads anteriores ao perfil atual (criados pela
+    # versão sem SCHEMA_VERSION)
+    OBSOLETE_AD_INDEXES = [
+        'is_advertisement_1',
+        'equipment_type_1',
+        'brand_1',
+        'state_1',
+        'price_1',
+        'resale_score_-1',
+        'is_advertisement_1_equipment_type_1_brand_1',
+        'description_text_brand_text_model_text'
+    ]
+    
+    # (URI, database) cujos índices já foram conferidos neste processo
+    _schema_checked = set()
+    
     def __init__(self, connection_string: str = None, database_name: str = "kitesurf"):
         """
         Inicializa conexão com MongoDB
         
         Args:
-            connection_string: URI de conexão (MongoDB Atlas ou local)
-            database_name: Nome do database
+            connection_string: URI de conexão (MongoDB Atlas ou local)
+            database_name: Nome do database
+        """
+        self.connection_string = connection_string or os.getenv(
+            "MONGODB_URI", 
+            "mongodb://localhost:27017/"
+        )
+        self.database_name = database_name
+        
+        try:
+            self.client = get_client(self.connection_string)
+            self.db = self.client[database_name]
+            self.stats = StatsStore(self.db)
+            self.history = AdHistory(self.db)
+            self.details = AdDetails(self.db)
+            
+            # Criar índices (só quando a versão do schema muda)
+            self.ensure_indexes()
+            
+            logger.debug(f"✓ Conectado ao MongoDB: {database_name}")
+            
+        except ConnectionFailure as e:
+            logger.error(f"Erro ao conectar no MongoDB: {str(e)}")
+            raise
+    
+    def ensure_indexes(self, force: bool = False) -> bool:
+        """
+        Cria os índices se a versão gravada em meta for diferente de
+        SCHEMA_VERSION
+        
+        Args:
+            force: Recria os índices mesmo com a versão em dia
+            
+        Returns:
+            True se os índices foram (re)criados
+        """
+        key = (self.connection_string, self.database_name)
+        if not force and key in self._schema_checked:
+            return False
+        
+        meta = self.db.meta.find_one({'_id': 'schema'}) or {}
+        if force or meta.get('version') != self.SCHEMA_VERSION:
+            self._create_indexes()
+            self.db.meta.update_one(
+                {'_id': 'schema'},
+                {'$set': {'version': self.SCHEMA_VERSION, 'updated_at': datetime.utcnow()}},
+                upsert=True
+            )
+            created = True
+        else:
+            created = False
+        
+        self._schema_checked.add(key)
+        return created
+    
+    def _create_indexes(self):
+        """
+        Cria índices otimizados
+        
+        Todas as consultas de anúncios filtram is_advertisement: True, então
+        os índices de equipment_ads (exceto post_id/analyzed_at, usados por
+        lookups e pelo arquivo Parquet) são parciais nesse filtro. Cada um
+        atende um formato de consulta:
+        
+          ads_posted_summary    get_recent_ads / search_ads sem filtro
+                                (coberto no perfil summary)
+          ads_score_covering    get_high_potential_ads (coberto em summary)
+          ads_type_posted       search_ads type=...
+          ads_brand_posted      search_ads brand=...
+          ads_type_score        get_high_potential_ads type=...
+          ads_listing           reposts (AdHistory)
+        
+        availability_status não tem índice próprio: o $nin de
+        get_high_potential_ads é avaliado na chave final de
+        ads_score_covering (sem ler o documento) e, com type=..., sobre os
+        documentos lidos por ads_type_score.
+        
+        A busca por texto usa o índice details_text de ad_details (onde
+        fica a descrição).
+        """
+        
+        # Collection: raw_posts
+        self.db.raw_posts.create_index([("post_id", ASCENDING)], unique=True)
+        self.db.raw_posts.create_index([("scraped_at", DESCENDING)])
+        self.db.raw_posts.create_index([("posted_at", DESCENDING)])
+        self.db.raw_posts.create_index([("group_url", ASCENDING)])
+        self.db.raw_posts.create_index([
+            ("analysis_status", ASCENDING),
+            ("scraped_at", DESCENDING)
+        ])
+        
+        # Collection: equipment_ads
+        # Remove os índices da versão anterior (redundantes ou substituídos)
+        for name in self.OBSOLETE_AD_INDEXES:
+            try:
+                self.db.equipment_ads.drop_index(name)
+            except OperationFailure:
+                pass
+        
+        self.db.equipment_ads.create_index([("post_id", ASCENDING)], unique=True)
+        self.db.equipment_ads.create_index([("analyzed_at", DESCENDING)])
+        
+        ads_only = {'partialFilterExpression': {'is_advertisement': True}}
+        
+        # Listagens paginadas: filtro + (chave de ordenação, _id) no índice,
+        # seguidos dos campos do perfil summary (consulta coberta)
+        # (recência = posted_at, data de publicação do post)
+        self.db.equipment_ads.create_index(
+            [
+                ("is_advertisement", ASCENDING),
+                ("posted_at", DESCENDING),
+                ("_id", DESCENDING)
+            ] + self._summary_index_keys("posted_at"),
+            name="ads_posted_summary", **ads_only
+        )
+        self.db.equipment_ads.create_index(
+            [
+                ("is_advertisement", ASCENDING),
+                ("resale_total_score", DESCENDING),
+                ("_id", DESCENDING)
+            ] + self._summary_index_keys("resale_total_score"),
+            name="ads_score_covering", **ads_only
+        )
+        
+        # Filtros por igualdade seguidos da ordenação da listagem
+        self.db.equipment_ads.create_index(
+            [("equipment_type", ASCENDING), ("posted_at", DESCENDING), ("_id", DESCENDING)],
+            name="ads_type_posted", **ads_only
+        )
+        self.db.equipment_ads.create_index(
+            [("brand_key", ASCENDING), ("posted_at", DESCENDING), ("_id", DESCENDING)],
+            name="ads_brand_posted", **ads_only
+        )
+        self.db.equipment_ads.create_index(
+            [("equipment_type", ASCENDING), ("resale_total_score", DESCENDING), ("_id", DESCENDING)],
+            name="ads_type_score", **ads_only
+        )
+        
+        # Reposts do mesmo anúncio (histórico de versões)
+        self.db.equipment_ads.create_index(
+            [("listing_key", ASCENDING), ("analyzed_at", DESCENDING)],
+            name="ads_listing", **ads_only
+        )
+        
+        # Collection: ad_versions (só acréscimo)
+        self.db.ad_versions.create_index([("listing_key", ASCENDING), ("recorded_at", ASCENDING)])
+        self.db.ad_versions.create_index([("post_id", ASCENDING), ("recorded_at", ASCENDING)])
+        self.db.ad_versions.create_index(
+            [("recorded_at", DESCENDING)],
+            name="versions_price_changes",
+            partialFilterExpression={'changes.price': {'$exists': True}}
+        )
+        
+        # Collection: analysis_queue (fila priorizada de análise)
+        self.db.analysis_queue.create_index([("post_id", ASCENDING)], unique=True)
+        self.db.analysis_queue.create_index([
+            ("lane", ASCENDING),
+            ("priority", DESCENDING)
+        ])
+        
+        # Collection: ad_details (campos volumosos, lidos sob demanda)
+        self.db.ad_details.create_index([("post_id", ASCENDING)], unique=True)
+        
+        # Índice de texto para busca full-text (brand/model são cópias)
+        self.db.ad_details.create_index(
+            [
+                ("description", "text"),
+                ("brand", "text"),
+                ("model", "text")
+            ],
+            name="details_text", **ads_only
+        )
+        
+        logger.info("✓ Índices criados")
+    
+    @classmethod
+    def _summary_index_keys(cls, sort_field: str) -> List[Tuple[str, int]]:
+        """Campos do perfil summary como chaves finais de um índice de cobertura"""
+        return [(field, ASCENDING) for field in cls.SUMMARY_FIELDS if field != sort_field]
+    
+    def save_raw_posts(self, posts: List[FacebookPost], batch_size: int = None) -> int:
+        """
+        Salva posts brutos (upserts em lote, não ordenados)
+        
+        Args:
+            posts: Lista de FacebookPost
+            batch_size: Operações por bulk_write (default: MONGODB_BATCH_SIZE)
+            
+        Returns:
+            Número de posts salvos
+        """
+        if not posts:
+            return 0
+        
+        docs = []
+        for post in posts:
+            try:
+                docs.append(self._raw_post_doc(post))
+            except Exception as e:
+                logger.error(f"Erro ao salvar post {post.post_id}: {str(e)}")
+        
+        # Posts sem alteração (mesmo content_hash) não são regravados
+        hashes = self._stored_hashes(self.db.raw_posts, docs)
+        stored = self._stored_for_diff(self.db.raw_posts, docs, hashes)
+        operations = self._raw_post_operations(docs, hashes, stored)
+        
+        saved = len(self._bulk_upsert(self.db.raw_posts, operations, batch_size, "post"))
+        unchanged = len(docs) - len(operations)
+        
+        logger.info(f"✓ {saved + unchanged} posts salvos no MongoDB ({unchanged} sem alteração)")
+        return saved + unchanged
+    
+    def save_equipment_ads(self, ads: List[EquipmentAd], batch_size: int = None) -> int:
+        """
+        Salva anúncios analisados (upserts em lote, não ordenados)
+        
+        Args:
+            ads: Lista de EquipmentAd
+            batch_size: Operações por bulk_write (default: MONGODB_BATCH_SIZE)
+            
+        Returns:
+            Número de anúncios salvos
+        """
+        if not ads:
+            return 0
+        
+        docs = []
+        details = {}
+        for ad in ads:
+            try:
+                doc, details[ad.post_id] = AdDetails.split(self._ad_doc(ad))
+                docs.append(doc)
+            except Exception as e:
+                logger.error(f"Erro ao salvar anúncio {ad.post_id}: {str(e)}")
+        
+        previous = self._previous_ads([doc['post_id'] for doc in docs])
+        hashes = {post_id: doc.get(ContentHash.FIELD) for post_id, doc in previous.items()}
+        stored = self._stored_for_diff(self.db.equipment_ads, docs, hashes)
+        operations = self._ad_operations(docs, hashes, stored)
+        
+        written = set(self._bulk_upsert(self.db.equipment_ads, operations, batch_size, "anúncio"))
+        saved = len(written)
+        unchanged = len(docs) - len(operations)
+        
+        # Detalhes, estatísticas e histórico só dos anúncios de fato gravados
+        self.details.write({post_id: details[post_id] for post_id in written})
+        
+        # Estatísticas materializadas: soma o novo estado, desconta o antigo
+        new_docs = [doc for doc in docs if doc['post_id'] in written]
+        previous = {post_id: doc for post_id, doc in previous.items() if post_id in written}
+        self.stats.apply_delta(list(previous.values()), new_docs)
+        self.history.record(previous, new_docs)
+        
+        logger.info(f"✓ {saved + unchanged} anúncios salvos no MongoDB ({unchanged} sem alteração)")
+        return saved + unchanged
+    
+    def _previous_ads(self, post_ids: List[str]) -> Dict[str, Dict]:
+        """Estado anterior usado pelas estatísticas, histórico de versões e content_hash"""
+        return self.stats.fetch_previous(
+            post_ids, {**StatsStore.FIELDS, **AdHistory.FIELDS, ContentHash.FIELD: 1}
+        )
+    
+    def _stored_hashes(self, collection, docs: List[Dict]) -> Dict[str, Optional[str]]:
+        """content_hash gravado de cada documento existente (None em documentos antigos)"""
+        cursor = collection.find(
+            {'post_id': {'$in': [doc['post_id'] for doc in docs]}}, self.HASH_PROJECTION
+        )
+        return {doc['post_id']: doc.get(ContentHash.FIELD) for doc in cursor}
+    
+    def _stored_for_diff(self, collection, docs: List[Dict], hashes: Dict[str, Optional[str]]) -> Dict[str, Dict]:
+        """Documentos gravados cujo hash difere (só os campos comparados)"""
+        query = self._diff_query(docs, hashes)
+        if not query:
+            return {}
+        return {doc['post_id']: doc for doc in collection.find(*query)}
+    
+    def _bulk_upsert(
+        self,
+        collection,
+        operations: List[Tuple[str, UpdateOne]],
+        batch_size: Optional[int],
+        label: str
+    ) -> List[str]:
+        """
+        Executa upserts em lotes de bulk_write não ordenados
+        
+        Um documento com erro não interrompe o lote; cada erro é logado
+        com o post_id correspondente.
+        
+        Args:
+            collection: Collection de destino
+            operations: Lista de (post_id, UpdateOne)
+            batch_size: Operações por bulk_write
+            label: Nome do documento para os logs
+            
+        Returns:
+            post_ids gravados (os que falharam ficam de fora)
+        """
+        batch_size = batch_size or DEFAULT_BATCH_SIZE
+        written = []
+        
+        for start in range(0, len(operations), batch_size):
+            batch = operations[start:start + batch_size]
+            try:
+                collection.bulk_write([op for _, op in batch], ordered=False)
+                written.extend(post_id for post_id, _ in batch)
+                
+            except BulkWriteError as e:
+                written.extend(self._bulk_error_written(e, batch, label))
+                        
+            except Exception as e:
+                logger.error(f"Erro ao salvar lote de {len(batch)} ({label}): {str(e)}")
+        
+        return written
+    
+    # ------------------------------------------------------------------
+    # Construtores de operações e consultas (compartilhados com
+    # AsyncMongoDBPersistence)
+    # ------------------------------------------------------------------
+    
+    @staticmethod
+    def _raw_post_doc(post: FacebookPost) -> Dict:
+        """
+        Documento de um post bruto com content_hash (scraped_at fora do hash)
+        e posted_at (time interpretado; sem data válida, o momento da coleta)
+        """
+        doc = post.to_dict()
+        doc['scraped_at'] = datetime.utcnow()
+        doc[ContentHash.FIELD] = ContentHash.compute(doc, ('scraped_at',))
+        doc['posted_at'] = parse_post_time(post.time) or doc['scraped_at']
+        return doc
+    
+    @staticmethod
+    def _ad_doc(ad: EquipmentAd) -> Dict:
+        """
+        Documento de um anúncio analisado com content_hash (analyzed_at fora
+        do hash) e posted_at (EquipmentAd.scraped_at guarda o time do post)
+        """
+        doc = ad.to_dict()
+        doc['analyzed_at'] = datetime.utcnow()
+        doc[ContentHash.FIELD] = ContentHash.compute(doc, ('analyzed_at',))
+        doc['posted_at'] = parse_post_time(ad.scraped_at) or doc['analyzed_at']
+        return doc
+    
+    @staticmethod
+    def _diff_query(docs: List[Dict], hashes: Dict[str, Optional[str]]) -> Optional[Tuple[Dict, Dict]]:
+        """Filtro e projeção dos documentos gravados que precisam de diff (None se nenhum)"""
+        post_ids = ContentHash.needs_diff(hashes, docs)
+        if not post_ids:
+            return None
+        
+        fields = {field for doc in docs for field in doc}
+        return {'post_id': {'$in': post_ids}}, {'_id': 0, **{field: 1 for field in fields}}
+    
+    @staticmethod
+    def _upsert_operations(
+        docs: List[Dict],
+        hashes: Dict[str, Optional[str]],
+        stored: Dict[str, Dict],
+        immutable: Tuple[str, ...],
+        volatile: Tuple[str, ...],
+        on_insert: Dict[str, Any] = None,
+        unset: Tuple[str, ...] = ()
+    ) -> List[Tuple[str, UpdateOne]]:
+        """
+        Upserts mínimos: documentos novos inteiros, existentes só com os
+        campos alterados; documentos sem alteração ficam de fora
+        
+        Args:
+            docs: Documentos novos (com content_hash)
+            hashes: post_id -> content_hash dos documentos existentes
+            stored: post_id -> documento gravado (os que precisam de diff)
+            immutable: Campos gravados só na inserção ($setOnInsert)
+            volatile: Campos fora do hash, regravados junto com qualquer mudança
+            on_insert: Campos extras da inserção
+            unset: Campos removidos em toda gravação (ex: marca de arquivado)
+            
+        Returns:
+            Lista de (post_id, UpdateOne)
+        """
+        operations = []
+        for doc in docs:
+            post_id = doc['post_id']
+            update = ContentHash.upsert(
+                doc, stored.get(post_id), post_id in hashes, immutable, volatile, on_insert
+            )
+            if update:
+                if unset:
+                    update['$unset'] = {field: '' for field in unset}
+                operations.append((post_id, UpdateOne({'post_id': post_id}, update, upsert=True)))
+        return operations
+    
+    @classmethod
+    def _raw_post_operations(cls, docs, hashes, stored) -> List[Tuple[str, UpdateOne]]:
+        """
+        Upserts de posts brutos; posts novos entram no ledger como pendentes
+        e posts arquivados re-coletados com mudança voltam inteiros
+        """
+        return cls._upsert_operations(
+            docs, hashes, stored, ContentHash.RAW_POST_IMMUTABLE, ('scraped_at',),
+            {'analysis_status': AnalysisStatus.PENDING.value}, RawPostArchive.MARKERS
+        )
+    
+    @classmethod
+    def _ad_operations(cls, docs, hashes, stored) -> List[Tuple[str, UpdateOne]]:
+        """Upserts de anúncios analisados"""
+        return cls._upsert_operations(
+            docs, hashes, stored, ContentHash.AD_IMMUTABLE, ('analyzed_at',)
+        )
+    
+    @staticmethod
+    def _bulk_error_written(
+        error: BulkWriteError,
+        batch: List[Tuple[str, UpdateOne]],
+        label: str
+    ) -> List[str]:
+        """
+        Loga os erros de um bulk_write parcial
+        
+        Returns:
+            post_ids do lote gravados apesar dos erros
+        """
+        failed = set()
+        for write_error in error.details.get('writeErrors', []):
+            failed.add(write_error['index'])
+            post_id = batch[write_error['index']][0]
+            if write_error.get('code') == 11000:
+                logger.debug(f"{label.capitalize()} {post_id} já existe")
+            else:
+                logger.error(f"Erro ao salvar {label} {post_id}: {write_error.get('errmsg')}")
+        
+        return [post_id for index, (post_id, _) in enumerate(batch) if index not in failed]
+    
+    @staticmethod
+    def _analysis_outcome_operations(
+        outcomes: Dict[str, str],
+        prompt_version: str
+    ) -> List[UpdateOne]:
+        """Atualizações do ledger de raw_posts com o resultado das análises"""
+        now = datetime.utcnow()
+        return [
+            UpdateOne(
+                {'post_id': post_id},
+                {'$set': {
+                    'analysis_status': status,
+                    'analysis_prompt_version': prompt_version,
+                    'analysis_at': now
+                }}
+            )
+            for post_id, status in outcomes.items()
+        ]
+    
+    @staticmethod
+    def _unanalyzed_query(include_errors: bool = False) -> Dict:
+        """Filtro do ledger para posts pendentes de análise"""
+        statuses = [AnalysisStatus.PENDING.value]
+        if include_errors:
+            statuses.append(AnalysisStatus.ERROR.value)
+        return {'analysis_status': {'$in': statuses}}
+    
+    @staticmethod
+    def _search_query(
+        equipment_type: Optional[str] = None,
+        brand: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        state: Optional[str] = None,
+        has_repair: Optional[bool] = None
+    ) -> Dict:
+        """Filtro de search_ads"""
+        query = {'is_advertisement': True}
+        
+        if equipment_type:
+            query['equipment_type'] = equipment_type
+        
+        if brand:
+            # Igualdade na chave normalizada (usa índice; sem $regex)
+            query['brand_key'] = BrandNormalizer.canonical_key(brand)
+        
+        if min_price is not None or max_price is not None:
+            query['price'] = {}
+            if min_price is not None:
+                query['price']['$gte'] = min_price
+            if max_price is not None:
+                query['price']['$lte'] = max_price
+        
+        if state:
+            query['state'] = state.upper()
+        
+        if has_repair is not None:
+            query['has_repair'] = has_repair
+        
+        return query
+    
+    @staticmethod
+    def _recent_query(hours: int) -> Dict:
+        """Filtro de get_recent_ads (publicados nas últimas horas)"""
+        cutoff = datetime.utcnow() - timedelta(hours=hours)
+        return {'is_advertisement': True, 'posted_at': {'$gte': cutoff}}
+    
+    @staticmethod
+    def _high_potential_query(
+        min_score: int,
+        equipment_type: Optional[str] = None,
+        include_unavailable: bool = False
+    ) -> Dict:
+        """Filtro de get_high_potential_ads"""
+        query = {
+            'is_advertisement': True,
+            'resale_total_score': {'$gte': min_score}
+        }
+        
+        if equipment_type:
+            query['equipment_type'] = equipment_type
+        
+        if not include_unavailable:
+            # $nin também aceita anúncios salvos antes do campo existir;
+            # sem índice próprio (ver _create_indexes)
+            query['availability_status'] = {
+                '$nin': [AvailabilityStatus.RESERVED.value, AvailabilityStatus.SOLD.value]
+            }
+        
+        return query
+    
+    @classmethod
+    def _text_search_pipeline(
+        cls,
+        search_text: str,
+        limit: int,
+        page_token: Optional[str] = None,
+        projection: str = 'full'
+    ) -> List[Dict]:
+        """
+        Pipeline de text_search (roda em ad_details, onde fica a descrição)
+        
+        O textScore só existe dentro da consulta, então a paginação
+        materializa o score antes de aplicar o filtro de keyset. Projeta
+        post_id, score e os campos frios pedidos; o resto do anúncio vem
+        de equipment_ads (_text_search_page).
+        """
+        pipeline = [
+            {'$match': {'$text': {'$search': search_text}, 'is_advertisement': True}},
+            {'$addFields': {'score': {'$meta': 'textScore'}}}
+        ]
+        if page_token:
+            pipeline.append({'$match': cls._keyset_filter('score', page_token)})
+        pipeline += [
+            {'$sort': {'score': -1, '_id': -1}},
+            {'$limit': limit + 1}
+        ]
+        details = AdDetails.projection(cls._projection(projection)) or {'post_id': 1}
+        details.pop('_id', None)
+        pipeline.append({'$project': {**details, 'score': 1}})
+        
+        return pipeline
+    
+    @classmethod
+    def _text_search_page(cls, rows: List[Dict], ads: Dict[str, Dict], limit: int) -> Page:
+        """
+        Página de text_search a partir das linhas de ad_details
+        
+        Args:
+            rows: Resultado do pipeline (limit + 1, mais relevantes primeiro)
+            ads: post_id -> documento de equipment_ads
+            limit: Documentos por página
+            
+        Returns:
+            Página de anúncios com score (o token vem de ad_details)
+        """
+        page = cls._make_page(rows, 'score', limit)
+        items = []
+        for row in page:
+            ad = ads.get(row['post_id'])
+            if ad is None:
+                continue
+            AdDetails.merge(ad, row)
+            ad['score'] = row['score']
+            items.append(ad)
+        return Page(items, page.next_token)
+    
+    def get_raw_posts_by_ids(self, post_ids: List[str]) -> Dict[str, Dict]:
+        """
+        Busca posts brutos já salvos
+
+        Args:
+            post_ids: IDs dos posts
+
+        Returns:
+            Dicionário post_id -> documento
+        """
+        if not post_ids:
+            return {}
+
+        return {
+            doc['post_id']: doc
+            for doc in self.db.raw_posts.find({'post_id': {'$in': list(post_ids)}})
+        }
+
+    def get_ads_by_post_ids(
+        self,
+        post_ids: List[str],
+        projection: str = 'full'
+    ) -> Dict[str, Dict]:
+        """
+        Busca anúncios já analisados
+
+        Args:
+            post_ids: IDs dos posts
+            projection: Perfil de campos ('summary', 'card' ou 'full')
+
+        Returns:
+            Dicionário post_id -> documento
+        """
+        if not post_ids:
+            return {}
+
+        fields = self._projection(projection)
+        docs = list(self.db.equipment_ads.find({'post_id': {'$in': list(post_ids)}}, fields))
+        return {doc['post_id']: doc for doc in self.details.attach(docs, fields)}
+
+    def update_ad_fields(self, post_id: str, fields: Dict[str, Any]) -> bool:
+        """
+        Atualiza campos de um anúncio existente (sem reanálise)
+
+        Args:
+            post_id: ID do post
+            fields: Campos a atualizar ($set)
+
+        Returns:
+            True se o anúncio foi encontrado
+        """
+        previous = self._previous_ads([post_id]).get(post_id)
+        hot, details = AdDetails.split(fields)
+        
+        result = self.db.equipment_ads.update_one(
+            {'post_id': post_id},
+            {**({'$set': hot} if hot else {}), **ContentHash.INVALIDATE}
+        )
+        if result.matched_count:
+            self.details.write({post_id: details})
+        
+        if previous:
+            updated = StatsStore.apply_set(previous, hot)
+            self.stats.apply_delta([previous], [updated])
+            self.history.record({post_id: previous}, [updated])
+        return result.matched_count > 0
+
+    def bulk_update_ad_fields(self, updates: Dict[str, Dict[str, Any]]) -> int:
+        """
+        Atualiza campos de vários anúncios em uma única ida ao banco
+
+        Args:
+            updates: Dicionário post_id -> campos a atualizar ($set)
+
+        Returns:
+            Número de anúncios modificados
+        """
+        split = {post_id: AdDetails.split(fields) for post_id, fields in updates.items() if fields}
+        operations = [
+            UpdateOne({'post_id': post_id}, {**({'$set': hot} if hot else {}), **ContentHash.INVALIDATE})
+            for post_id, (hot, _) in split.items()
+        ]
+        if not operations:
+            return 0
+
+        previous = self._previous_ads(list(split))
+
+        result = self.db.equipment_ads.bulk_write(operations, ordered=False)
+        self.details.write({post_id: split[post_id][1] for post_id in previous})
+
+        updated = [
+            StatsStore.apply_set(doc, split[post_id][0]) for post_id, doc in previous.items()
+        ]
+        self.stats.apply_delta(list(previous.values()), updated)
+        self.history.record(previous, updated)
+        return result.modified_count
+
+    def update_engagement(self, posts: List[FacebookPost]) -> int:
+        """
+        Atualiza apenas contadores de engajamento e comentários dos posts brutos
+
+        Args:
+            posts: Lista de FacebookPost com engajamento atualizado
+
+        Returns:
+            Número de posts modificados
+        """
+        operations = [
+            UpdateOne(
+                {'post_id': post.post_id},
+                {'$set': {
+                    'likes_count': post.likes_count,
+                    'comments_count': post.comments_count,
+                    'shares_count': post.shares_count,
+                    'comments': post.comments
+                }, **ContentHash.INVALIDATE}
+            )
+            for post in posts
+        ]
+        if not operations:
+            return 0
+
+        result = self.db.raw_posts.bulk_write(operations, ordered=False)
+        return result.modified_count
+
+    def update_availability(self, statuses: Dict[str, str]) -> int:
+        """
+        Atualiza o status de disponibilidade dos anúncios (vendido/reservado)
+        
+        O status só avança (disponível -> reservado -> vendido): um anúncio
+        vendido continua vendido mesmo que o comentário de venda não venha
+        no próximo scraping.
+        
+        Args:
+            statuses: Dicionário post_id -> AvailabilityStatus
+            
+        Returns:
+            Número de anúncios com status alterado
+        """
+        previous = self._previous_ads(list(statuses))
+        statuses = AvailabilityDetector.upgrades(statuses, {
+            post_id: doc.get('availability_status') for post_id, doc in previous.items()
+        })
+        if not statuses:
+            return 0
+        
+        # O $nin também protege de um status mais avançado gravado em paralelo
+        operations = [
+            UpdateOne(
+                {
+                    'post_id': post_id,
+                    'availability_status': {'$nin': AvailabilityDetector.at_least(status)}
+                },
+                {'$set': {'availability_status': status}, **ContentHash.INVALIDATE}
+            )
+            for post_id, status in statuses.items()
+        ]
+        
+        result = self.db.equipment_ads.bulk_write(operations, ordered=False)
+        if result.modified_count:
+            self.history.record(previous, [
+                StatsStore.apply_set(previous[post_id], {'availability_status': status})
+                for post_id, status in statuses.items()
+            ])
+            logger.info(f"✓ {result.modified_count} anúncios com disponibilidade alterada")
+        return result.modified_count
+    
+    def enqueue_for_analysis(self, priorities: Dict[str, float], lane: str = "backlog") -> int:
+        """
+        Coloca posts na fila de análise (ou atualiza prioridade/raia)
+        
+        Args:
+            priorities: Dicionário post_id -> prioridade
+            lane: "fresh" (incremental) ou "backlog" (histórico)
+            
+        Returns:
+            Número de posts novos na fila
+        """
+        now = datetime.utcnow()
+        operations = [
+            UpdateOne(
+                {'post_id': post_id},
+                {
+                    '$set': {'priority': priority, 'lane': lane},
+                    '$setOnInsert': {'enqueued_at': now, 'claimed_until': None}
+                },
+                upsert=True
+            )
+            for post_id, priority in priorities.items()
+        ]
+        if not operations:
+            return 0
+        
+        result = self.db.analysis_queue.bulk_write(operations, ordered=False)
+        return result.upserted_count
+    
+    def get_queued_posts(self, limit: Optional[int] = None, lane: str = "backlog") -> List[Dict]:
+        """
+        Busca entradas livres de uma raia da fila, da maior para a menor prioridade
+        
+        Args:
+            limit: Número máximo de entradas
+            lane: Raia da fila
+            
+        Returns:
+            Lista de {post_id, priority}
+        """
+        cursor = (
+            self.db.analysis_queue
+            .find(
+                {
+                    'lane': lane,
+                    '$or': [
+                        {'claimed_until': None},
+                        {'claimed_until': {'$lt': datetime.utcnow()}}
+                    ]
+                },
+                {'_id': 0, 'post_id': 1, 'priority': 1}
+            )
+            .sort('priority', DESCENDING)
+        )
+        if limit:
+            cursor = cursor.limit(limit)
+        return list(cursor)
+    
+    def claim_queued_post(self, post_id: str, seconds: int = 600) -> bool:
+        """
+        Reserva um post da fila para este processo (evita análise em dobro
+        quando histórico e incremental rodam ao mesmo tempo)
+        
+        Args:
+            post_id: ID do post
+            seconds: Duração da reserva
+            
+        Returns:
+            True se a reserva foi obtida
+        """
+        now = datetime.utcnow()
+        result = self.db.analysis_queue.update_one(
+            {
+                'post_id': post_id,
+                '$or': [
+                    {'claimed_until': None},
+                    {'claimed_until': {'$lt': now}}
+                ]
+            },
+            {'$set': {'claimed_until': now + timedelta(seconds=seconds)}}
+        )
+        return result.modified_count == 1
+    
+    def dequeue_posts(self, post_ids: List[str]) -> int:
+        """
+        Remove posts da fila de análise
+        
+        Args:
+            post_ids: IDs dos posts já analisados
+            
+        Returns:
+            Número de entradas removidas
+        """
+        if not post_ids:
+            return 0
+        
+        result = self.db.analysis_queue.delete_many({'post_id': {'$in': list(post_ids)}})
+        return result.deleted_count
+    
+    def load_rate_limit(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Estado de um rate limit compartilhado entre processos
+        
+        Args:
+            key: Nome do rate limit
+            
+        Returns:
+            Documento gravado (com version) ou None
+        """
+        return self.db.rate_limits.find_one({'_id': key}, {'_id': 0})
+    
+    def save_rate_limit(self, key: str, state: Dict[str, Any], version: Optional[int]) -> bool:
+        """
+        Grava o estado de um rate limit se ninguém o alterou desde a leitura
+        
+        Args:
+            key: Nome do rate limit
+            state: Novo estado
+            version: Versão lida (None = documento ainda não existe)
+            
+        Returns:
+            True se gravou; False se outro processo gravou antes
+        """
+        if version is None:
+            try:
+                self.db.rate_limits.insert_one({'_id': key, **state, 'version': 1})
+                return True
+            except DuplicateKeyError:
+                return False
+        
+        result = self.db.rate_limits.update_one(
+            {'_id': key, 'version': version},
+            {'$set': {**state, 'version': version + 1}}
+        )
+        return result.modified_count == 1
+    
+    def record_analysis_outcomes(
+        self,
+        outcomes: Dict[str, str],
+        prompt_version: str
+    ) -> int:
+        """
+        Registra no ledger de raw_posts o resultado da análise de cada post
+        
+        Args:
+            outcomes: Dicionário post_id -> AnalysisStatus
+            prompt_version: OpenAIAnalyzer.PROMPT_VERSION usado
+            
+        Returns:
+            Número de posts atualizados
+        """
+        operations = self._analysis_outcome_operations(outcomes, prompt_version)
+        if not operations:
+            return 0
+        
+        result = self.db.raw_posts.bulk_write(operations, ordered=False)
+        return result.modified_count
+    
+    def get_unanalyzed_posts(
+        self,
+        limit: Optional[int] = 100,
+        include_errors: bool = False,
+        batch_size: int = 100
+    ) -> Iterator[Dict]:
+        """
+        Busca posts que ainda não foram analisados
+        
+        Usa o ledger (analysis_status) de raw_posts: é uma varredura do índice
+        e posts classificados como não-anúncio nunca voltam.
+        
+        Args:
+            limit: Número máximo de posts (None = todos)
+            include_errors: Incluir posts cuja análise falhou
+            batch_size: Documentos por ida ao banco no cursor
+            
+        Returns:
+            Cursor (iterável) de posts não analisados
         """
-        self.connection_string = connection_string or os.getenv(
-            "MONGODB_URI", 
-            "mongodb://localhost:27017/"
+        cursor = (
+            self.db.raw_posts
+            .find(self._unanalyzed_query(include_errors))
+            .batch_size(batch_size)
         )
-        self.database_name = database_name
+        if limit:
+            cursor = cursor.limit(limit)
         
-        try:
-            self.client = MongoClient(self.connection_string)
-            # Testar conexão
-            self.client.admin.command('ping')
-            self.db = self.client[database_name]
-            
-            # Criar índices
-            self._create_indexes()
-            
-            logger.info(f"✓ Conectado ao MongoDB: {database_name}")
-            
-        except ConnectionFailure as e:
-            logger.error(f"Erro ao conectar no MongoDB: {str(e)}")
-            raise
+        return cursor
     
-    def _create_indexes(self):
-        """Cria índices otimizados"""
+    def backfill_analysis_ledger(self, batch_size: int = None) -> int:
+        """
+        Preenche analysis_status em posts salvos antes do ledger existir
         
-        # Collection: raw_posts
-        self.db.raw_posts.create_index([("post_id", ASCENDING)], unique=True)
-        self.db.raw_posts.create_index([("scraped_at", DESCENDING)])
-        self.db.raw_posts.create_index([("group_url", ASCENDING)])
+        Posts com anúncio em equipment_ads viram "ad"; os demais ficam
+        "pending" (não há como saber se já foram analisados).
         
-        # Collection: equipment_ads
-        self.db.equipment_ads.create_index([("post_id", ASCENDING)], unique=True)
-        self.db.equipment_ads.create_index([("analyzed_at", DESCENDING)])
-        self.db.equipment_ads.create_index([("is_advertisement", ASCENDING)])
-        self.db.equipment_ads.create_index([("equipment_type", ASCENDING)])
-        self.db.equipment_ads.create_index([("brand", ASCENDING)])
-        self.db.equipment_ads.create_index([("state", ASCENDING)])
-        self.db.equipment_ads.create_index([("price", ASCENDING)])
-        self.db.equipment_ads.create_index([("resale_score", DESCENDING)])  # NOVO
-        
-        # Índice composto para queries comuns
-        self.db.equipment_ads.create_index([
-            ("is_advertisement", ASCENDING),
-            ("equipment_type", ASCENDING),
-            ("brand", ASCENDING)
-        ])
+        Args:
+            batch_size: Operações por bulk_write
+            
+        Returns:
+            Número de posts atualizados
+        """
+        batch_size = batch_size or DEFAULT_BATCH_SIZE
+        cursor = self.db.raw_posts.find(
+            {'analysis_status': {'$exists': False}},
+            {'_id': 0, 'post_id': 1}
+        ).batch_size(batch_size)
         
-        # Índice de texto para busca full-text
-        self.db.equipment_ads.create_index([
-            ("description", "text"),
-            ("brand", "text"),
-            ("model", "text")
-        ])
+        updated = 0
+        batch = []
+        for doc in cursor:
+            batch.append(doc['post_id'])
+            if len(batch) >= batch_size:
+                updated += self._backfill_ledger_batch(batch)
+                batch = []
+        if batch:
+            updated += self._backfill_ledger_batch(batch)
         
-        logger.info("✓ Índices criados")
+        logger.info(f"✓ Ledger de análise preenchido em {updated} posts")
+        return updated
+    
+    def _backfill_ledger_batch(self, post_ids: List[str]) -> int:
+        ad_ids = {
+            doc['post_id']
+            for doc in self.db.equipment_ads.find(
+                {'post_id': {'$in': post_ids}}, {'_id': 0, 'post_id': 1}
+            )
+        }
+        operations = [
+            UpdateOne(
+                {'post_id': post_id, 'analysis_status': {'$exists': False}},
+                {'$set': {'analysis_status': (
+                    AnalysisStatus.AD.value if post_id in ad_ids
+                    else AnalysisStatus.PENDING.value
+                )}}
+            )
+            for post_id in post_ids
+        ]
+        return self.db.raw_posts.bulk_write(operations, ordered=False).modified_count
     
-    def save_raw_posts(self, posts: List[FacebookPost]) -> int:
+    def backfill_resale_scores(self, batch_size: int = None) -> int:
         """
-        Salva posts brutos
+        Copia o score de revenda (dict) para os campos numéricos de primeiro
+        nível em anúncios salvos antes deles existirem
         
         Args:
-            posts: Lista de FacebookPost
+            batch_size: Operações por bulk_write
             
         Returns:
-            Número de posts salvos
+            Número de anúncios atualizados
         """
-        if not posts:
-            return 0
+        updated = self._backfill_ads(
+            {
+                'resale_score.total_score': {'$exists': True},
+                'resale_total_score': {'$exists': False}
+            },
+            {'resale_score': 1},
+            lambda doc: ResaleScorer.flat_fields(doc['resale_score']),
+            batch_size
+        )
         
-        saved = 0
-        for post in posts:
-            try:
-                doc = post.to_dict()
-                doc['scraped_at'] = datetime.utcnow()
-                
-                # Upsert (insert ou update se já existe)
-                self.db.raw_posts.update_one(
-                    {'post_id': post.post_id},
-                    {'$set': doc},
-                    upsert=True
-                )
-                saved += 1
-                
-            except DuplicateKeyError:
-                logger.debug(f"Post {post.post_id} já existe")
-            except Exception as e:
-                logger.error(f"Erro ao salvar post {post.post_id}: {str(e)}")
+        logger.info(f"✓ Scores de revenda achatados em {updated} anúncios")
+        return updated
+    
+    def backfill_brand_keys(self, batch_size: int = None) -> int:
+        """
+        Preenche brand_key (marca normalizada) em anúncios antigos
+        
+        Args:
+            batch_size: Operações por bulk_write
+            
+        Returns:
+            Número de anúncios atualizados
+        """
+        updated = self._backfill_ads(
+            {'brand': {'$ne': None}, 'brand_key': {'$exists': False}},
+            {'brand': 1},
+            lambda doc: {'brand_key': BrandNormalizer.canonical_key(doc['brand'])},
+            batch_size
+        )
         
-        logger.info(f"✓ {saved} posts salvos no MongoDB")
-        return saved
+        logger.info(f"✓ brand_key preenchido em {updated} anúncios")
+        return updated
     
-    def save_equipment_ads(self, ads: List[EquipmentAd]) -> int:
+    def backfill_listing_keys(self, batch_size: int = None) -> int:
         """
-        Salva anúncios analisados
+        Preenche listing_key (agrupamento de reposts) em anúncios antigos
+        
+        Rode depois de backfill_brand_keys: a chave usa a marca normalizada.
         
         Args:
-            ads: Lista de EquipmentAd
+            batch_size: Operações por bulk_write
             
         Returns:
-            Número de anúncios salvos
+            Número de anúncios atualizados
         """
-        if not ads:
-            return 0
+        updated = self._backfill_ads(
+            {'listing_key': {'$exists': False}},
+            {'seller_name': 1, 'equipment_type': 1, 'brand_key': 1, 'model': 1, 'size': 1},
+            lambda doc: {'listing_key': AdHistory.listing_key(
+                doc['post_id'], doc.get('seller_name'), doc.get('equipment_type'),
+                doc.get('brand_key'), doc.get('model'), doc.get('size')
+            )},
+            batch_size
+        )
         
-        saved = 0
-        for ad in ads:
-            try:
-                doc = ad.to_dict()
-                doc['analyzed_at'] = datetime.utcnow()
-                
-                # Upsert
-                self.db.equipment_ads.update_one(
-                    {'post_id': ad.post_id},
-                    {'$set': doc},
-                    upsert=True
-                )
-                saved += 1
-                
-            except DuplicateKeyError:
-                logger.debug(f"Anúncio {ad.post_id} já existe")
-            except Exception as e:
-                logger.error(f"Erro ao salvar anúncio {ad.post_id}: {str(e)}")
+        logger.info(f"✓ listing_key preenchido em {updated} anúncios")
+        return updated
+    
+    def backfill_posted_at(self, batch_size: int = None) -> int:
+        """
+        Preenche posted_at (publicação do post, indexado) em posts e anúncios
+        antigos a partir do time do Apify; sem data válida, usa o momento da
+        coleta/análise
+        
+        Args:
+            batch_size: Operações por bulk_write
+            
+        Returns:
+            Número de documentos atualizados
+        """
+        posts = self._backfill_ads(
+            {'posted_at': {'$exists': False}},
+            {'time': 1, 'scraped_at': 1},
+            lambda doc: {'posted_at': parse_post_time(doc.get('time')) or doc.get('scraped_at')},
+            batch_size,
+            collection=self.db.raw_posts
+        )
+        ads = self._backfill_ads(
+            {'posted_at': {'$exists': False}},
+            {'scraped_at': 1, 'analyzed_at': 1},
+            lambda doc: {
+                'posted_at': parse_post_time(doc.get('scraped_at')) or parse_post_time(doc.get('analyzed_at'))
+            },
+            batch_size
+        )
         
-        logger.info(f"✓ {saved} anúncios salvos no MongoDB")
-        return saved
+        logger.info(f"✓ posted_at preenchido em {posts} posts e {ads} anúncios")
+        return posts + ads
     
-    def get_unanalyzed_posts(self, limit: int = 100) -> List[Dict]:
+    def migrate_ad_details(self, batch_size: int = None) -> int:
         """
-        Busca posts que ainda não foram analisados
+        Move os campos volumosos (AdDetails.FIELDS) de anúncios antigos para
+        ad_details, deixando os documentos de equipment_ads compactos
+        
+        Campos que já existem em ad_details (gravados depois da separação)
+        são mantidos. O espaço liberado só volta ao disco depois de um
+        compact em equipment_ads.
         
         Args:
-            limit: Número máximo de posts
+            batch_size: Anúncios por lote
             
         Returns:
-            Lista de posts não analisados
+            Número de anúncios migrados
         """
-        # Posts que não estão em equipment_ads
-        analyzed_ids = set(
-            doc['post_id'] 
-            for doc in self.db.equipment_ads.find({}, {'post_id': 1})
+        batch_size = batch_size or DEFAULT_BATCH_SIZE
+        query = {'$or': [{field: {'$exists': True}} for field in AdDetails.FIELDS]}
+        projection = {
+            '_id': 0, 'post_id': 1,
+            **{field: 1 for field in AdDetails.FIELDS + AdDetails.TEXT_FIELDS}
+        }
+        cursor = self.db.equipment_ads.find(query, projection).batch_size(batch_size)
+        
+        moved = 0
+        batch = []
+        for doc in cursor:
+            batch.append(doc)
+            if len(batch) >= batch_size:
+                moved += self._move_ad_details(batch)
+                batch = []
+        if batch:
+            moved += self._move_ad_details(batch)
+        
+        logger.info(f"✓ {moved} anúncios com campos movidos para ad_details")
+        return moved
+    
+    def _move_ad_details(self, docs: List[Dict]) -> int:
+        """Grava um lote em ad_details e remove os campos de equipment_ads"""
+        stored = self.details.fetch(
+            [doc['post_id'] for doc in docs], AdDetails.projection(None)
         )
+        self.details.write({
+            doc['post_id']: AdDetails.missing(AdDetails.split(doc)[1], stored.get(doc['post_id'], {}))
+            for doc in docs
+        })
         
-        posts = list(
-            self.db.raw_posts.find({
-                'post_id': {'$nin': list(analyzed_ids)}
-            }).limit(limit)
+        # O content_hash continua válido: cobre o anúncio inteiro, não o layout
+        unset = {'$unset': {field: '' for field in AdDetails.FIELDS}}
+        result = self.db.equipment_ads.bulk_write(
+            [UpdateOne({'post_id': doc['post_id']}, unset) for doc in docs], ordered=False
         )
+        return result.modified_count
+    
+    def _backfill_ads(
+        self,
+        query: Dict,
+        projection: Dict,
+        compute,
+        batch_size: int = None,
+        collection=None
+    ) -> int:
+        """
+        Percorre documentos em lotes aplicando $set com os campos calculados
+        
+        Args:
+            query: Filtro dos documentos a migrar
+            projection: Campos necessários para o cálculo
+            compute: Função documento -> campos ($set)
+            batch_size: Operações por bulk_write
+            collection: Collection a migrar (default: equipment_ads)
+            
+        Returns:
+            Número de documentos atualizados
+        """
+        batch_size = batch_size or DEFAULT_BATCH_SIZE
+        collection = collection if collection is not None else self.db.equipment_ads
+        cursor = collection.find(
+            query, {'_id': 0, 'post_id': 1, **projection}
+        ).batch_size(batch_size)
+        
+        updated = 0
+        operations = []
+        for doc in cursor:
+            operations.append(UpdateOne(
+                {'post_id': doc['post_id']}, {'$set': compute(doc), **ContentHash.INVALIDATE}
+            ))
+            if len(operations) >= batch_size:
+                updated += collection.bulk_write(operations, ordered=False).modified_count
+                operations = []
+        if operations:
+            updated += collection.bulk_write(operations, ordered=False).modified_count
+        
+        return updated
+    
+    @classmethod
+    def _keyset_filter(cls, sort_field: str, page_token: str) -> Dict:
+        """Filtro dos documentos após o token na ordem (sort_field desc, _id desc)"""
+        value, _id = cls._decode_page_token(page_token)
+        return {'$or': [
+            {sort_field: {'$lt': value}},
+            {sort_field: value, '_id': {'$lt': _id}}
+        ]}
+    
+    @classmethod
+    def _keyset_query(cls, query: Dict, sort_field: str, page_token: Optional[str]) -> Dict:
+        """Filtro da consulta restrito à página após o token (se houver)"""
+        if not page_token:
+            return query
+        return {'$and': [query, cls._keyset_filter(sort_field, page_token)]}
+    
+    @classmethod
+    def _make_page(cls, docs: List[Dict], sort_field: str, limit: int) -> Page:
+        """Corta o documento extra (limit + 1) e gera o token se houver mais"""
+        if len(docs) <= limit:
+            return Page(docs)
+        
+        docs = docs[:limit]
+        last = docs[-1]
+        return Page(docs, cls._encode_page_token(last.get(sort_field), last['_id']))
+    
+    def _keyset_page(
+        self,
+        query: Dict,
+        sort_field: str,
+        limit: int,
+        page_token: Optional[str] = None,
+        projection: str = 'full'
+    ) -> Page:
+        """
+        Paginação por keyset: ordena por (sort_field, _id) decrescentes e
+        continua após o último documento da página anterior, sem skip
         
-        logger.info(f"Encontrados {len(posts)} posts não analisados")
-        return posts
+        Args:
+            query: Filtro da consulta
+            sort_field: Campo de ordenação (decrescente)
+            limit: Documentos por página
+            page_token: Token da página anterior
+            projection: Perfil de campos ('summary', 'card' ou 'full')
+            
+        Returns:
+            Página de documentos
+        """
+        fields = self._projection(projection)
+        docs = list(
+            self.db.equipment_ads
+            .find(self._keyset_query(query, sort_field, page_token), fields)
+            .sort([(sort_field, DESCENDING), ('_id', DESCENDING)])
+            .limit(limit + 1)
+        )
+        page = self._make_page(docs, sort_field, limit)
+        self.details.attach(page, fields)
+        return page
     
     def search_ads(
         self,
@@ -181,8 +1352,10 @@ class MongoDBPersistence:
         max_price: Optional[float] = None,
         state: Optional[str] = None,
         has_repair: Optional[bool] = None,
-        limit: int = 100
-    ) -> List[Dict]:
+        limit: int = 100,
+        page_token: Optional[str] = None,
+        projection: str = 'full'
+    ) -> Page:
         """
         Busca anúncios com filtros
         
@@ -193,63 +1366,47 @@ class MongoDBPersistence:
             max_price: Preço máximo
             state: Estado (sigla)
             has_repair: Tem reparo?
-            limit: Limite de resultados
+            limit: Limite de resultados por página
+            page_token: Token da página anterior (Page.next_token)
+            projection: Perfil de campos ('summary', 'card' ou 'full')
             
         Returns:
-            Lista de anúncios
+            Página de anúncios (mais recentes primeiro)
         """
-        query = {'is_advertisement': True}
-        
-        if equipment_type:
-            query['equipment_type'] = equipment_type
-        
-        if brand:
-            query['brand'] = {'$regex': brand, '$options': 'i'}
-        
-        if min_price is not None or max_price is not None:
-            query['price'] = {}
-            if min_price is not None:
-                query['price']['$gte'] = min_price
-            if max_price is not None:
-                query['price']['$lte'] = max_price
-        
-        if state:
-            query['state'] = state.upper()
-        
-        if has_repair is not None:
-            query['has_repair'] = has_repair
-        
-        ads = list(
-            self.db.equipment_ads
-            .find(query)
-            .sort('analyzed_at', DESCENDING)
-            .limit(limit)
+        query = self._search_query(
+            equipment_type, brand, min_price, max_price, state, has_repair
         )
         
+        ads = self._keyset_page(query, 'posted_at', limit, page_token, projection)
+        
         logger.info(f"Busca retornou {len(ads)} anúncios")
         return ads
     
-    def get_recent_ads(self, hours: int = 24, limit: int = 100) -> List[Dict]:
+    def get_recent_ads(
+        self,
+        hours: int = 24,
+        limit: int = 100,
+        page_token: Optional[str] = None,
+        projection: str = 'full'
+    ) -> Page:
         """
         Busca anúncios recentes
         
+        Filtra por posted_at (publicação do post): "últimas 24h" é um
+        range scan em ads_posted_summary, coberto com projection='summary'
+        (não lê os documentos).
+        
         Args:
             hours: Últimas X horas
-            limit: Limite de resultados
+            limit: Limite de resultados por página
+            page_token: Token da página anterior (Page.next_token)
+            projection: Perfil de campos ('summary', 'card' ou 'full')
             
         Returns:
-            Lista de anúncios recentes
+            Página de anúncios recentes
         """
-        cutoff = datetime.utcnow() - timedelta(hours=hours)
-        
-        ads = list(
-            self.db.equipment_ads
-            .find({
-                'is_advertisement': True,
-                'analyzed_at': {'$gte': cutoff}
-            })
-            .sort('analyzed_at', DESCENDING)
-            .limit(limit)
+        ads = self._keyset_page(
+            self._recent_query(hours), 'posted_at', limit, page_token, projection
         )
         
         logger.info(f"{len(ads)} anúncios nas últimas {hours} horas")
@@ -259,159 +1416,251 @@ class MongoDBPersistence:
         self,
         min_score: int = 70,
         equipment_type: Optional[str] = None,
-        limit: int = 100
-    ) -> List[Dict]:
+        limit: int = 100,
+        include_unavailable: bool = False,
+        page_token: Optional[str] = None,
+        projection: str = 'full'
+    ) -> Page:
         """
         Busca anúncios com alto potencial de revenda
         
+        Com projection='summary' a consulta é coberta pelo índice
+        ads_score_covering.
+        
         Args:
             min_score: Score mínimo (0-100)
             equipment_type: Filtrar por tipo
-            limit: Limite de resultados
+            limit: Limite de resultados por página
+            include_unavailable: Incluir anúncios vendidos/reservados
+            page_token: Token da página anterior (Page.next_token)
+            projection: Perfil de campos ('summary', 'card' ou 'full')
             
         Returns:
-            Lista de anúncios com alto potencial
+            Página de anúncios com alto potencial (maior score primeiro)
         """
-        query = {
-            'is_advertisement': True,
-            'resale_score': {'$gte': min_score}
-        }
-        
-        if equipment_type:
-            query['equipment_type'] = equipment_type
+        query = self._high_potential_query(min_score, equipment_type, include_unavailable)
         
-        ads = list(
-            self.db.equipment_ads
-            .find(query)
-            .sort('resale_score', DESCENDING)
-            .limit(limit)
-        )
+        ads = self._keyset_page(query, 'resale_total_score', limit, page_token, projection)
         
         logger.info(f"{len(ads)} anúncios com score ≥ {min_score}")
         return ads
     
+    def get_price_drops(
+        self,
+        min_drop_pct: float = 10,
+        days: int = 30,
+        limit: int = 50,
+        include_unavailable: bool = False,
+        projection: str = 'summary'
+    ) -> List[Dict]:
+        """
+        Anúncios cujo preço caiu pelo menos min_drop_pct% nos últimos dias
+        
+        Agrega ad_versions (índice parcial das mudanças de preço) por
+        listing_key, então um repost mais barato conta como queda.
+        
+        Args:
+            min_drop_pct: Queda mínima (%) do maior preço da janela ao atual
+            days: Janela em dias
+            limit: Máximo de resultados
+            include_unavailable: Incluir anúncios vendidos/reservados
+            projection: Perfil de campos do anúncio ('summary', 'card' ou 'full')
+            
+        Returns:
+            Lista de {listing_key, post_id, peak_price, price, drop_pct,
+            price_changes, last_change_at, ad}, maior queda primeiro
+        """
+        pipeline = AdHistory.price_drop_pipeline(
+            min_drop_pct, days, limit, self._projection(projection), include_unavailable
+        )
+        drops = list(self.db.ad_versions.aggregate(pipeline))
+        self.details.attach([drop['ad'] for drop in drops], self._projection(projection))
+        
+        logger.info(f"{len(drops)} anúncios com queda de preço ≥ {min_drop_pct}% em {days} dias")
+        return drops
+    
+    def get_listing_history(self, post_id: str) -> List[Dict]:
+        """
+        Versões de um anúncio, incluindo reposts (mesmo listing_key)
+        
+        Args:
+            post_id: ID de qualquer post do anúncio
+            
+        Returns:
+            Versões, mais antigas primeiro (vazio se o anúncio não existe)
+        """
+        ad = self.db.equipment_ads.find_one({'post_id': post_id}, {'listing_key': 1})
+        if not ad:
+            return []
+        return self.history.listing_history(ad.get('listing_key') or f"post:{post_id}")
+    
     def get_statistics(self) -> Dict[str, Any]:
         """
-        Gera estatísticas do banco de dados
+        Estatísticas do banco de dados (leitura O(1) da collection stats)
+        
+        Os contadores são mantidos a cada save/alteração de anúncio; mediana
+        e quantis de preço são aproximados pelo histograma (faixas de
+        R$ 250). Para o valor exato use compute_statistics().
+        
+        Returns:
+            Dicionário com estatísticas
+        """
+        stats = {
+            # Total de documentos (metadado da collection, sem varredura)
+            'total_raw_posts': self.db.raw_posts.estimated_document_count()
+        }
+        stats.update(self.stats.read())
+        return stats
+    
+    def rebuild_statistics(self) -> Dict[str, Any]:
+        """
+        Reconstrói as estatísticas materializadas do zero (reparo)
+        
+        Returns:
+            Estatísticas recalculadas
+        """
+        self.stats.rebuild()
+        return self.get_statistics()
+    
+    def compute_statistics(self) -> Dict[str, Any]:
+        """
+        Calcula estatísticas exatas com uma varredura de equipment_ads
+        
+        Todas as agregações de anúncios rodam em um único pipeline $facet
+        (uma varredura); mediana e quantis de preço são calculados no
+        servidor com $median/$percentile (MongoDB 7+).
         
         Returns:
             Dicionário com estatísticas
         """
         stats = {}
         
-        # Total de documentos
-        stats['total_raw_posts'] = self.db.raw_posts.count_documents({})
-        stats['total_ads'] = self.db.equipment_ads.count_documents({
-            'is_advertisement': True
-        })
+        # Total de documentos (metadado da collection, sem varredura)
+        stats['total_raw_posts'] = self.db.raw_posts.estimated_document_count()
         
-        # Agregações
         pipeline = [
             {'$match': {'is_advertisement': True}},
-            {'$group': {
-                '_id': '$equipment_type',
-                'count': {'$sum': 1},
-                'avg_price': {'$avg': '$price'}
+            {'$facet': {
+                'total_ads': [{'$count': 'count'}],
+                
+                'by_equipment_type': [
+                    {'$group': {
+                        '_id': '$equipment_type',
+                        'count': {'$sum': 1},
+                        'avg_price': {'$avg': '$price'}
+                    }}
+                ],
+                
+                # Top marcas
+                'top_brands': [
+                    {'$match': {'brand_key': {'$ne': None}}},
+                    {'$group': {'_id': '$brand_key', 'count': {'$sum': 1}}},
+                    {'$sort': {'count': -1}},
+                    {'$limit': 10}
+                ],
+                
+                # Por estado
+                'by_state': [
+                    {'$match': {'state': {'$ne': None}}},
+                    {'$group': {'_id': '$state', 'count': {'$sum': 1}}},
+                    {'$sort': {'count': -1}}
+                ],
+                
+                # Preços (quantis no servidor, sem $push de todos os valores)
+                'prices': [
+                    {'$match': {'price': {'$ne': None}}},
+                    {'$group': {
+                        '_id': None,
+                        'avg': {'$avg': '$price'},
+                        'min': {'$min': '$price'},
+                        'max': {'$max': '$price'},
+                        'median': {'$median': {
+                            'input': '$price', 'method': 'approximate'
+                        }},
+                        'quantiles': {'$percentile': {
+                            'input': '$price', 'p': [0.25, 0.75, 0.9],
+                            'method': 'approximate'
+                        }}
+                    }}
+                ],
+                
+                # Anúncios com reparo
+                'with_repair': [
+                    {'$match': {'has_repair': True}},
+                    {'$count': 'count'}
+                ],
+                
+                # Estatísticas de potencial de revenda
+                'resale_potential': [
+                    {'$match': {'resale_total_score': {'$ne': None}}},
+                    {'$group': {
+                        '_id': None,
+                        'avg_score': {'$avg': '$resale_total_score'},
+                        'min_score': {'$min': '$resale_total_score'},
+                        'max_score': {'$max': '$resale_total_score'},
+                        'high_potential': {
+                            '$sum': {'$cond': [{'$gte': ['$resale_total_score', 70]}, 1, 0]}
+                        },
+                        'medium_potential': {
+                            '$sum': {'$cond': [
+                                {'$and': [
+                                    {'$gte': ['$resale_total_score', 50]},
+                                    {'$lt': ['$resale_total_score', 70]}
+                                ]}, 1, 0
+                            ]}
+                        },
+                        'low_potential': {
+                            '$sum': {'$cond': [{'$lt': ['$resale_total_score', 50]}, 1, 0]}
+                        }
+                    }}
+                ]
             }}
         ]
         
+        facets = next(self.db.equipment_ads.aggregate(pipeline))
+        
+        stats['total_ads'] = facets['total_ads'][0]['count'] if facets['total_ads'] else 0
+        
         stats['by_equipment_type'] = {
             doc['_id']: {
                 'count': doc['count'],
                 'avg_price': doc.get('avg_price')
             }
-            for doc in self.db.equipment_ads.aggregate(pipeline)
+            for doc in facets['by_equipment_type']
         }
         
-        # Top marcas
-        pipeline = [
-            {'$match': {'is_advertisement': True, 'brand': {'$ne': None}}},
-            {'$group': {'_id': '$brand', 'count': {'$sum': 1}}},
-            {'$sort': {'count': -1}},
-            {'$limit': 10}
-        ]
-        
         stats['top_brands'] = [
-            {'brand': doc['_id'], 'count': doc['count']}
-            for doc in self.db.equipment_ads.aggregate(pipeline)
-        ]
-        
-        # Por estado
-        pipeline = [
-            {'$match': {'is_advertisement': True, 'state': {'$ne': None}}},
-            {'$group': {'_id': '$state', 'count': {'$sum': 1}}},
-            {'$sort': {'count': -1}}
+            {'brand': BrandNormalizer.display_name(doc['_id']), 'count': doc['count']}
+            for doc in facets['top_brands']
         ]
         
         stats['by_state'] = {
             doc['_id']: doc['count']
-            for doc in self.db.equipment_ads.aggregate(pipeline)
+            for doc in facets['by_state']
         }
         
-        # Preços
-        pipeline = [
-            {'$match': {'is_advertisement': True, 'price': {'$ne': None}}},
-            {'$group': {
-                '_id': None,
-                'avg': {'$avg': '$price'},
-                'min': {'$min': '$price'},
-                'max': {'$max': '$price'},
-                'median': {'$push': '$price'}
-            }}
-        ]
-        
-        price_stats = list(self.db.equipment_ads.aggregate(pipeline))
-        if price_stats:
-            ps = price_stats[0]
-            prices = sorted(ps['median'])
-            median = prices[len(prices)//2] if prices else None
+        if facets['prices']:
+            ps = facets['prices'][0]
+            p25, p75, p90 = ps['quantiles']
             
             stats['prices'] = {
                 'avg': ps.get('avg'),
                 'min': ps.get('min'),
                 'max': ps.get('max'),
-                'median': median
+                'median': ps.get('median'),
+                'p25': p25,
+                'p75': p75,
+                'p90': p90
             }
         
-        # Anúncios com reparo
-        stats['with_repair'] = self.db.equipment_ads.count_documents({
-            'is_advertisement': True,
-            'has_repair': True
-        })
-        
-        # Estatísticas de potencial de revenda (NOVO)
-        pipeline_resale = [
-            {'$match': {
-                'is_advertisement': True,
-                'resale_score': {'$ne': None}
-            }},
-            {'$group': {
-                '_id': None,
-                'avg_score': {'$avg': '$resale_score'},
-                'min_score': {'$min': '$resale_score'},
-                'max_score': {'$max': '$resale_score'},
-                'high_potential': {
-                    '$sum': {'$cond': [{'$gte': ['$resale_score', 70]}, 1, 0]}
-                },
-                'medium_potential': {
-                    '$sum': {'$cond': [
-                        {'$and': [
-                            {'$gte': ['$resale_score', 50]},
-                            {'$lt': ['$resale_score', 70]}
-                        ]}, 1, 0
-                    ]}
-                },
-                'low_potential': {
-                    '$sum': {'$cond': [{'$lt': ['$resale_score', 50]}, 1, 0]}
-                }
-            }}
-        ]
+        stats['with_repair'] = (
+            facets['with_repair'][0]['count'] if facets['with_repair'] else 0
+        )
         
-        resale_stats = list(self.db.equipment_ads.aggregate(pipeline_resale))
-        if resale_stats:
-            rs = resale_stats[0]
+        if facets['resale_potential']:
+            rs = facets['resale_potential'][0]
             stats['resale_potential'] = {
-                'avg_score': round(rs.get('avg_score', 0), 1),
+                'avg_score': round(rs.get('avg_score') or 0, 1),
                 'min_score': rs.get('min_score', 0),
                 'max_score': rs.get('max_score', 0),
                 'high_potential': rs.get('high_potential', 0),  # ≥70
@@ -421,67 +1670,177 @@ class MongoDBPersistence:
         
         return stats
     
-    def text_search(self, search_text: str, limit: int = 50) -> List[Dict]:
+    def text_search(
+        self,
+        search_text: str,
+        limit: int = 50,
+        page_token: Optional[str] = None,
+        projection: str = 'full'
+    ) -> Page:
         """
         Busca por texto (full-text search)
         
+        O textScore só existe dentro da consulta, então a paginação usa um
+        pipeline que o materializa antes de aplicar o filtro de keyset.
+        
         Args:
             search_text: Texto a buscar
-            limit: Limite de resultados
+            limit: Limite de resultados por página
+            page_token: Token da página anterior (Page.next_token)
+            projection: Perfil de campos ('summary', 'card' ou 'full')
             
         Returns:
-            Lista de anúncios
+            Página de anúncios (mais relevantes primeiro)
         """
-        ads = list(
-            self.db.equipment_ads
-            .find(
-                {'$text': {'$search': search_text}},
-                {'score': {'$meta': 'textScore'}}
-            )
-            .sort([('score', {'$meta': 'textScore'})])
-            .limit(limit)
-        )
+        pipeline = self._text_search_pipeline(search_text, limit, page_token, projection)
+        rows = list(self.db.ad_details.aggregate(pipeline))
+        
+        post_ids = [row['post_id'] for row in rows[:limit]]
+        hot = self.db.equipment_ads.find({'post_id': {'$in': post_ids}}, self._projection(projection))
+        ads = self._text_search_page(rows, {doc['post_id']: doc for doc in hot}, limit)
         
         logger.info(f"Busca por '{search_text}' retornou {len(ads)} resultados")
         return ads
     
-    def export_to_csv(self, output_file: str, query: Dict = None):
+    def iter_ads(
+        self,
+        query: Dict,
+        projection: Optional[Dict[str, int]] = None,
+        batch_size: int = None,
+        sort: Optional[List[Tuple[str, int]]] = None
+    ) -> Iterator[Dict]:
+        """
+        Percorre anúncios em streaming, completando cada lote com os campos
+        de ad_details pedidos pela projeção (uma consulta por lote)
+        
+        Args:
+            query: Filtro de equipment_ads
+            projection: Projeção (deve incluir post_id; None = documento inteiro)
+            batch_size: Documentos por lote
+            sort: Ordenação opcional do cursor
+            
+        Returns:
+            Iterador de documentos de anúncios
+        """
+        batch_size = batch_size or DEFAULT_BATCH_SIZE
+        cursor = self.db.equipment_ads.find(query, projection)
+        if sort:
+            cursor = cursor.sort(sort)
+        
+        batch = []
+        for doc in cursor.batch_size(batch_size):
+            batch.append(doc)
+            if len(batch) >= batch_size:
+                yield from self.details.attach(batch, projection)
+                batch = []
+        yield from self.details.attach(batch, projection)
+    
+    def export_to_csv(
+        self,
+        output_file: str,
+        query: Dict = None,
+        columns=None,
+        batch_size: int = None
+    ) -> int:
         """
-        Exporta dados para CSV (backup/análise)
+        Exporta anúncios para CSV (backup/análise) em streaming
+        
+        Lê o cursor em lotes e escreve linha a linha: a memória não cresce
+        com o tamanho da collection.
         
         Args:
             output_file: Caminho do arquivo CSV
             query: Query opcional para filtrar
+            columns: Campos a exportar (lista, perfil de projeção ou None)
+            batch_size: Documentos por ida ao banco no cursor
+            
+        Returns:
+            Número de anúncios exportados
         """
-        import pandas as pd
-        
         if query is None:
             query = {'is_advertisement': True}
         
-        ads = list(self.db.equipment_ads.find(query))
+        header = self.csv_columns(columns)
+        projection = {'_id': 0, 'post_id': 1, **{column: 1 for column in header}}
         
-        if ads:
-            df = pd.DataFrame(ads)
-            # Remover _id do MongoDB
-            if '_id' in df.columns:
-                df = df.drop('_id', axis=1)
-            
-            df.to_csv(output_file, index=False, encoding='utf-8')
-            logger.info(f"✓ {len(ads)} anúncios exportados para {output_file}")
+        exported = 0
+        with open(output_file, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            for doc in self.iter_ads(query, projection, batch_size):
+                writer.writerow([self._csv_value(doc, column) for column in header])
+                exported += 1
+        
+        if exported:
+            logger.info(f"✓ {exported} anúncios exportados para {output_file}")
         else:
             logger.warning("Nenhum anúncio para exportar")
+        return exported
     
     def close(self):
-        """Fecha conexão com MongoDB"""
-        if self.client:
-            self.client.close()
-            logger.info("Conexão MongoDB fechada")
+        """
+        Libera esta instância
+        
+        O MongoClient é compartilhado pelo processo e continua aberto para
+        as próximas instâncias; use close_all_clients() para fechá-lo.
+        """
+        self.db = None
+
+
+class BufferedWriter:
+    """
+    Acumula posts/anúncios e grava em lote no MongoDB
+    
+    Descarrega quando o buffer atinge batch_size ou quando, ao adicionar,
+    o último flush tiver mais de flush_interval segundos. Use como context
+    manager para garantir o flush final.
+    """
+    
+    def __init__(
+        self,
+        db: MongoDBPersistence,
+        batch_size: int = None,
+        flush_interval: float = 5.0
+    ):
+        self.db = db
+        self.batch_size = batch_size or DEFAULT_BATCH_SIZE
+        self.flush_interval = flush_interval
+        self._raw_posts: List[FacebookPost] = []
+        self._ads: List[EquipmentAd] = []
+        self._last_flush = time.monotonic()
+        self.saved = {'raw_posts': 0, 'equipment_ads': 0}
+    
+    def add_raw_posts(self, posts: List[FacebookPost]):
+        """Adiciona posts brutos ao buffer"""
+        self._raw_posts.extend(posts)
+        self._maybe_flush()
+    
+    def add_equipment_ads(self, ads: List[EquipmentAd]):
+        """Adiciona anúncios ao buffer"""
+        self._ads.extend(ads)
+        self._maybe_flush()
+    
+    def _maybe_flush(self):
+        pending = len(self._raw_posts) + len(self._ads)
+        expired = time.monotonic() - self._last_flush >= self.flush_interval
+        if pending >= self.batch_size or (pending and expired):
+            self.flush()
+    
+    def flush(self):
+        """Grava tudo o que está no buffer"""
+        if self._raw_posts:
+            posts, self._raw_posts = self._raw_posts, []
+            self.saved['raw_posts'] += self.db.save_raw_posts(posts, self.batch_size)
+        if self._ads:
+            ads, self._ads = self._ads, []
+            self.saved['equipment_ads'] += self.db.save_equipment_ads(ads, self.batch_size)
+        self._last_flush = time.monotonic()
     
     def __enter__(self):
         return self
     
     def __exit__(self, exc_type, exc_val, exc_tb):
-        self.close()
+        self.flush()
 
 
 # Funções auxiliares
@@ -500,7 +1859,7 @@ def init_database():
     
     with get_db() as db:
         # Collections são criadas automaticamente
-        # Índices são criados no __init__
+        db.ensure_indexes(force=True)
         
         stats = db.get_statistics()
         logger.info(f"Banco inicializado:")
@@ -508,3 +1867,25 @@ def init_database():
         logger.info(f"  - Anúncios: {stats['total_ads']}")
     
     logger.info("✓ Banco de dados pronto")
+
+
+def migrate_database():
+    """
+    Aplica as migrações de dados (idempotentes, em lotes)
+    Seguro para rodar mais de uma vez
+    """
+    logger.info("Migrando banco de dados...")
+    
+    with get_db() as db:
+        db.backfill_analysis_ledger()
+        db.backfill_resale_scores()
+        db.backfill_brand_keys()
+        db.backfill_listing_keys()
+        db.backfill_posted_at()
+        # Por último: os backfills acima podem gravar resale_score inteiro
+        db.migrate_ad_details()
+        
+        # Backfills gravam direto na collection: recontar as estatísticas
+        db.rebuild_statistics()
+    
+    logger.info("✓ Migrações concluídas")
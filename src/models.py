@@ -1,12 +1,48 @@
 """
 Data models para o sistema de scraping e análise
 """
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, asdict, fields
 from typing import Optional, List, Dict, Any
-from datetime import datetime
+from datetime import datetime, timezone
 from enum import Enum
 
 
+def parse_post_time(value: Any) -> Optional[datetime]:
+    """
+    Data/hora de publicação do post (campo time do Apify)
+
+    Args:
+        value: ISO 8601 ("2024-05-10T12:00:00.000Z"), epoch em segundos ou
+            milissegundos, ou datetime
+
+    Returns:
+        datetime em UTC sem fuso (como o pymongo devolve), ou None se não
+        for possível interpretar
+    """
+    if value is None or isinstance(value, bool) or value == '':
+        return None
+
+    if isinstance(value, datetime):
+        parsed = value
+    elif isinstance(value, (int, float)) or str(value).strip().isdigit():
+        seconds = float(value)
+        if seconds > 1e11:  # milissegundos
+            seconds /= 1000
+        try:
+            return datetime.fromtimestamp(seconds, timezone.utc).replace(tzinfo=None)
+        except (OverflowError, OSError, ValueError):
+            return None
+    else:
+        try:
+            parsed = datetime.fromisoformat(str(value).strip().replace('Z', '+00:00'))
+        except ValueError:
+            return None
+
+    if parsed.tzinfo:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
 class EquipmentType(str, Enum):
     """Tipos de equipamento de kitesurf"""
     KITE = "kite"
@@ -30,6 +66,21 @@ class EquipmentCondition(str, Enum):
     UNKNOWN = "desconhecido"
 
 
+class AvailabilityStatus(str, Enum):
+    """Disponibilidade do anúncio (detectada localmente nos comentários)"""
+    AVAILABLE = "disponivel"
+    RESERVED = "reservado"
+    SOLD = "vendido"
+
+
+class AnalysisStatus(str, Enum):
+    """Resultado da análise OpenAI registrado em raw_posts"""
+    PENDING = "pending"
+    AD = "ad"
+    NOT_AD = "not_ad"
+    ERROR = "error"
+
+
 @dataclass
 class FacebookPost:
     """Dados brutos do post do Facebook"""
@@ -51,6 +102,41 @@ class FacebookPost:
     
     def to_dict(self):
         return asdict(self)
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'FacebookPost':
+        """Recria um FacebookPost a partir de um documento salvo (ignora campos extras)"""
+        names = {f.name for f in fields(cls)}
+        return cls(**{k: v for k, v in data.items() if k in names})
+    
+    def to_analysis_input(self) -> Dict[str, Any]:
+        """Converte para o formato de post do Apify esperado pelo OpenAIAnalyzer"""
+        return {
+            "id": self.post_id,
+            "url": self.url,
+            "text": self.text,
+            "title": self.title,
+            "location": self.location,
+            "price": self.price,
+            "user": {"name": self.user_name},
+            "likesCount": self.likes_count,
+            "commentsCount": self.comments_count,
+            "sharesCount": self.shares_count,
+            "topComments": [{"text": c["text"]} for c in self.comments],
+            "sharedPost": {
+                "text": self.text,
+                "title": self.title,
+                "location": self.location,
+                "price": self.price,
+                "attachments": [
+                    {
+                        "__typename": "Photo",
+                        "photo_image": {"uri": img}
+                    }
+                    for img in self.images
+                ]
+            }
+        }
 
 @dataclass
 class EquipmentAd:
@@ -76,6 +162,7 @@ class EquipmentAd:
     
     # Detalhes do equipamento
     brand: Optional[str] = None
+    brand_key: Optional[str] = None  # Marca normalizada (BrandNormalizer)
     model: Optional[str] = None
     year: Optional[int] = None
     size: Optional[str] = None # ex: "12m", "136x41cm"
@@ -104,9 +191,15 @@ class EquipmentAd:
     
     # Análise de engajamento
     comment_interest_level: Optional[str] = None  # high, medium, low, negative
+    availability_status: str = "disponivel"  # AvailabilityStatus
     
-    # Score de revenda
+    # Score de revenda (dict completo + campos numéricos indexados)
     resale_score: Optional[Dict[str, Any]] = None
+    resale_total_score: Optional[float] = None
+    resale_brand_score: Optional[float] = None
+    resale_price_score: Optional[float] = None
+    resale_condition_score: Optional[float] = None
+    resale_interest_score: Optional[float] = None
     
     # Análise
     analysis_notes: Optional[str] = None
@@ -116,6 +209,9 @@ class EquipmentAd:
     seller_name: str = ""
     seller_profile_url: Optional[str] = None
     
+    # Mesmo anúncio entre reposts (AdHistory.listing_key)
+    listing_key: Optional[str] = None
+    
     def __post_init__(self):
         """Inicializar campos de lista vazios"""
         if self.additional_items is None:
@@ -126,6 +222,19 @@ class EquipmentAd:
             self.contact_preferences = []
         if self.keywords is None:
             self.keywords = []
+        if self.brand and self.brand_key is None:
+            from src.brand_normalizer import BrandNormalizer
+            self.brand_key = BrandNormalizer.canonical_key(self.brand)
+        if self.resale_score and self.resale_total_score is None:
+            from src.resale_scorer import ResaleScorer
+            for field, value in ResaleScorer.flat_fields(self.resale_score).items():
+                setattr(self, field, value)
+        if self.listing_key is None:
+            from src.ad_history import AdHistory
+            self.listing_key = AdHistory.listing_key(
+                self.post_id, self.seller_name, self.equipment_type,
+                self.brand_key, self.model, self.size
+            )
     
     def to_dict(self):
         return asdict(self)
@@ -133,6 +242,8 @@ class EquipmentAd:
     @classmethod
     def from_analysis(cls, post: FacebookPost, analysis: Dict[str, Any]) -> 'EquipmentAd':
         """Cria um EquipmentAd a partir da análise da OpenAI"""
+        from src.availability_detector import AvailabilityDetector
+        
         return cls(
             # Campos obrigatórios primeiro
             post_id=post.post_id,
@@ -166,6 +277,7 @@ class EquipmentAd:
             extracted_from_images=analysis.get('extracted_from_images', len(post.images) > 0),
             extracted_from_comments=analysis.get('extracted_from_comments', len(post.comments) > 0),
             comment_interest_level=analysis.get('comment_interest_level'),
+            availability_status=AvailabilityDetector.detect_post(post),
             resale_score=analysis.get('resale_score'),
             analysis_notes=analysis.get('analysis_notes'),
             keywords=analysis.get('keywords', []),
@@ -6,6 +6,7 @@ import os
 import json
 import logging
 import base64
+import threading
 import requests
 from typing import Dict, Any, List, Optional
 from openai import OpenAI
@@ -17,6 +18,10 @@ logger = logging.getLogger(__name__)
 class OpenAIAnalyzer:
     """Analisador de anúncios de equipamentos usando GPT-4 Vision"""
     
+    # Incrementar ao mudar SYSTEM_PROMPT/_create_analysis_prompt
+    # (fica registrado em raw_posts.analysis_prompt_version)
+    PROMPT_VERSION = "2"
+    
     SYSTEM_PROMPT = """Você é um especialista em equipamentos de kitesurfe e análise de anúncios de marketplace.
 Sua tarefa é analisar posts de grupos do Facebook para identificar anúncios de venda de equipamentos e extrair informações estruturadas.
 
@@ -61,10 +66,67 @@ Um mesmo post pode conter VÁRIOS equipamentos à venda.
 - Extraia informações de contato (telefone/WhatsApp)
 """
 
+    # Preço em USD por 1M tokens (entrada, saída)
+    MODEL_PRICING = {
+        "gpt-4o-mini": (0.15, 0.60),
+        "gpt-4o": (2.50, 10.00),
+    }
+    
+    # Tokens cobrados por imagem com detail="low"
+    IMAGE_TOKENS = {
+        "gpt-4o-mini": 2833,
+        "gpt-4o": 85,
+    }
+    
+    # Tamanho típico da resposta JSON (para estimar custo antes da chamada)
+    EXPECTED_COMPLETION_TOKENS = 700
+
     def __init__(self, api_key: str, model: str = "gpt-4o-mini"):
         self.client = OpenAI(api_key=api_key)
         self.model = model
         
+        # Consumo acumulado (usado pelo controle de orçamento)
+        self.usage = {"prompt_tokens": 0, "completion_tokens": 0, "requests": 0}
+        self._usage_lock = threading.Lock()
+        
+    def cost_usd(self, prompt_tokens: int, completion_tokens: int) -> float:
+        """Custo em USD de uma quantidade de tokens no modelo atual"""
+        price_in, price_out = self.MODEL_PRICING.get(
+            self.model, self.MODEL_PRICING["gpt-4o"]
+        )
+        return (prompt_tokens * price_in + completion_tokens * price_out) / 1_000_000
+    
+    @property
+    def spent_usd(self) -> float:
+        """Custo acumulado das chamadas feitas por esta instância"""
+        return self.cost_usd(self.usage["prompt_tokens"], self.usage["completion_tokens"])
+    
+    def estimate_usage(self, post_data: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Estima tokens e custo de analisar um post (sem chamar a API)
+        
+        Args:
+            post_data: Post no formato do Apify
+            
+        Returns:
+            Dict com prompt_tokens, completion_tokens, total_tokens e cost_usd
+        """
+        post_info = self._prepare_post_data(post_data)
+        images = post_data.get("local_images") or self._extract_image_urls(post_data)
+        prompt = self._create_analysis_prompt(post_info, images)
+        
+        # ~4 caracteres por token
+        prompt_tokens = (len(self.SYSTEM_PROMPT) + len(prompt)) // 4
+        prompt_tokens += len(images[:4]) * self.IMAGE_TOKENS.get(self.model, 85)
+        completion_tokens = self.EXPECTED_COMPLETION_TOKENS
+        
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "cost_usd": self.cost_usd(prompt_tokens, completion_tokens)
+        }
+        
     def analyze_post(
         self, 
         post_data: Dict[str, Any],
@@ -398,6 +460,13 @@ INSTRUÇÕES FINAIS:
                     temperature=0.1,
                     max_tokens=2500
                 )
+                
+                with self._usage_lock:
+                    if response.usage:
+                        self.usage["prompt_tokens"] += response.usage.prompt_tokens
+                        self.usage["completion_tokens"] += response.usage.completion_tokens
+                    self.usage["requests"] += 1
+                
                 return response.choices[0].message.content
 
             except Exception as e:
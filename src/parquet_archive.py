@@ -0,0 +1,257 @@
+"""
+Arquivo colunar (Parquet) de anúncios e posts brutos para análise
+Partições Hive (month=/equipment_type=) consultáveis por pandas/DuckDB
+"""
+import os
+import json
+import uuid
+import logging
+from datetime import datetime
+from typing import Dict, Any, List
+
+logger = logging.getLogger(__name__)
+
+
+def _require_pyarrow():
+    """Importa pyarrow sob demanda (dependência opcional)"""
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError(
+            "pyarrow não instalado. Instale com: pip install pyarrow"
+        )
+    return pa, pq
+
+
+class ParquetArchive:
+    """
+    Exporta equipment_ads e raw_posts para Parquet, incrementalmente
+
+    Cada execução grava só os documentos novos desde a última marca
+    (analyzed_at / scraped_at) em arquivos novos dentro das partições. Um
+    documento re-salvo depois da marca aparece de novo numa execução
+    posterior: nas análises, fique com a linha mais recente por post_id.
+    """
+
+    # Collection -> (campo de marca d'água, colunas de partição)
+    COLLECTIONS = {
+        'equipment_ads': ('analyzed_at', ['month', 'equipment_type']),
+        'raw_posts': ('scraped_at', ['month'])
+    }
+
+    WATERMARK_FILE = "_watermarks.json"
+
+    def __init__(self, db, root: str = "data/archive", batch_size: int = 50000):
+        """
+        Args:
+            db: MongoDBPersistence
+            root: Diretório raiz do arquivo
+            batch_size: Documentos por arquivo Parquet gravado
+        """
+        self.db = db
+        self.root = root
+        self.batch_size = batch_size
+        os.makedirs(root, exist_ok=True)
+
+    # ------------------------------------------------------------------
+    # Schemas (colunas tipadas)
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _schema(collection: str):
+        pa, _ = _require_pyarrow()
+        timestamp = pa.timestamp('ms')
+
+        if collection == 'equipment_ads':
+            return pa.schema([
+                ('post_id', pa.string()),
+                ('post_url', pa.string()),
+                ('analyzed_at', timestamp),
+                ('is_advertisement', pa.bool_()),
+                ('confidence_score', pa.float64()),
+                ('equipment_type', pa.string()),
+                ('brand', pa.string()),
+                ('brand_key', pa.string()),
+                ('model', pa.string()),
+                ('year', pa.int32()),
+                ('size', pa.string()),
+                ('condition', pa.string()),
+                ('has_repair', pa.bool_()),
+                ('price', pa.float64()),
+                ('currency', pa.string()),
+                ('price_negotiable', pa.bool_()),
+                ('city', pa.string()),
+                ('state', pa.string()),
+                ('availability_status', pa.string()),
+                ('comment_interest_level', pa.string()),
+                ('resale_total_score', pa.float64()),
+                ('resale_brand_score', pa.float64()),
+                ('resale_price_score', pa.float64()),
+                ('resale_condition_score', pa.float64()),
+                ('resale_interest_score', pa.float64()),
+                ('description', pa.string()),
+                ('additional_items', pa.list_(pa.string())),
+                ('keywords', pa.list_(pa.string())),
+                ('seller_name', pa.string()),
+                ('month', pa.string())
+            ])
+
+        return pa.schema([
+            ('post_id', pa.string()),
+            ('url', pa.string()),
+            ('time', pa.string()),
+            ('scraped_at', timestamp),
+            ('user_name', pa.string()),
+            ('text', pa.string()),
+            ('title', pa.string()),
+            ('price', pa.string()),
+            ('location', pa.string()),
+            ('group_url', pa.string()),
+            ('group_title', pa.string()),
+            ('likes_count', pa.int32()),
+            ('comments_count', pa.int32()),
+            ('shares_count', pa.int32()),
+            ('images', pa.list_(pa.string())),
+            ('analysis_status', pa.string()),
+            ('month', pa.string())
+        ])
+
+    @staticmethod
+    def _coerce(value: Any, arrow_type) -> Any:
+        """Converte valores do MongoDB para o tipo da coluna (None se inválido)"""
+        pa, _ = _require_pyarrow()
+        if value is None:
+            return None
+        try:
+            if pa.types.is_integer(arrow_type):
+                return int(value)
+            if pa.types.is_floating(arrow_type):
+                return float(value)
+            if pa.types.is_boolean(arrow_type):
+                return bool(value)
+            if pa.types.is_timestamp(arrow_type):
+                return value if isinstance(value, datetime) else datetime.fromisoformat(str(value))
+            if pa.types.is_list(arrow_type):
+                return [str(item) for item in value] if isinstance(value, list) else None
+            return str(value)
+        except (TypeError, ValueError):
+            return None
+
+    # ------------------------------------------------------------------
+    # Marca d'água
+    # ------------------------------------------------------------------
+
+    def _watermark_path(self) -> str:
+        return os.path.join(self.root, self.WATERMARK_FILE)
+
+    def _load_watermarks(self) -> Dict[str, str]:
+        if not os.path.exists(self._watermark_path()):
+            return {}
+        with open(self._watermark_path(), encoding='utf-8') as f:
+            return json.load(f)
+
+    def _save_watermark(self, collection: str, value: datetime):
+        watermarks = self._load_watermarks()
+        watermarks[collection] = value.isoformat()
+        with open(self._watermark_path(), 'w', encoding='utf-8') as f:
+            json.dump(watermarks, f, indent=2)
+
+    # ------------------------------------------------------------------
+    # Exportação
+    # ------------------------------------------------------------------
+
+    def export(self, collection: str, full: bool = False) -> int:
+        """
+        Exporta uma collection para Parquet
+
+        Args:
+            collection: 'equipment_ads' ou 'raw_posts'
+            full: Ignora a marca d'água e exporta tudo
+
+        Returns:
+            Número de documentos exportados
+        """
+        pa, pq = _require_pyarrow()
+
+        if collection not in self.COLLECTIONS:
+            raise ValueError(f"Collection não arquivável: {collection}")
+
+        time_field, partition_cols = self.COLLECTIONS[collection]
+        schema = self._schema(collection)
+        target = os.path.join(self.root, collection)
+
+        query = {time_field: {'$ne': None}}
+        watermark = None if full else self._load_watermarks().get(collection)
+        if watermark:
+            query[time_field] = {'$gt': datetime.fromisoformat(watermark)}
+
+        projection = {'_id': 0, **{name: 1 for name in schema.names if name != 'month'}}
+        if collection == 'equipment_ads':
+            # Completa com os campos de ad_details (description)
+            cursor = self.db.iter_ads(
+                query, projection, min(self.batch_size, 5000), sort=[(time_field, 1)]
+            )
+        else:
+            cursor = (
+                self.db.db[collection]
+                .find(query, projection)
+                .sort(time_field, 1)
+                .batch_size(min(self.batch_size, 5000))
+            )
+
+        run_id = datetime.utcnow().strftime('%Y%m%d%H%M%S') + '-' + uuid.uuid4().hex[:6]
+        exported = 0
+        batch_number = 0
+        latest = None
+        rows: List[Dict[str, Any]] = []
+
+        def write_batch():
+            table = pa.Table.from_pylist(rows, schema=schema)
+            pq.write_to_dataset(
+                table,
+                root_path=target,
+                partition_cols=partition_cols,
+                basename_template=f"part-{run_id}-{batch_number}-{{i}}.parquet",
+                existing_data_behavior='overwrite_or_ignore',
+                compression='zstd'
+            )
+
+        for doc in cursor:
+            row = {
+                field.name: self._coerce(doc.get(field.name), field.type)
+                for field in schema if field.name != 'month'
+            }
+            stamp = row.get(time_field)
+            if stamp is None:
+                continue
+
+            row['month'] = stamp.strftime('%Y-%m')
+            if 'equipment_type' in partition_cols and not row.get('equipment_type'):
+                row['equipment_type'] = 'other'
+
+            rows.append(row)
+            latest = stamp
+
+            if len(rows) >= self.batch_size:
+                write_batch()
+                exported += len(rows)
+                batch_number += 1
+                rows = []
+
+        if rows:
+            write_batch()
+            exported += len(rows)
+
+        if latest:
+            self._save_watermark(collection, latest)
+
+        logger.info(f"✓ {exported} documentos de {collection} arquivados em {target}")
+        return exported
+
+    def export_all(self, full: bool = False) -> Dict[str, int]:
+        """Exporta anúncios e posts brutos"""
+        return {
+            collection: self.export(collection, full=full)
+            for collection in self.COLLECTIONS
+        }
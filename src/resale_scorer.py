@@ -2,7 +2,7 @@
 Calculador de score de potencial de revenda
 Analisa múltiplos fatores para determinar se um equipamento vale a pena revender
 """
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 import re
 
 
@@ -74,11 +74,20 @@ class ResaleScorer:
     }
     
     # Palavras que indicam interesse nos comentários
+    # (vendido/reservado não contam: ver AvailabilityDetector)
     INTEREST_KEYWORDS = [
         'quanto', 'preço', 'valor', 'comprar', 'compro',
         'interessado', 'interesse', 'disponível', 'vendo',
         'aceita', 'troca', 'pago', 'whatsapp', 'zap',
-        'reservado', 'vendido', 'sold', 'dm', 'direct', 'inbox' , 'chamei'  ]
+        'dm', 'direct', 'inbox' , 'chamei'  ]
+    
+    # Fatores -> campos numéricos de primeiro nível em equipment_ads
+    FLAT_FACTOR_FIELDS = {
+        'brand_score': 'resale_brand_score',
+        'price_score': 'resale_price_score',
+        'condition_score': 'resale_condition_score',
+        'interest_score': 'resale_interest_score'
+    }
     
     # Palavras que indicam desinteresse
     DISINTEREST_KEYWORDS = [
@@ -153,6 +162,73 @@ class ResaleScorer:
             'breakdown': cls._generate_breakdown(scores)
         }
     
+    @classmethod
+    def rescore_interest(
+        cls,
+        resale_score: Dict[str, Any],
+        comments: List[str],
+        comments_count: int,
+        likes_count: int,
+        price: Optional[float] = None,
+        brand: Optional[str] = None,
+        condition: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Recalcula apenas o fator de interesse de um score já existente
+
+        Marca, preço e condição vêm da análise original e não mudam quando
+        só os comentários/engajamento mudam, então não é preciso chamar a
+        OpenAI de novo.
+
+        Args:
+            resale_score: Score salvo (retorno de calculate_score)
+            comments: Lista atualizada de comentários
+            comments_count: Total de comentários
+            likes_count: Total de likes
+            price: Preço do anúncio salvo (para a recomendação)
+            brand: Marca do anúncio salvo
+            condition: Condição do anúncio salvo
+
+        Returns:
+            Dict com score total e breakdown atualizados
+        """
+        scores = dict(resale_score.get('factors') or {})
+        scores['interest_score'] = cls._score_interest(
+            comments, comments_count, likes_count
+        )
+
+        total_score = sum(scores.values())
+
+        return {
+            'total_score': round(total_score, 1),
+            'classification': cls._classify_score(total_score),
+            'factors': scores,
+            'recommendation': cls._generate_recommendation(
+                total_score, scores, price, brand, condition
+            ),
+            'breakdown': cls._generate_breakdown(scores)
+        }
+
+    @classmethod
+    def flat_fields(cls, resale_score: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Campos numéricos de primeiro nível (indexáveis) de um score
+        
+        Args:
+            resale_score: Score (retorno de calculate_score)
+            
+        Returns:
+            Dict campo -> valor (vazio se não houver score)
+        """
+        if not isinstance(resale_score, dict):
+            return {}
+        
+        factors = resale_score.get('factors') or {}
+        fields = {'resale_total_score': resale_score.get('total_score')}
+        for factor, field in cls.FLAT_FACTOR_FIELDS.items():
+            fields[field] = factors.get(factor)
+        return fields
+    
     @classmethod
     def _score_brand(cls, brand: str) -> float:
         """Score baseado na marca (0-25)"""
@@ -321,11 +397,11 @@ class ResaleScorer:
         
         elif total_score >= 65:
             reasons = []
-            if scores['brand_score'] >= 20:
+            if scores.get('brand_score', 0) >= 20:
                 reasons.append("marca forte")
-            if scores['price_score'] >= 20:
+            if scores.get('price_score', 0) >= 20:
                 reasons.append("preço competitivo")
-            if scores['interest_score'] >= 20:
+            if scores.get('interest_score', 0) >= 20:
                 reasons.append("alto interesse")
             
             if reasons:
@@ -335,11 +411,11 @@ class ResaleScorer:
         
         elif total_score >= 50:
             warnings = []
-            if scores['price_score'] < 15:
+            if scores.get('price_score', 0) < 15:
                 warnings.append("preço elevado")
-            if scores['condition_score'] < 15:
+            if scores.get('condition_score', 0) < 15:
                 warnings.append("condição questionável")
-            if scores['interest_score'] < 10:
+            if scores.get('interest_score', 0) < 10:
                 warnings.append("baixo interesse")
             
             if warnings:
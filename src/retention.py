@@ -0,0 +1,430 @@
+"""
+Retenção e arquivamento de dados antigos
+Move posts brutos já analisados para arquivos JSONL compactados, limpa
+data/raw e data/backups e remove mídia que nenhum anúncio recente usa,
+respeitando uma cota de disco
+"""
+import os
+import gzip
+import uuid
+import shutil
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Iterator, Tuple
+from bson import json_util
+from pymongo import UpdateOne
+from src.models import AnalysisStatus
+from src.content_hash import ContentHash
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+
+@dataclass
+class RetentionPolicy:
+    """Limites de idade (dias) e de tamanho (None = sem limite)"""
+    raw_posts_days: Optional[int] = 90  # posts analisados sem re-coleta há N dias
+    raw_files_days: Optional[int] = 30  # dumps do Apify em data/raw
+    backups_days: Optional[int] = 60
+    backups_keep: int = 10  # backups mais recentes nunca removidos
+    media_days: Optional[int] = 30  # anúncios publicados há menos de N dias mantêm a mídia
+    disk_quota_mb: Optional[float] = None  # data/raw + data/backups + data/media
+
+    @classmethod
+    def from_env(cls) -> 'RetentionPolicy':
+        """Lê RETENTION_RAW_POSTS_DAYS, RETENTION_RAW_FILES_DAYS, RETENTION_BACKUPS_DAYS,
+        RETENTION_BACKUPS_KEEP, RETENTION_MEDIA_DAYS e RETENTION_DISK_QUOTA_MB do ambiente"""
+        def optional(name, default, cast=int):
+            value = os.getenv(name)
+            if value is None or value == '':
+                return default
+            return None if value.lower() == 'none' else cast(value)
+
+        return cls(
+            raw_posts_days=optional("RETENTION_RAW_POSTS_DAYS", 90),
+            raw_files_days=optional("RETENTION_RAW_FILES_DAYS", 30),
+            backups_days=optional("RETENTION_BACKUPS_DAYS", 60),
+            backups_keep=int(os.getenv("RETENTION_BACKUPS_KEEP") or 10),
+            media_days=optional("RETENTION_MEDIA_DAYS", 30),
+            disk_quota_mb=optional("RETENTION_DISK_QUOTA_MB", None, float)
+        )
+
+
+class RawPostArchive:
+    """
+    Arquivo JSONL (gzip) de posts brutos antigos
+
+    O documento de raw_posts também é o ledger de análise: um post
+    arquivado fica como "tombstone" (post_id, analysis_status, datas,
+    content_hash e analysis_hash) para não ser reanalisado se aparecer de
+    novo sem mudança no conteúdo analisável. Se ele for re-coletado com
+    mudanças, o save grava o post inteiro de novo e remove as marcas.
+    """
+
+    FIELD = 'archived_at'
+
+    # Hash só do conteúdo analisável: o content_hash também cobre
+    # engajamento e URLs de imagem (a querystring da CDN muda a cada coleta)
+    ANALYSIS_HASH = 'analysis_hash'
+
+    # Conteúdo que exige reanálise se mudar (o mesmo da triagem do DataProcessor)
+    CONTENT_FIELDS = ('text', 'title', 'price', 'location')
+
+    # Campos mantidos no tombstone
+    KEEP = (
+        '_id', 'post_id', 'analysis_status', 'analysis_prompt_version',
+        'analysis_at', 'scraped_at', 'posted_at', ContentHash.FIELD, ANALYSIS_HASH, FIELD
+    )
+
+    # Marcas removidas quando o post volta inteiro
+    MARKERS = (FIELD, ANALYSIS_HASH)
+
+    # Só posts com análise concluída saem da collection
+    STATUSES = [AnalysisStatus.AD.value, AnalysisStatus.NOT_AD.value]
+
+    def __init__(self, db, root: str = "data/archive/raw_posts_jsonl", batch_size: int = 5000):
+        """
+        Args:
+            db: MongoDBPersistence
+            root: Diretório dos arquivos .jsonl.gz
+            batch_size: Posts por arquivo
+        """
+        self.db = db
+        self.root = root
+        self.batch_size = batch_size
+
+    @classmethod
+    def is_archived(cls, doc: Optional[Dict]) -> bool:
+        """Se o documento de raw_posts é um tombstone (conteúdo arquivado)"""
+        return bool(doc) and doc.get(cls.FIELD) is not None
+
+    @staticmethod
+    def image_keys(images: Optional[List[str]]) -> List[str]:
+        """Nome do arquivo de cada imagem (sem a querystring da CDN)"""
+        return [os.path.basename(url.split('?', 1)[0]) for url in images or []]
+
+    @classmethod
+    def analysis_hash(cls, doc: Dict) -> str:
+        """Hash do conteúdo analisável de um post (documento ou to_dict())"""
+        content = {field: doc.get(field) or '' for field in cls.CONTENT_FIELDS}
+        content['images'] = cls.image_keys(doc.get('images'))
+        return ContentHash.compute(content)
+
+    @classmethod
+    def content_changed(cls, doc: Dict, stored: Dict) -> bool:
+        """
+        Se o post re-coletado mudou em relação ao tombstone
+
+        Mesmo content_hash: nada mudou. Hash diferente: compara o
+        analysis_hash (tombstones antigos, sem ele, contam como mudança).
+        """
+        if ContentHash.compute(doc, ('scraped_at',)) == stored.get(ContentHash.FIELD):
+            return False
+        return cls.analysis_hash(doc) != stored.get(cls.ANALYSIS_HASH)
+
+    @classmethod
+    def tombstone(cls, doc: Dict, now: datetime) -> Dict:
+        """Update que reduz o post ao tombstone"""
+        return {
+            '$set': {cls.FIELD: now, cls.ANALYSIS_HASH: cls.analysis_hash(doc)},
+            '$unset': {key: '' for key in doc if key not in cls.KEEP}
+        }
+
+    def archive(self, older_than_days: int, dry_run: bool = False) -> int:
+        """
+        Arquiva posts analisados cuja última coleta é mais antiga que o limite
+
+        Cada lote vai para um arquivo próprio, fechado antes de o lote virar
+        tombstone: uma interrupção no meio não perde posts.
+
+        Args:
+            older_than_days: Idade mínima (scraped_at) em dias
+            dry_run: Só conta (inclui posts ainda na fila de análise)
+
+        Returns:
+            Número de posts arquivados
+        """
+        cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+        query = {
+            'analysis_status': {'$in': self.STATUSES},
+            'scraped_at': {'$lt': cutoff},
+            self.FIELD: {'$exists': False}
+        }
+        if dry_run:
+            return self.db.db.raw_posts.count_documents(query)
+
+        os.makedirs(self.root, exist_ok=True)
+        run_id = datetime.utcnow().strftime('%Y%m%d%H%M%S') + '-' + uuid.uuid4().hex[:6]
+        cursor = self.db.db.raw_posts.find(query).batch_size(min(self.batch_size, 5000))
+
+        archived = 0
+        batch = []
+        for doc in cursor:
+            batch.append(doc)
+            if len(batch) >= self.batch_size:
+                archived += self._archive_batch(batch, f"raw_posts-{run_id}-{archived}.jsonl.gz")
+                batch = []
+        if batch:
+            archived += self._archive_batch(batch, f"raw_posts-{run_id}-{archived}.jsonl.gz")
+
+        if archived:
+            logger.info(f"✓ {archived} posts brutos arquivados em {self.root}")
+        return archived
+
+    def _archive_batch(self, docs: List[Dict], filename: str) -> int:
+        """Grava um lote no arquivo e só então troca os documentos por tombstones"""
+        # Posts ainda na fila de análise (ex: reanálise) ficam
+        queued = {
+            doc['post_id'] for doc in self.db.db.analysis_queue.find(
+                {'post_id': {'$in': [d['post_id'] for d in docs]}}, {'_id': 0, 'post_id': 1}
+            )
+        }
+        docs = [doc for doc in docs if doc['post_id'] not in queued]
+        if not docs:
+            return 0
+
+        path = os.path.join(self.root, filename)
+        with gzip.open(path, 'wt', encoding='utf-8') as f:
+            for doc in docs:
+                f.write(json_util.dumps(doc, ensure_ascii=False) + '\n')
+
+        # scraped_at no filtro: um post re-salvo desde a leitura não é tocado
+        now = datetime.utcnow()
+        result = self.db.db.raw_posts.bulk_write([
+            UpdateOne(
+                {'post_id': doc['post_id'], 'scraped_at': doc.get('scraped_at')},
+                self.tombstone(doc, now)
+            )
+            for doc in docs
+        ], ordered=False)
+        return result.modified_count
+
+    @staticmethod
+    def read(path: str) -> Iterator[Dict]:
+        """Posts de um arquivo .jsonl.gz"""
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json_util.loads(line)
+
+    def restore(self, path: str, post_ids: Optional[List[str]] = None) -> int:
+        """
+        Devolve posts arquivados à collection (só onde ainda há tombstone)
+
+        Args:
+            path: Arquivo .jsonl.gz
+            post_ids: Restringe aos posts informados (None = todos do arquivo)
+
+        Returns:
+            Número de posts restaurados
+        """
+        wanted = set(post_ids) if post_ids else None
+        operations = []
+        for doc in self.read(path):
+            if wanted is not None and doc['post_id'] not in wanted:
+                continue
+            doc.pop('_id', None)
+            payload = {key: value for key, value in doc.items() if key not in self.KEEP}
+            operations.append(UpdateOne(
+                {'post_id': doc['post_id'], self.FIELD: {'$exists': True}},
+                {'$set': payload, '$unset': {field: '' for field in self.MARKERS}}
+            ))
+        if not operations:
+            return 0
+
+        result = self.db.db.raw_posts.bulk_write(operations, ordered=False)
+        logger.info(f"✓ {result.modified_count} posts restaurados de {path}")
+        return result.modified_count
+
+
+class RetentionManager:
+    """
+    Aplica a RetentionPolicy: arquiva raw_posts, limpa dumps e backups
+    antigos e remove mídia sem uso, nessa ordem, e por fim força a cota
+
+    A mídia (data/media/<post_id>/) de anúncios publicados nos últimos
+    media_days dias e de posts ainda não analisados nunca é removida. O
+    resto sai em ordem LRU (último acesso/modificação mais antigo primeiro).
+    """
+
+    def __init__(
+        self,
+        db,
+        policy: RetentionPolicy = None,
+        data_dir: str = "data",
+        archive_dir: str = None
+    ):
+        """
+        Args:
+            db: MongoDBPersistence (None = só arquivos locais; a mídia não é
+                removida sem saber quais anúncios a usam)
+            policy: Limites (default: RetentionPolicy.from_env())
+            data_dir: Diretório de dados (raw/, backups/, media/)
+            archive_dir: Destino dos .jsonl.gz (default: data/archive/raw_posts_jsonl)
+        """
+        self.db = db
+        self.policy = policy or RetentionPolicy.from_env()
+        self.raw_dir = os.path.join(data_dir, "raw")
+        self.backup_dir = os.path.join(data_dir, "backups")
+        self.media_dir = os.path.join(data_dir, "media")
+        self.archive = RawPostArchive(
+            db, archive_dir or os.path.join(data_dir, "archive", "raw_posts_jsonl")
+        ) if db else None
+
+    def run(self, dry_run: bool = False) -> Dict[str, Any]:
+        """
+        Executa todas as etapas
+
+        Args:
+            dry_run: Só relata o que seria removido/arquivado
+
+        Returns:
+            Relatório: raw_posts_archived, raw_files, backups, media
+            (removidos), freed_mb e disk_mb (uso final)
+        """
+        report = {'raw_posts_archived': 0, 'raw_files': 0, 'backups': 0, 'media': 0, 'freed_mb': 0.0}
+
+        if self.archive and self.policy.raw_posts_days is not None:
+            report['raw_posts_archived'] = self.archive.archive(self.policy.raw_posts_days, dry_run)
+
+        candidates = self._candidates()
+        now = datetime.utcnow().timestamp()
+        limits = {
+            'raw_files': self.policy.raw_files_days,
+            'backups': self.policy.backups_days,
+            'media': self.policy.media_days
+        }
+
+        evict, keep = [], []
+        for kind, entries in candidates.items():
+            days = limits[kind]
+            for entry in entries:
+                expired = days is not None and now - entry[0] > days * 86400
+                (evict if expired else keep).append(entry)
+
+        # Cota: remove o restante em ordem LRU até caber
+        usage = sum(self._size(path) for path in (self.raw_dir, self.backup_dir, self.media_dir))
+        if self.policy.disk_quota_mb is not None:
+            remaining = usage - sum(entry[2] for entry in evict)
+            for entry in sorted(keep, key=lambda entry: entry[0]):
+                if remaining <= self.policy.disk_quota_mb * MB:
+                    break
+                evict.append(entry)
+                remaining -= entry[2]
+            if remaining > self.policy.disk_quota_mb * MB:
+                logger.warning(
+                    f"Cota de {self.policy.disk_quota_mb:.1f} MB excedida "
+                    f"({remaining / MB:.1f} MB em uso, só arquivos protegidos restantes)"
+                )
+
+        for _, path, size, kind in evict:
+            if not dry_run:
+                self._remove(path)
+            report[kind] += 1
+            report['freed_mb'] += size / MB
+
+        report['disk_mb'] = usage / MB - report['freed_mb']
+        verb = "seriam removidos" if dry_run else "removidos"
+        logger.info(
+            f"✓ Retenção: {report['raw_posts_archived']} posts arquivados; {verb} "
+            f"{report['raw_files']} dumps, {report['backups']} backups e "
+            f"{report['media']} pastas de mídia ({report['freed_mb']:.1f} MB)"
+        )
+        return report
+
+    # ------------------------------------------------------------------
+    # Candidatos (last_used, caminho, bytes, tipo)
+    # ------------------------------------------------------------------
+
+    def _candidates(self) -> Dict[str, List[Tuple[float, str, int, str]]]:
+        """Arquivos/pastas removíveis de cada tipo (os protegidos ficam de fora)"""
+        raw_files = [
+            (os.path.getmtime(path), path, os.path.getsize(path), 'raw_files')
+            for path in self._files(self.raw_dir)
+        ]
+
+        # Backups são pares JSON/CSV do mesmo job: agrupados pelo nome
+        runs: Dict[str, List[str]] = {}
+        for path in self._files(self.backup_dir):
+            runs.setdefault(os.path.splitext(path)[0], []).append(path)
+        ordered = sorted(runs.values(), key=lambda paths: max(map(os.path.getmtime, paths)), reverse=True)
+        backups = [
+            (os.path.getmtime(path), path, os.path.getsize(path), 'backups')
+            for paths in ordered[self.policy.backups_keep:]
+            for path in paths
+        ]
+
+        media = []
+        if self.db is not None and os.path.isdir(self.media_dir):
+            protected = self._protected_media()
+            for name in os.listdir(self.media_dir):
+                path = os.path.join(self.media_dir, name)
+                if name in protected or not os.path.isdir(path):
+                    continue
+                media.append((self._last_used(path), path, self._size(path), 'media'))
+
+        return {'raw_files': raw_files, 'backups': backups, 'media': media}
+
+    def _protected_media(self) -> set:
+        """post_ids cuja mídia ainda é usada: anúncios recentes e posts não analisados"""
+        days = self.policy.media_days if self.policy.media_days is not None else 0
+        cutoff = datetime.utcnow() - timedelta(days=days)
+        protected = {
+            doc['post_id'] for doc in self.db.db.equipment_ads.find(
+                {'posted_at': {'$gte': cutoff}}, {'_id': 0, 'post_id': 1}
+            )
+        }
+        protected.update(
+            doc['post_id'] for doc in self.db.db.raw_posts.find(
+                self.db._unanalyzed_query(include_errors=True), {'_id': 0, 'post_id': 1}
+            )
+        )
+        protected.update(
+            doc['post_id'] for doc in self.db.db.analysis_queue.find({}, {'_id': 0, 'post_id': 1})
+        )
+        return protected
+
+    # ------------------------------------------------------------------
+    # Sistema de arquivos
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _files(directory: str) -> List[str]:
+        if not os.path.isdir(directory):
+            return []
+        return [
+            os.path.join(directory, name) for name in os.listdir(directory)
+            if os.path.isfile(os.path.join(directory, name))
+        ]
+
+    @staticmethod
+    def _walk(path: str) -> Iterator[str]:
+        if os.path.isfile(path):
+            yield path
+            return
+        for root, _, files in os.walk(path):
+            for name in files:
+                yield os.path.join(root, name)
+
+    @classmethod
+    def _size(cls, path: str) -> int:
+        """Bytes de um arquivo ou diretório (recursivo)"""
+        return sum(os.path.getsize(file) for file in cls._walk(path))
+
+    @classmethod
+    def _last_used(cls, path: str) -> float:
+        """Último acesso/modificação (atime pode estar desligado: usa o maior)"""
+        stamps = [max(os.path.getatime(file), os.path.getmtime(file)) for file in cls._walk(path)]
+        return max(stamps) if stamps else os.path.getmtime(path)
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+        except OSError as e:
+            logger.error(f"Erro ao remover {path}: {str(e)}")
@@ -0,0 +1,1206 @@
+"""
+Backend de armazenamento embarcado (SQLite + FTS5)
+Para deployments e CI sem MongoDB: um arquivo local, sem idas à rede
+"""
+import os
+import csv
+import math
+import sqlite3
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import List, Dict, Any, Optional, Iterator, Tuple
+from bson import json_util
+from src.models import FacebookPost, EquipmentAd, AvailabilityStatus, AnalysisStatus, parse_post_time
+from src.availability_detector import AvailabilityDetector
+from src.brand_normalizer import BrandNormalizer
+from src.stats_store import StatsStore
+from src.ad_history import AdHistory
+from src.content_hash import ContentHash
+from src.storage import StorageBackend, Page
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS raw_posts (
+    post_id TEXT PRIMARY KEY,
+    scraped_at TEXT,
+    posted_at TEXT,
+    analysis_status TEXT,
+    doc TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS raw_posts_ledger ON raw_posts (analysis_status, post_id);
+CREATE INDEX IF NOT EXISTS raw_posts_posted ON raw_posts (posted_at DESC);
+
+CREATE TABLE IF NOT EXISTS equipment_ads (
+    post_id TEXT PRIMARY KEY,
+    analyzed_at TEXT,
+    posted_at TEXT,
+    is_advertisement INTEGER,
+    equipment_type TEXT,
+    brand_key TEXT,
+    state TEXT,
+    price REAL,
+    has_repair INTEGER,
+    resale_total_score REAL,
+    availability_status TEXT,
+    doc TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ads_posted
+    ON equipment_ads (posted_at DESC, post_id DESC) WHERE is_advertisement = 1;
+CREATE INDEX IF NOT EXISTS ads_score
+    ON equipment_ads (resale_total_score DESC, post_id DESC) WHERE is_advertisement = 1;
+CREATE INDEX IF NOT EXISTS ads_type_posted
+    ON equipment_ads (equipment_type, posted_at DESC, post_id DESC) WHERE is_advertisement = 1;
+CREATE INDEX IF NOT EXISTS ads_brand_posted
+    ON equipment_ads (brand_key, posted_at DESC, post_id DESC) WHERE is_advertisement = 1;
+CREATE INDEX IF NOT EXISTS ads_type_score
+    ON equipment_ads (equipment_type, resale_total_score DESC, post_id DESC) WHERE is_advertisement = 1;
+CREATE INDEX IF NOT EXISTS ads_price
+    ON equipment_ads (price) WHERE is_advertisement = 1;
+CREATE INDEX IF NOT EXISTS ads_listing
+    ON equipment_ads (json_extract(doc, '$.listing_key'), analyzed_at) WHERE is_advertisement = 1;
+
+-- Histórico de versões (só acréscimo); price_* repetem changes.price
+CREATE TABLE IF NOT EXISTS ad_versions (
+    id INTEGER PRIMARY KEY,
+    listing_key TEXT NOT NULL,
+    post_id TEXT NOT NULL,
+    recorded_at TEXT NOT NULL,
+    price_changed INTEGER NOT NULL,
+    price_from REAL,
+    price_to REAL,
+    doc TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS versions_listing ON ad_versions (listing_key, recorded_at);
+CREATE INDEX IF NOT EXISTS versions_price_changes
+    ON ad_versions (recorded_at) WHERE price_changed = 1;
+
+-- Busca full-text: rowid do FTS = rowid do anúncio, mantido por triggers
+CREATE VIRTUAL TABLE IF NOT EXISTS ads_fts USING fts5(
+    description, brand, model,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS ads_fts_insert AFTER INSERT ON equipment_ads
+WHEN new.is_advertisement = 1 BEGIN
+    INSERT INTO ads_fts (rowid, description, brand, model) VALUES (
+        new.rowid, json_extract(new.doc, '$.description'),
+        json_extract(new.doc, '$.brand'), json_extract(new.doc, '$.model')
+    );
+END;
+CREATE TRIGGER IF NOT EXISTS ads_fts_update AFTER UPDATE ON equipment_ads BEGIN
+    DELETE FROM ads_fts WHERE rowid = old.rowid;
+    INSERT INTO ads_fts (rowid, description, brand, model)
+    SELECT new.rowid, json_extract(new.doc, '$.description'),
+           json_extract(new.doc, '$.brand'), json_extract(new.doc, '$.model')
+    WHERE new.is_advertisement = 1;
+END;
+CREATE TRIGGER IF NOT EXISTS ads_fts_delete AFTER DELETE ON equipment_ads BEGIN
+    DELETE FROM ads_fts WHERE rowid = old.rowid;
+END;
+
+CREATE TABLE IF NOT EXISTS analysis_queue (
+    post_id TEXT PRIMARY KEY,
+    priority REAL,
+    lane TEXT,
+    enqueued_at TEXT,
+    claimed_until TEXT
+);
+CREATE INDEX IF NOT EXISTS queue_lane ON analysis_queue (lane, priority DESC);
+
+CREATE TABLE IF NOT EXISTS rate_limits (
+    key TEXT PRIMARY KEY,
+    version INTEGER NOT NULL,
+    doc TEXT NOT NULL
+);
+"""
+
+
+class SQLiteStorage(StorageBackend):
+    """
+    Persistência num arquivo SQLite (data/kitesurf.db)
+
+    Cada documento é guardado inteiro em JSON (coluna doc); os campos usados
+    em filtros e ordenações são copiados para colunas com índices parciais
+    equivalentes aos do MongoDB. A busca por texto usa FTS5 e as
+    estatísticas são agregadas em SQL a cada leitura.
+    """
+
+    # Colunas de equipment_ads que aceitam filtro de igualdade no export
+    AD_COLUMNS = (
+        'post_id', 'is_advertisement', 'equipment_type', 'brand_key', 'state',
+        'has_repair', 'availability_status'
+    )
+
+    # Parâmetros por consulta com IN (limite do SQLite: 999 em versões antigas)
+    MAX_PARAMS = 500
+
+    # PRAGMA user_version: 1 = coluna posted_at preenchida
+    SCHEMA_VERSION = 1
+
+    def __init__(self, path: str = "data/kitesurf.db"):
+        """
+        Args:
+            path: Arquivo do banco (criado se não existir)
+        """
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # A fila de análise chama o backend das threads de trabalho
+        self._lock = threading.RLock()
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self._add_columns()
+        self.conn.executescript(SCHEMA)
+        if self.conn.execute("PRAGMA user_version").fetchone()[0] < self.SCHEMA_VERSION:
+            self.backfill_posted_at()
+            self.conn.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+
+        logger.debug(f"✓ SQLite: {path}")
+
+    def _add_columns(self):
+        """Adiciona a bancos antigos as colunas criadas depois da tabela"""
+        for table in ('raw_posts', 'equipment_ads'):
+            columns = {row[1] for row in self.conn.execute(f"PRAGMA table_info({table})")}
+            if columns and 'posted_at' not in columns:
+                self.conn.execute(f"ALTER TABLE {table} ADD COLUMN posted_at TEXT")
+
+    def backfill_posted_at(self, batch_size: int = 1000) -> int:
+        """
+        Preenche posted_at (coluna e documento) em lotes, a partir do time do
+        post; sem data válida, usa o momento da coleta/análise
+
+        Returns:
+            Número de linhas atualizadas
+        """
+        updated = 0
+        for table, time_field, fallback in (
+            ('raw_posts', 'time', 'scraped_at'),
+            ('equipment_ads', 'scraped_at', 'analyzed_at'),
+        ):
+            while True:
+                with self._lock:
+                    rows = self.conn.execute(
+                        f"SELECT post_id, doc FROM {table} WHERE posted_at IS NULL LIMIT ?",
+                        (batch_size,)
+                    ).fetchall()
+                if not rows:
+                    break
+
+                batch = []
+                for post_id, doc in rows:
+                    doc = self._loads(doc)
+                    doc['posted_at'] = (
+                        parse_post_time(doc.get(time_field))
+                        or parse_post_time(doc.get(fallback))
+                        or datetime.utcnow()
+                    )
+                    batch.append((self._timestamp(doc['posted_at']), self._dumps(doc), post_id))
+
+                with self._lock, self.conn:
+                    self.conn.executemany(
+                        f"UPDATE {table} SET posted_at = ?, doc = ? WHERE post_id = ?", batch
+                    )
+                updated += len(batch)
+
+        if updated:
+            logger.info(f"✓ posted_at preenchido em {updated} documentos")
+        return updated
+
+    # ------------------------------------------------------------------
+    # Conversões documento <-> linha
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _dumps(doc: Dict) -> str:
+        # JSON estendido preserva datetimes (voltam como datetime no loads)
+        return json_util.dumps(doc, ensure_ascii=False)
+
+    @staticmethod
+    def _loads(text: str) -> Dict:
+        return json_util.loads(text)
+
+    @staticmethod
+    def _timestamp(value: Any) -> Optional[str]:
+        """Datetime (ou ISO) em texto de largura fixa, ordenável como string"""
+        if value is None:
+            return None
+        if not isinstance(value, datetime):
+            try:
+                value = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+            except ValueError:
+                return None
+        if value.tzinfo:
+            value = value.replace(tzinfo=None) - (value.utcoffset() or timedelta(0))
+        return value.strftime('%Y-%m-%dT%H:%M:%S.%f')
+
+    @staticmethod
+    def _number(value: Any) -> Optional[float]:
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return None
+        return float(value)
+
+    @classmethod
+    def _ad_row(cls, doc: Dict) -> Tuple:
+        """Colunas indexadas de um anúncio (mesma ordem do INSERT)"""
+        return (
+            doc['post_id'],
+            cls._timestamp(doc.get('analyzed_at')),
+            cls._timestamp(doc.get('posted_at')),
+            1 if doc.get('is_advertisement') else 0,
+            doc.get('equipment_type'),
+            doc.get('brand_key') or BrandNormalizer.canonical_key(doc.get('brand')),
+            doc.get('state'),
+            cls._number(doc.get('price')),
+            1 if doc.get('has_repair') else 0,
+            cls._number(StatsStore._resale_total(doc)),
+            doc.get('availability_status'),
+            cls._dumps(doc)
+        )
+
+    @classmethod
+    def _raw_row(cls, doc: Dict) -> Tuple:
+        return (
+            doc['post_id'],
+            cls._timestamp(doc.get('scraped_at')),
+            cls._timestamp(doc.get('posted_at')),
+            doc.get('analysis_status'),
+            cls._dumps(doc)
+        )
+
+    @classmethod
+    def _project(cls, doc: Dict, projection: str) -> Dict:
+        """Aplica um perfil de projeção (summary/card/full) a um documento"""
+        fields = cls._projection(projection)
+        if not fields:
+            return doc
+
+        projected = {}
+        for path in fields:
+            value = doc
+            for part in path.split('.'):
+                value = value.get(part) if isinstance(value, dict) else None
+            if value is not None:
+                projected = StatsStore.apply_set(projected, {path: value})
+        return projected
+
+    def _chunks(self, items: List) -> Iterator[List]:
+        for start in range(0, len(items), self.MAX_PARAMS):
+            yield items[start:start + self.MAX_PARAMS]
+
+    def _fetch_docs(self, table: str, post_ids: List[str]) -> Dict[str, Dict]:
+        """Documentos de uma tabela por post_id"""
+        docs = {}
+        with self._lock:
+            for chunk in self._chunks(list(post_ids)):
+                placeholders = ','.join('?' * len(chunk))
+                rows = self.conn.execute(
+                    f"SELECT post_id, doc FROM {table} WHERE post_id IN ({placeholders})",
+                    chunk
+                )
+                docs.update((post_id, self._loads(doc)) for post_id, doc in rows)
+        return docs
+
+    # ------------------------------------------------------------------
+    # Escrita
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _merge(
+        stored: Optional[Dict],
+        new: Dict,
+        on_insert: Dict,
+        immutable: Tuple[str, ...],
+        volatile: str,
+        now: datetime
+    ) -> Optional[Dict]:
+        """
+        Documento a gravar num save (mesma regra dos upserts do MongoDB)
+
+        Returns:
+            Documento mesclado, ou None se o content_hash não mudou
+        """
+        new[volatile] = now
+        new[ContentHash.FIELD] = ContentHash.compute(new, (volatile,))
+        if stored is None:
+            return {**on_insert, **new}
+        if stored.get(ContentHash.FIELD) == new[ContentHash.FIELD]:
+            return None
+
+        doc = dict(stored)
+        doc.update({key: value for key, value in new.items() if key not in immutable or key not in doc})
+        return doc
+
+    def _write_ads(self, docs: List[Dict]):
+        with self._lock, self.conn:
+            self.conn.executemany(
+                """
+                INSERT INTO equipment_ads (
+                    post_id, analyzed_at, posted_at, is_advertisement, equipment_type, brand_key,
+                    state, price, has_repair, resale_total_score, availability_status, doc
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (post_id) DO UPDATE SET
+                    analyzed_at = excluded.analyzed_at,
+                    posted_at = excluded.posted_at,
+                    is_advertisement = excluded.is_advertisement,
+                    equipment_type = excluded.equipment_type,
+                    brand_key = excluded.brand_key,
+                    state = excluded.state,
+                    price = excluded.price,
+                    has_repair = excluded.has_repair,
+                    resale_total_score = excluded.resale_total_score,
+                    availability_status = excluded.availability_status,
+                    doc = excluded.doc
+                """,
+                [self._ad_row(doc) for doc in docs]
+            )
+
+    def _write_raw_posts(self, docs: List[Dict]):
+        with self._lock, self.conn:
+            self.conn.executemany(
+                """
+                INSERT INTO raw_posts (post_id, scraped_at, posted_at, analysis_status, doc)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (post_id) DO UPDATE SET
+                    scraped_at = excluded.scraped_at,
+                    posted_at = excluded.posted_at,
+                    analysis_status = excluded.analysis_status,
+                    doc = excluded.doc
+                """,
+                [self._raw_row(doc) for doc in docs]
+            )
+
+    def _record_versions(self, previous: Dict[str, Dict], new_docs: List[Dict]) -> int:
+        """Registra em ad_versions os campos que mudaram (ver AdHistory)"""
+        keys = list({
+            doc['listing_key'] for doc in new_docs
+            if doc['post_id'] not in previous and doc.get('listing_key')
+            and not doc['listing_key'].startswith('post:')
+        })
+        post_ids = [doc['post_id'] for doc in new_docs]
+
+        relisted = {}
+        with self._lock:
+            for chunk in self._chunks(keys):
+                placeholders = ','.join('?' * len(chunk))
+                rows = self.conn.execute(
+                    f"SELECT doc FROM equipment_ads WHERE is_advertisement = 1 "
+                    f"AND json_extract(doc, '$.listing_key') IN ({placeholders}) "
+                    f"ORDER BY analyzed_at",
+                    chunk
+                )
+                for (doc,) in rows:
+                    doc = self._loads(doc)
+                    if doc['post_id'] not in post_ids:
+                        relisted[doc['listing_key']] = doc  # o mais recente sobrescreve
+
+        versions = AdHistory.versions(previous, relisted, new_docs)
+        rows = []
+        for version in versions:
+            price = version['changes'].get('price')
+            rows.append((
+                version['listing_key'], version['post_id'],
+                self._timestamp(version['recorded_at']),
+                1 if price else 0,
+                self._number(price['from']) if price else None,
+                self._number(price['to']) if price else None,
+                self._dumps(version)
+            ))
+
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "INSERT INTO ad_versions (listing_key, post_id, recorded_at, price_changed, "
+                "price_from, price_to, doc) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+        return len(rows)
+
+    def save_raw_posts(self, posts: List[FacebookPost], batch_size: int = None) -> int:
+        """
+        Salva posts brutos (upsert em uma transação)
+
+        Posts novos entram no ledger como pendentes de análise; posts já
+        salvos mantêm o status.
+
+        Args:
+            posts: Lista de FacebookPost
+            batch_size: Ignorado (mantido pela interface)
+
+        Returns:
+            Número de posts salvos
+        """
+        if not posts:
+            return 0
+
+        stored = self._fetch_docs('raw_posts', [post.post_id for post in posts])
+        now = datetime.utcnow()
+
+        docs = []
+        unchanged = 0
+        for post in posts:
+            try:
+                doc = self._merge(
+                    stored.get(post.post_id),
+                    post.to_dict(),
+                    {'analysis_status': AnalysisStatus.PENDING.value},
+                    ContentHash.RAW_POST_IMMUTABLE,
+                    'scraped_at', now
+                )
+                if doc is None:
+                    unchanged += 1
+                else:
+                    doc.setdefault('posted_at', parse_post_time(post.time) or now)
+                    docs.append(doc)
+            except Exception as e:
+                logger.error(f"Erro ao salvar post {post.post_id}: {str(e)}")
+
+        self._write_raw_posts(docs)
+
+        logger.info(f"✓ {len(docs) + unchanged} posts salvos no SQLite ({unchanged} sem alteração)")
+        return len(docs) + unchanged
+
+    def save_equipment_ads(self, ads: List[EquipmentAd], batch_size: int = None) -> int:
+        """
+        Salva anúncios analisados (upsert em uma transação)
+
+        Args:
+            ads: Lista de EquipmentAd
+            batch_size: Ignorado (mantido pela interface)
+
+        Returns:
+            Número de anúncios salvos
+        """
+        if not ads:
+            return 0
+
+        stored = self._fetch_docs('equipment_ads', [ad.post_id for ad in ads])
+        now = datetime.utcnow()
+
+        docs = []
+        unchanged = 0
+        for ad in ads:
+            try:
+                doc = self._merge(
+                    stored.get(ad.post_id), ad.to_dict(), {},
+                    ContentHash.AD_IMMUTABLE, 'analyzed_at', now
+                )
+                if doc is None:
+                    unchanged += 1
+                else:
+                    doc.setdefault('posted_at', parse_post_time(ad.scraped_at) or now)
+                    docs.append(doc)
+            except Exception as e:
+                logger.error(f"Erro ao salvar anúncio {ad.post_id}: {str(e)}")
+
+        self._write_ads(docs)
+        self._record_versions(stored, docs)
+
+        logger.info(f"✓ {len(docs) + unchanged} anúncios salvos no SQLite ({unchanged} sem alteração)")
+        return len(docs) + unchanged
+
+    def update_ad_fields(self, post_id: str, fields: Dict[str, Any]) -> bool:
+        """Atualiza campos (notação com ponto) de um anúncio existente"""
+        return self.bulk_update_ad_fields({post_id: fields}) > 0
+
+    def bulk_update_ad_fields(self, updates: Dict[str, Dict[str, Any]]) -> int:
+        """
+        Atualiza campos de vários anúncios em uma transação
+
+        Args:
+            updates: Dicionário post_id -> campos a atualizar
+
+        Returns:
+            Número de anúncios modificados
+        """
+        updates = {post_id: fields for post_id, fields in updates.items() if fields}
+        if not updates:
+            return 0
+
+        stored = self._fetch_docs('equipment_ads', list(updates))
+        docs = [
+            StatsStore.apply_set(doc, updates[post_id])
+            for post_id, doc in stored.items()
+        ]
+        changed = [doc for doc in docs if doc != stored[doc['post_id']]]
+        for doc in changed:
+            doc.pop(ContentHash.FIELD, None)  # o próximo save refaz a comparação
+
+        self._write_ads(changed)
+        self._record_versions(stored, changed)
+        return len(changed)
+
+    def update_engagement(self, posts: List[FacebookPost]) -> int:
+        """
+        Atualiza apenas contadores de engajamento e comentários dos posts brutos
+
+        Returns:
+            Número de posts modificados
+        """
+        stored = self._fetch_docs('raw_posts', [post.post_id for post in posts])
+
+        changed = []
+        for post in posts:
+            doc = stored.get(post.post_id)
+            if not doc:
+                continue
+            fields = {
+                'likes_count': post.likes_count,
+                'comments_count': post.comments_count,
+                'shares_count': post.shares_count,
+                'comments': post.comments
+            }
+            if any(doc.get(name) != value for name, value in fields.items()):
+                doc.update(fields)
+                doc.pop(ContentHash.FIELD, None)
+                changed.append(doc)
+
+        self._write_raw_posts(changed)
+        return len(changed)
+
+    def update_availability(self, statuses: Dict[str, str]) -> int:
+        """
+        Atualiza o status de disponibilidade dos anúncios (vendido/reservado)
+
+        O status só avança (disponível -> reservado -> vendido), como no MongoDB.
+
+        Returns:
+            Número de anúncios com status alterado
+        """
+        stored = self._fetch_docs('equipment_ads', list(statuses))
+        statuses = AvailabilityDetector.upgrades(statuses, {
+            post_id: doc.get('availability_status') for post_id, doc in stored.items()
+        })
+        modified = self.bulk_update_ad_fields({
+            post_id: {'availability_status': status}
+            for post_id, status in statuses.items()
+        })
+        if modified:
+            logger.info(f"✓ {modified} anúncios com disponibilidade alterada")
+        return modified
+
+    # ------------------------------------------------------------------
+    # Leitura por ID
+    # ------------------------------------------------------------------
+
+    def get_raw_posts_by_ids(self, post_ids: List[str]) -> Dict[str, Dict]:
+        """Posts brutos já salvos (post_id -> documento)"""
+        if not post_ids:
+            return {}
+        return self._fetch_docs('raw_posts', post_ids)
+
+    def get_ads_by_post_ids(self, post_ids: List[str], projection: str = 'full') -> Dict[str, Dict]:
+        """Anúncios já analisados (post_id -> documento)"""
+        if not post_ids:
+            return {}
+        return {
+            post_id: self._project(doc, projection)
+            for post_id, doc in self._fetch_docs('equipment_ads', post_ids).items()
+        }
+
+    # ------------------------------------------------------------------
+    # Ledger e fila de análise
+    # ------------------------------------------------------------------
+
+    def record_analysis_outcomes(self, outcomes: Dict[str, str], prompt_version: str) -> int:
+        """
+        Registra no ledger de raw_posts o resultado da análise de cada post
+
+        Returns:
+            Número de posts atualizados
+        """
+        if not outcomes:
+            return 0
+
+        now = datetime.utcnow()
+        stored = self._fetch_docs('raw_posts', list(outcomes))
+        for post_id, doc in stored.items():
+            doc.update({
+                'analysis_status': outcomes[post_id],
+                'analysis_prompt_version': prompt_version,
+                'analysis_at': now
+            })
+
+        self._write_raw_posts(list(stored.values()))
+        return len(stored)
+
+    def get_unanalyzed_posts(
+        self,
+        limit: Optional[int] = 100,
+        include_errors: bool = False,
+        batch_size: int = 100
+    ) -> Iterator[Dict]:
+        """
+        Busca posts que ainda não foram analisados (varredura do índice do ledger)
+
+        Args:
+            limit: Número máximo de posts (None = todos)
+            include_errors: Incluir posts cuja análise falhou
+            batch_size: Posts lidos por consulta
+
+        Returns:
+            Iterador de posts não analisados
+        """
+        statuses = [AnalysisStatus.PENDING.value]
+        if include_errors:
+            statuses.append(AnalysisStatus.ERROR.value)
+        placeholders = ','.join('?' * len(statuses))
+
+        remaining = limit
+        last_id = ''
+        while remaining is None or remaining > 0:
+            size = batch_size if remaining is None else min(batch_size, remaining)
+            with self._lock:
+                rows = self.conn.execute(
+                    f"SELECT post_id, doc FROM raw_posts "
+                    f"WHERE analysis_status IN ({placeholders}) AND post_id > ? "
+                    f"ORDER BY post_id LIMIT ?",
+                    [*statuses, last_id, size]
+                ).fetchall()
+            if not rows:
+                return
+
+            for post_id, doc in rows:
+                yield self._loads(doc)
+            last_id = rows[-1][0]
+            if remaining is not None:
+                remaining -= len(rows)
+
+    def enqueue_for_analysis(self, priorities: Dict[str, float], lane: str = "backlog") -> int:
+        """
+        Coloca posts na fila de análise (ou atualiza prioridade/raia)
+
+        Returns:
+            Número de posts novos na fila
+        """
+        if not priorities:
+            return 0
+
+        now = self._timestamp(datetime.utcnow())
+        with self._lock, self.conn:
+            queued = set()
+            for chunk in self._chunks(list(priorities)):
+                placeholders = ','.join('?' * len(chunk))
+                queued.update(post_id for post_id, in self.conn.execute(
+                    f"SELECT post_id FROM analysis_queue WHERE post_id IN ({placeholders})", chunk
+                ))
+            self.conn.executemany(
+                """
+                INSERT INTO analysis_queue (post_id, priority, lane, enqueued_at, claimed_until)
+                VALUES (?, ?, ?, ?, NULL)
+                ON CONFLICT (post_id) DO UPDATE SET
+                    priority = excluded.priority, lane = excluded.lane
+                """,
+                [(post_id, priority, lane, now) for post_id, priority in priorities.items()]
+            )
+        return len(set(priorities) - queued)
+
+    def get_queued_posts(self, limit: Optional[int] = None, lane: str = "backlog") -> List[Dict]:
+        """Entradas livres de uma raia da fila, da maior para a menor prioridade"""
+        with self._lock:
+            rows = self.conn.execute(
+                """
+                SELECT post_id, priority FROM analysis_queue
+                WHERE lane = ? AND (claimed_until IS NULL OR claimed_until < ?)
+                ORDER BY priority DESC LIMIT ?
+                """,
+                (lane, self._timestamp(datetime.utcnow()), limit or -1)
+            ).fetchall()
+        return [{'post_id': post_id, 'priority': priority} for post_id, priority in rows]
+
+    def claim_queued_post(self, post_id: str, seconds: int = 600) -> bool:
+        """Reserva um post da fila para este processo"""
+        now = datetime.utcnow()
+        with self._lock, self.conn:
+            cursor = self.conn.execute(
+                """
+                UPDATE analysis_queue SET claimed_until = ?
+                WHERE post_id = ? AND (claimed_until IS NULL OR claimed_until < ?)
+                """,
+                (self._timestamp(now + timedelta(seconds=seconds)), post_id, self._timestamp(now))
+            )
+        return cursor.rowcount == 1
+
+    def dequeue_posts(self, post_ids: List[str]) -> int:
+        """Remove posts da fila de análise"""
+        deleted = 0
+        with self._lock, self.conn:
+            for chunk in self._chunks(list(post_ids)):
+                placeholders = ','.join('?' * len(chunk))
+                deleted += self.conn.execute(
+                    f"DELETE FROM analysis_queue WHERE post_id IN ({placeholders})", chunk
+                ).rowcount
+        return deleted
+
+    def load_rate_limit(self, key: str) -> Optional[Dict[str, Any]]:
+        """Estado de um rate limit compartilhado entre processos"""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT doc, version FROM rate_limits WHERE key = ?", (key,)
+            ).fetchone()
+        if not row:
+            return None
+        return {**self._loads(row[0]), 'version': row[1]}
+
+    def save_rate_limit(self, key: str, state: Dict[str, Any], version: Optional[int]) -> bool:
+        """Grava o estado se a versão gravada ainda for version (None = criar)"""
+        with self._lock, self.conn:
+            if version is None:
+                cursor = self.conn.execute(
+                    "INSERT OR IGNORE INTO rate_limits (key, version, doc) VALUES (?, 1, ?)",
+                    (key, self._dumps(state))
+                )
+            else:
+                cursor = self.conn.execute(
+                    "UPDATE rate_limits SET version = ?, doc = ? WHERE key = ? AND version = ?",
+                    (version + 1, self._dumps(state), key, version)
+                )
+        return cursor.rowcount == 1
+
+    # ------------------------------------------------------------------
+    # Listagens paginadas
+    # ------------------------------------------------------------------
+
+    def _keyset_page(
+        self,
+        where: List[str],
+        params: List[Any],
+        sort_column: str,
+        limit: int,
+        page_token: Optional[str] = None,
+        projection: str = 'full'
+    ) -> Page:
+        """
+        Paginação por keyset: ordena por (sort_column, post_id) decrescentes
+        e continua após o último anúncio da página anterior
+
+        Args:
+            where: Condições SQL (combinadas com AND)
+            params: Parâmetros das condições
+            sort_column: Coluna de ordenação (decrescente)
+            limit: Anúncios por página
+            page_token: Token da página anterior
+            projection: Perfil de campos ('summary', 'card' ou 'full')
+
+        Returns:
+            Página de anúncios
+        """
+        where = ['is_advertisement = 1'] + where
+        params = list(params)
+        if page_token:
+            value, last_id = self._decode_page_token(page_token)
+            where.append(f"({sort_column} < ? OR ({sort_column} = ? AND post_id < ?))")
+            params += [value, value, last_id]
+
+        with self._lock:
+            rows = self.conn.execute(
+                f"SELECT {sort_column}, post_id, doc FROM equipment_ads "
+                f"WHERE {' AND '.join(where)} "
+                f"ORDER BY {sort_column} DESC, post_id DESC LIMIT ?",
+                params + [limit + 1]
+            ).fetchall()
+
+        docs = [self._project(self._loads(doc), projection) for _, _, doc in rows[:limit]]
+        next_token = None
+        if len(rows) > limit:
+            value, last_id, _ = rows[limit - 1]
+            next_token = self._encode_page_token(value, last_id)
+        return Page(docs, next_token)
+
+    def search_ads(
+        self,
+        equipment_type: Optional[str] = None,
+        brand: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        state: Optional[str] = None,
+        has_repair: Optional[bool] = None,
+        limit: int = 100,
+        page_token: Optional[str] = None,
+        projection: str = 'full'
+    ) -> Page:
+        """
+        Busca anúncios com filtros (mesmos argumentos de
+        MongoDBPersistence.search_ads)
+
+        Returns:
+            Página de anúncios (mais recentes primeiro)
+        """
+        where, params = [], []
+
+        if equipment_type:
+            where.append("equipment_type = ?")
+            params.append(equipment_type)
+
+        if brand:
+            where.append("brand_key = ?")
+            params.append(BrandNormalizer.canonical_key(brand))
+
+        if min_price is not None:
+            where.append("price >= ?")
+            params.append(min_price)
+        if max_price is not None:
+            where.append("price <= ?")
+            params.append(max_price)
+
+        if state:
+            where.append("state = ?")
+            params.append(state.upper())
+
+        if has_repair is not None:
+            where.append("has_repair = ?")
+            params.append(1 if has_repair else 0)
+
+        ads = self._keyset_page(where, params, 'posted_at', limit, page_token, projection)
+
+        logger.info(f"Busca retornou {len(ads)} anúncios")
+        return ads
+
+    def get_recent_ads(
+        self,
+        hours: int = 24,
+        limit: int = 100,
+        page_token: Optional[str] = None,
+        projection: str = 'full'
+    ) -> Page:
+        """Busca anúncios publicados nas últimas `hours` horas (índice ads_posted)"""
+        cutoff = self._timestamp(datetime.utcnow() - timedelta(hours=hours))
+
+        ads = self._keyset_page(
+            ["posted_at >= ?"], [cutoff], 'posted_at', limit, page_token, projection
+        )
+
+        logger.info(f"{len(ads)} anúncios nas últimas {hours} horas")
+        return ads
+
+    def get_high_potential_ads(
+        self,
+        min_score: int = 70,
+        equipment_type: Optional[str] = None,
+        limit: int = 100,
+        include_unavailable: bool = False,
+        page_token: Optional[str] = None,
+        projection: str = 'full'
+    ) -> Page:
+        """Busca anúncios com alto potencial de revenda (maior score primeiro)"""
+        where, params = ["resale_total_score >= ?"], [min_score]
+
+        if equipment_type:
+            where.append("equipment_type = ?")
+            params.append(equipment_type)
+
+        if not include_unavailable:
+            where.append("(availability_status IS NULL OR availability_status NOT IN (?, ?))")
+            params += [AvailabilityStatus.RESERVED.value, AvailabilityStatus.SOLD.value]
+
+        ads = self._keyset_page(where, params, 'resale_total_score', limit, page_token, projection)
+
+        logger.info(f"{len(ads)} anúncios com score ≥ {min_score}")
+        return ads
+
+    @staticmethod
+    def _fts_query(search_text: str) -> str:
+        """Termos da busca como OR de frases FTS5 (como o $text do MongoDB)"""
+        terms = [term.replace('"', '""') for term in search_text.split()]
+        return ' OR '.join(f'"{term}"' for term in terms if term)
+
+    def text_search(
+        self,
+        search_text: str,
+        limit: int = 50,
+        page_token: Optional[str] = None,
+        projection: str = 'full'
+    ) -> Page:
+        """
+        Busca por texto (FTS5, relevância BM25)
+
+        Args:
+            search_text: Texto a buscar
+            limit: Limite de resultados por página
+            page_token: Token da página anterior (Page.next_token)
+            projection: Perfil de campos ('summary', 'card' ou 'full')
+
+        Returns:
+            Página de anúncios (mais relevantes primeiro)
+        """
+        match = self._fts_query(search_text)
+        if not match:
+            return Page()
+
+        where, params = [], [match]
+        if page_token:
+            value, last_id = self._decode_page_token(page_token)
+            where.append("WHERE score < ? OR (score = ? AND post_id < ?)")
+            params += [value, value, last_id]
+
+        with self._lock:
+            rows = self.conn.execute(
+                f"""
+                SELECT score, post_id, doc FROM (
+                    SELECT -bm25(ads_fts) AS score, e.post_id, e.doc
+                    FROM ads_fts JOIN equipment_ads e ON e.rowid = ads_fts.rowid
+                    WHERE ads_fts MATCH ?
+                ) {' '.join(where)}
+                ORDER BY score DESC, post_id DESC LIMIT ?
+                """,
+                params + [limit + 1]
+            ).fetchall()
+
+        docs = []
+        for score, _, doc in rows[:limit]:
+            doc = self._project(self._loads(doc), projection)
+            doc['score'] = score
+            docs.append(doc)
+
+        next_token = None
+        if len(rows) > limit:
+            value, last_id, _ = rows[limit - 1]
+            next_token = self._encode_page_token(value, last_id)
+        ads = Page(docs, next_token)
+
+        logger.info(f"Busca por '{search_text}' retornou {len(ads)} resultados")
+        return ads
+
+    # ------------------------------------------------------------------
+    # Histórico de versões
+    # ------------------------------------------------------------------
+
+    def get_price_drops(
+        self,
+        min_drop_pct: float = 10,
+        days: int = 30,
+        limit: int = 50,
+        include_unavailable: bool = False,
+        projection: str = 'summary'
+    ) -> List[Dict]:
+        """
+        Anúncios cujo preço caiu pelo menos min_drop_pct% nos últimos dias
+        (mesmo resultado de MongoDBPersistence.get_price_drops)
+        """
+        cutoff = self._timestamp(datetime.utcnow() - timedelta(days=days))
+        unavailable = (AvailabilityStatus.RESERVED.value, AvailabilityStatus.SOLD.value)
+
+        with self._lock:
+            rows = self.conn.execute(
+                """
+                WITH window AS (
+                    SELECT listing_key, post_id, recorded_at, price_from, price_to
+                    FROM ad_versions WHERE price_changed = 1 AND recorded_at >= ?
+                ), listing AS (
+                    SELECT listing_key, MAX(price_from) AS peak_price,
+                           MAX(recorded_at) AS last_change_at, COUNT(*) AS price_changes
+                    FROM window GROUP BY listing_key
+                )
+                SELECT l.listing_key, w.post_id, l.peak_price, w.price_to,
+                       (l.peak_price - w.price_to) * 100.0 / l.peak_price AS drop_pct,
+                       l.price_changes, l.last_change_at, e.doc
+                FROM listing l
+                JOIN window w ON w.listing_key = l.listing_key
+                    AND w.recorded_at = l.last_change_at
+                LEFT JOIN equipment_ads e ON e.post_id = w.post_id
+                WHERE l.peak_price > 0 AND w.price_to IS NOT NULL
+                    AND (l.peak_price - w.price_to) * 100.0 / l.peak_price >= ?
+                    AND (? OR e.availability_status IS NULL
+                         OR e.availability_status NOT IN (?, ?))
+                ORDER BY drop_pct DESC, l.last_change_at DESC
+                LIMIT ?
+                """,
+                (cutoff, min_drop_pct, 1 if include_unavailable else 0, *unavailable, limit)
+            ).fetchall()
+
+        drops = [
+            {
+                'listing_key': listing_key,
+                'post_id': post_id,
+                'peak_price': peak_price,
+                'price': price,
+                'drop_pct': round(drop_pct, 1),
+                'price_changes': price_changes,
+                'last_change_at': datetime.fromisoformat(last_change_at),
+                'ad': self._project(self._loads(doc), projection) if doc else None
+            }
+            for listing_key, post_id, peak_price, price, drop_pct, price_changes,
+                last_change_at, doc in rows
+        ]
+
+        logger.info(f"{len(drops)} anúncios com queda de preço ≥ {min_drop_pct}% em {days} dias")
+        return drops
+
+    def get_listing_history(self, post_id: str) -> List[Dict]:
+        """Versões do anúncio de um post (inclui reposts), mais antigas primeiro"""
+        ad = self._fetch_docs('equipment_ads', [post_id]).get(post_id)
+        if not ad:
+            return []
+
+        listing_key = ad.get('listing_key') or f"post:{post_id}"
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT doc FROM ad_versions WHERE listing_key = ? ORDER BY recorded_at, id",
+                (listing_key,)
+            ).fetchall()
+        return [self._loads(doc) for (doc,) in rows]
+
+    # ------------------------------------------------------------------
+    # Estatísticas e exportação
+    # ------------------------------------------------------------------
+
+    def _price_quantile(self, count: int, q: float) -> Optional[float]:
+        """Quantil exato (nearest-rank) percorrendo o índice ads_price"""
+        row = self.conn.execute(
+            "SELECT price FROM equipment_ads WHERE is_advertisement = 1 "
+            "AND price IS NOT NULL ORDER BY price LIMIT 1 OFFSET ?",
+            (max(math.ceil(q * count) - 1, 0),)
+        ).fetchone()
+        return row[0] if row else None
+
+    def get_statistics(self) -> Dict[str, Any]:
+        """
+        Estatísticas do banco (agregadas em SQL; mediana e quantis exatos)
+
+        Returns:
+            Dicionário no formato de MongoDBPersistence.get_statistics
+        """
+        with self._lock:
+            execute = self.conn.execute
+            ads_only = "FROM equipment_ads WHERE is_advertisement = 1"
+
+            stats = {
+                'total_raw_posts': execute("SELECT COUNT(*) FROM raw_posts").fetchone()[0],
+                'total_ads': execute(f"SELECT COUNT(*) {ads_only}").fetchone()[0]
+            }
+
+            stats['by_equipment_type'] = {
+                equipment_type: {'count': count, 'avg_price': avg_price}
+                for equipment_type, count, avg_price in execute(
+                    f"SELECT equipment_type, COUNT(*), AVG(price) {ads_only} "
+                    f"GROUP BY equipment_type"
+                )
+            }
+
+            stats['top_brands'] = [
+                {'brand': BrandNormalizer.display_name(brand), 'count': count}
+                for brand, count in execute(
+                    f"SELECT brand_key, COUNT(*) AS n {ads_only} AND brand_key IS NOT NULL "
+                    f"GROUP BY brand_key ORDER BY n DESC LIMIT 10"
+                )
+            ]
+
+            stats['by_state'] = dict(execute(
+                f"SELECT state, COUNT(*) AS n {ads_only} AND state IS NOT NULL "
+                f"GROUP BY state ORDER BY n DESC"
+            ).fetchall())
+
+            count, avg, low, high = execute(
+                f"SELECT COUNT(price), AVG(price), MIN(price), MAX(price) {ads_only}"
+            ).fetchone()
+            if count:
+                stats['prices'] = {
+                    'avg': avg,
+                    'min': low,
+                    'max': high,
+                    'median': self._price_quantile(count, 0.5),
+                    'p25': self._price_quantile(count, 0.25),
+                    'p75': self._price_quantile(count, 0.75),
+                    'p90': self._price_quantile(count, 0.9)
+                }
+
+            stats['with_repair'] = execute(
+                f"SELECT COUNT(*) {ads_only} AND has_repair = 1"
+            ).fetchone()[0]
+
+            resale = execute(
+                f"""
+                SELECT COUNT(resale_total_score), AVG(resale_total_score),
+                       MIN(resale_total_score), MAX(resale_total_score),
+                       SUM(resale_total_score >= 70),
+                       SUM(resale_total_score >= 50 AND resale_total_score < 70),
+                       SUM(resale_total_score < 50)
+                {ads_only}
+                """
+            ).fetchone()
+            if resale[0]:
+                stats['resale_potential'] = {
+                    'avg_score': round(resale[1], 1),
+                    'min_score': resale[2],
+                    'max_score': resale[3],
+                    'high_potential': resale[4],  # ≥70
+                    'medium_potential': resale[5],  # 50-69
+                    'low_potential': resale[6]  # <50
+                }
+
+        stats['updated_at'] = datetime.utcnow()
+        return stats
+
+    def rebuild_statistics(self) -> Dict[str, Any]:
+        """
+        Nada é materializado no SQLite: atualiza as estatísticas do
+        planejador (ANALYZE) e compacta o índice FTS
+        """
+        with self._lock, self.conn:
+            self.conn.execute("INSERT INTO ads_fts (ads_fts) VALUES ('optimize')")
+            self.conn.execute("ANALYZE")
+        return self.get_statistics()
+
+    def export_to_csv(
+        self,
+        output_file: str,
+        query: Dict = None,
+        columns=None,
+        batch_size: int = None
+    ) -> int:
+        """
+        Exporta anúncios para CSV
+
+        Args:
+            output_file: Caminho do arquivo CSV
+            query: Filtros de igualdade em AD_COLUMNS (default: só anúncios)
+            columns: Campos a exportar (lista, perfil de projeção ou None)
+            batch_size: Linhas lidas por vez
+
+        Returns:
+            Número de anúncios exportados
+        """
+        if query is None:
+            query = {'is_advertisement': True}
+
+        where, params = [], []
+        for column, value in query.items():
+            if column not in self.AD_COLUMNS or isinstance(value, dict):
+                raise ValueError(
+                    f"Filtro não suportado no SQLite: {column} "
+                    f"(use igualdade em {', '.join(self.AD_COLUMNS)})"
+                )
+            where.append(f"{column} = ?")
+            params.append(int(value) if isinstance(value, bool) else value)
+
+        header = self.csv_columns(columns)
+        sql = "SELECT doc FROM equipment_ads"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+
+        exported = 0
+        with self._lock, open(output_file, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            cursor = self.conn.execute(sql + " ORDER BY post_id", params)
+            while True:
+                rows = cursor.fetchmany(batch_size or 1000)
+                if not rows:
+                    break
+                for (doc,) in rows:
+                    doc = self._loads(doc)
+                    writer.writerow([self._csv_value(doc, column) for column in header])
+                    exported += 1
+
+        if exported:
+            logger.info(f"✓ {exported} anúncios exportados para {output_file}")
+        else:
+            logger.warning("Nenhum anúncio para exportar")
+        return exported
+
+    def close(self):
+        """Fecha o arquivo do banco"""
+        if self.conn:
+            self.conn.close()
+            self.conn = None
@@ -0,0 +1,417 @@
+"""
+Estatísticas materializadas de anúncios
+Mantidas com $inc a cada save/alteração, para leituras O(1) no CLI/dashboard
+"""
+import copy
+import logging
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+from src.brand_normalizer import BrandNormalizer
+
+logger = logging.getLogger(__name__)
+
+
+class StatsStore:
+    """Contadores incrementais da collection equipment_ads"""
+
+    STATS_ID = "equipment_ads"
+
+    # Campos de equipment_ads que alimentam as estatísticas
+    FIELDS = {
+        '_id': 0, 'post_id': 1, 'is_advertisement': 1, 'equipment_type': 1,
+        'brand': 1, 'brand_key': 1, 'state': 1, 'price': 1, 'has_repair': 1,
+        'resale_total_score': 1, 'resale_score.total_score': 1
+    }
+
+    # Largura (R$) das faixas do histograma de preços usado na mediana
+    PRICE_BUCKET = 250
+
+    def __init__(self, db):
+        """
+        Args:
+            db: Database do pymongo
+        """
+        self.db = db
+        self.collection = db.stats
+
+    # ------------------------------------------------------------------
+    # Contribuição de um documento
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _key(value: Any) -> Optional[str]:
+        """Valor seguro para usar como nome de campo no MongoDB"""
+        if value is None or value == '':
+            return None
+        return str(value).replace('.', '_').replace('$', '_')
+
+    @staticmethod
+    def _resale_total(doc: Dict) -> Optional[float]:
+        """Score total de revenda (campo numérico ou dict do ResaleScorer)"""
+        score = doc.get('resale_total_score')
+        if score is None and isinstance(doc.get('resale_score'), dict):
+            score = doc['resale_score'].get('total_score')
+        return score if isinstance(score, (int, float)) else None
+
+    @classmethod
+    def _price(cls, doc: Dict) -> Optional[float]:
+        price = doc.get('price')
+        return price if isinstance(price, (int, float)) and not isinstance(price, bool) else None
+
+    @classmethod
+    def contribution(cls, doc: Optional[Dict]) -> Dict[str, float]:
+        """
+        Incrementos que um anúncio soma aos contadores
+
+        Args:
+            doc: Documento de equipment_ads (ou None)
+
+        Returns:
+            Dicionário caminho -> incremento
+        """
+        if not doc or not doc.get('is_advertisement'):
+            return {}
+
+        inc = {'total_ads': 1}
+
+        equipment_type = cls._key(doc.get('equipment_type'))
+        price = cls._price(doc)
+
+        if equipment_type:
+            inc[f'by_type.{equipment_type}.count'] = 1
+            if price is not None:
+                inc[f'by_type.{equipment_type}.price_sum'] = price
+                inc[f'by_type.{equipment_type}.price_count'] = 1
+
+        brand = cls._key(
+            doc.get('brand_key') or BrandNormalizer.canonical_key(doc.get('brand'))
+        )
+        if brand:
+            inc[f'brands.{brand}'] = 1
+
+        state = cls._key(doc.get('state'))
+        if state:
+            inc[f'states.{state}'] = 1
+
+        if price is not None:
+            bucket = int(price // cls.PRICE_BUCKET) * cls.PRICE_BUCKET
+            inc['prices.count'] = 1
+            inc['prices.sum'] = price
+            inc[f'prices.histogram.{bucket}'] = 1
+
+        if doc.get('has_repair'):
+            inc['with_repair'] = 1
+
+        score = cls._resale_total(doc)
+        if score is not None:
+            band = 'high' if score >= 70 else 'medium' if score >= 50 else 'low'
+            inc['resale.count'] = 1
+            inc['resale.sum'] = score
+            inc[f'resale.bands.{band}'] = 1
+
+        return inc
+
+    @staticmethod
+    def apply_set(doc: Optional[Dict], fields: Dict[str, Any]) -> Dict:
+        """Aplica um $set (com notação de ponto) numa cópia do documento"""
+        new_doc = copy.deepcopy(doc) if doc else {}
+        for path, value in fields.items():
+            target = new_doc
+            *parents, leaf = path.split('.')
+            for part in parents:
+                if not isinstance(target.get(part), dict):
+                    target[part] = {}
+                target = target[part]
+            target[leaf] = value
+        return new_doc
+
+    # ------------------------------------------------------------------
+    # Escrita
+    # ------------------------------------------------------------------
+
+    def fetch_previous(self, post_ids: List[str], fields: Dict = None) -> Dict[str, Dict]:
+        """
+        Estado atual (campos de estatística) antes de uma escrita
+
+        Args:
+            post_ids: IDs dos anúncios
+            fields: Projeção (default: FIELDS); inclua FIELDS ao ampliar
+        """
+        if not post_ids:
+            return {}
+        return {
+            doc['post_id']: doc
+            for doc in self.db.equipment_ads.find(
+                {'post_id': {'$in': list(post_ids)}}, fields or self.FIELDS
+            )
+        }
+
+    def apply_delta(self, old_docs: List[Dict], new_docs: List[Dict]):
+        """
+        Atualiza os contadores com a diferença entre o estado antigo e o novo
+
+        Só atua se as estatísticas já foram construídas (rebuild); antes
+        disso a primeira leitura faz o rebuild completo.
+        """
+        update = self.delta_update(old_docs, new_docs)
+        if update:
+            self.collection.update_one({'_id': self.STATS_ID, 'built': True}, update)
+
+    @classmethod
+    def delta_update(cls, old_docs: List[Dict], new_docs: List[Dict]) -> Optional[Dict]:
+        """
+        Update ($inc/$min/$max) com a diferença entre o estado antigo e o novo
+
+        Returns:
+            Documento de update (None se nada muda)
+        """
+        inc = defaultdict(int)
+        for doc in old_docs:
+            for path, value in cls.contribution(doc).items():
+                inc[path] -= value
+        for doc in new_docs:
+            for path, value in cls.contribution(doc).items():
+                inc[path] += value
+
+        update = {'$set': {'updated_at': datetime.utcnow()}}
+        inc = {path: value for path, value in inc.items() if value}
+        if inc:
+            update['$inc'] = inc
+
+        # Mínimos/máximos só crescem incrementalmente; o rebuild corrige
+        new_ads = [d for d in new_docs if d and d.get('is_advertisement')]
+        prices = [p for p in (cls._price(d) for d in new_ads) if p is not None]
+        scores = [s for s in (cls._resale_total(d) for d in new_ads) if s is not None]
+        if prices or scores:
+            update['$min'], update['$max'] = {}, {}
+            if prices:
+                update['$min']['prices.min'] = min(prices)
+                update['$max']['prices.max'] = max(prices)
+            if scores:
+                update['$min']['resale.min'] = min(scores)
+                update['$max']['resale.max'] = max(scores)
+
+        return update if len(update) > 1 else None
+
+    def rebuild(self, batch_size: int = 1000) -> Dict[str, Any]:
+        """
+        Recalcula todas as estatísticas a partir de equipment_ads (reparo)
+
+        Returns:
+            Documento de estatísticas
+        """
+        logger.info("Reconstruindo estatísticas materializadas...")
+
+        accumulator = StatsAccumulator()
+        cursor = self.db.equipment_ads.find(
+            {'is_advertisement': True}, self.FIELDS
+        ).batch_size(batch_size)
+
+        for doc in cursor:
+            accumulator.add(doc)
+
+        stats_doc = accumulator.to_document()
+        self.collection.replace_one({'_id': self.STATS_ID}, stats_doc, upsert=True)
+        logger.info(f"✓ Estatísticas reconstruídas ({stats_doc.get('total_ads', 0)} anúncios)")
+        return stats_doc
+
+    # ------------------------------------------------------------------
+    # Leitura
+    # ------------------------------------------------------------------
+
+    def read(self) -> Dict[str, Any]:
+        """
+        Lê as estatísticas materializadas (reconstrói se não existirem)
+
+        Returns:
+            Dicionário no formato de MongoDBPersistence.get_statistics
+        """
+        doc = self.collection.find_one({'_id': self.STATS_ID})
+        if not doc or not doc.get('built'):
+            doc = self.rebuild()
+
+        return self.summarize(doc)
+
+    @classmethod
+    def summarize(cls, doc: Dict) -> Dict[str, Any]:
+        """Converte o documento de contadores no formato de get_statistics"""
+        stats = {'total_ads': doc.get('total_ads', 0)}
+
+        stats['by_equipment_type'] = {
+            equipment_type: {
+                'count': data.get('count', 0),
+                'avg_price': (
+                    data['price_sum'] / data['price_count']
+                    if data.get('price_count') else None
+                )
+            }
+            for equipment_type, data in doc.get('by_type', {}).items()
+            if data.get('count', 0) > 0
+        }
+
+        brands = sorted(
+            ((b, c) for b, c in doc.get('brands', {}).items() if c > 0),
+            key=lambda item: item[1], reverse=True
+        )
+        stats['top_brands'] = [
+            {'brand': BrandNormalizer.display_name(brand), 'count': count}
+            for brand, count in brands[:10]
+        ]
+
+        states = sorted(
+            ((s, c) for s, c in doc.get('states', {}).items() if c > 0),
+            key=lambda item: item[1], reverse=True
+        )
+        stats['by_state'] = dict(states)
+
+        prices = doc.get('prices', {})
+        if prices.get('count', 0) > 0:
+            histogram = prices.get('histogram', {})
+            low, high = prices.get('min'), prices.get('max')
+            stats['prices'] = {
+                'avg': prices['sum'] / prices['count'],
+                'min': low,
+                'max': high,
+                'median': cls._histogram_quantile(histogram, 0.5, low, high),
+                'p25': cls._histogram_quantile(histogram, 0.25, low, high),
+                'p75': cls._histogram_quantile(histogram, 0.75, low, high),
+                'p90': cls._histogram_quantile(histogram, 0.9, low, high)
+            }
+
+        stats['with_repair'] = doc.get('with_repair', 0)
+
+        resale = doc.get('resale', {})
+        if resale.get('count', 0) > 0:
+            bands = resale.get('bands', {})
+            stats['resale_potential'] = {
+                'avg_score': round(resale['sum'] / resale['count'], 1),
+                'min_score': resale.get('min', 0),
+                'max_score': resale.get('max', 0),
+                'high_potential': bands.get('high', 0),  # ≥70
+                'medium_potential': bands.get('medium', 0),  # 50-69
+                'low_potential': bands.get('low', 0)  # <50
+            }
+
+        stats['updated_at'] = doc.get('updated_at')
+        return stats
+
+    @classmethod
+    def _histogram_quantile(
+        cls,
+        histogram: Dict[str, int],
+        q: float,
+        low: Optional[float] = None,
+        high: Optional[float] = None
+    ) -> Optional[float]:
+        """
+        Quantil aproximado a partir do histograma de preços
+
+        Interpola linearmente dentro da faixa e limita ao mínimo/máximo
+        materializados (com todos os preços em 3000, a mediana é 3000 e
+        não o centro da faixa).
+
+        Args:
+            histogram: Faixa (início, em R$) -> contagem
+            q: Quantil (0-1)
+            low: prices.min
+            high: prices.max
+        """
+        buckets = sorted(
+            (int(bucket), count) for bucket, count in histogram.items() if count > 0
+        )
+        total = sum(count for _, count in buckets)
+        if not total:
+            return None
+
+        target = q * total
+        seen = 0
+        value = buckets[-1][0] + cls.PRICE_BUCKET
+        for bucket, count in buckets:
+            if seen + count >= target:
+                value = bucket + cls.PRICE_BUCKET * (target - seen) / count
+                break
+            seen += count
+
+        if low is not None:
+            value = max(value, low)
+        if high is not None:
+            value = min(value, high)
+        return value
+
+
+class StatsAccumulator:
+    """Soma as contribuições de uma varredura de anúncios (rebuild)"""
+
+    def __init__(self):
+        self.totals = defaultdict(int)
+        self.extremes = {
+            'prices.min': None, 'prices.max': None,
+            'resale.min': None, 'resale.max': None
+        }
+
+    def _extend(self, prefix: str, value: Optional[float]):
+        if value is None:
+            return
+        low, high = self.extremes[f'{prefix}.min'], self.extremes[f'{prefix}.max']
+        self.extremes[f'{prefix}.min'] = value if low is None else min(low, value)
+        self.extremes[f'{prefix}.max'] = value if high is None else max(high, value)
+
+    def add(self, doc: Dict):
+        """Soma um documento de equipment_ads"""
+        for path, value in StatsStore.contribution(doc).items():
+            self.totals[path] += value
+
+        self._extend('prices', StatsStore._price(doc))
+        self._extend('resale', StatsStore._resale_total(doc))
+
+    def to_document(self) -> Dict[str, Any]:
+        """Documento de estatísticas (formato da collection stats)"""
+        stats_doc = {'built': True, 'updated_at': datetime.utcnow()}
+        for path, value in self.totals.items():
+            stats_doc = StatsStore.apply_set(stats_doc, {path: value})
+        return StatsStore.apply_set(stats_doc, self.extremes)
+
+
+class AsyncStatsStore(StatsStore):
+    """StatsStore sobre um database do Motor (mesmos contadores, métodos async)"""
+
+    async def fetch_previous(self, post_ids: List[str], fields: Dict = None) -> Dict[str, Dict]:
+        """Estado atual (campos de estatística) antes de uma escrita"""
+        if not post_ids:
+            return {}
+        cursor = self.db.equipment_ads.find(
+            {'post_id': {'$in': list(post_ids)}}, fields or self.FIELDS
+        )
+        return {doc['post_id']: doc async for doc in cursor}
+
+    async def apply_delta(self, old_docs: List[Dict], new_docs: List[Dict]):
+        """Atualiza os contadores com a diferença entre o estado antigo e o novo"""
+        update = self.delta_update(old_docs, new_docs)
+        if update:
+            await self.collection.update_one({'_id': self.STATS_ID, 'built': True}, update)
+
+    async def rebuild(self, batch_size: int = 1000) -> Dict[str, Any]:
+        """Recalcula todas as estatísticas a partir de equipment_ads (reparo)"""
+        logger.info("Reconstruindo estatísticas materializadas...")
+
+        accumulator = StatsAccumulator()
+        cursor = self.db.equipment_ads.find(
+            {'is_advertisement': True}, self.FIELDS
+        ).batch_size(batch_size)
+
+        async for doc in cursor:
+            accumulator.add(doc)
+
+        stats_doc = accumulator.to_document()
+        await self.collection.replace_one({'_id': self.STATS_ID}, stats_doc, upsert=True)
+        logger.info(f"✓ Estatísticas reconstruídas ({stats_doc.get('total_ads', 0)} anúncios)")
+        return stats_doc
+
+    async def read(self) -> Dict[str, Any]:
+        """Lê as estatísticas materializadas (reconstrói se não existirem)"""
+        doc = await self.collection.find_one({'_id': self.STATS_ID})
+        if not doc or not doc.get('built'):
+            doc = await self.rebuild()
+
+        return self.summarize(doc)
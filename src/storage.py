@@ -0,0 +1,325 @@
+"""
+Interface de armazenamento de posts e anúncios
+Implementada por MongoDBPersistence (src/database.py) e SQLiteStorage
+(src/sqlite_storage.py, embarcado, sem servidor)
+"""
+import base64
+from abc import ABC, abstractmethod
+from dataclasses import fields as dataclass_fields
+from typing import List, Dict, Any, Optional, Tuple, Iterator
+from bson import json_util
+from src.models import FacebookPost, EquipmentAd
+
+
+class Page(list):
+    """
+    Página de resultados (lista) com token opaco para a próxima página
+
+    next_token é None na última página; passe-o como page_token na
+    chamada seguinte para continuar de onde parou.
+    """
+
+    def __init__(self, items=(), next_token: Optional[str] = None):
+        super().__init__(items)
+        self.next_token = next_token
+
+
+class StorageBackend(ABC):
+    """
+    Operações de persistência usadas pelo pipeline, CLI e fila de análise
+
+    Os documentos trocados com o chamador têm o mesmo formato em todos os
+    backends (dicionários de FacebookPost/EquipmentAd.to_dict() mais os
+    campos de controle, ex: analyzed_at, analysis_status).
+    """
+
+    # Campos das listagens (também chaves dos índices de cobertura)
+    SUMMARY_FIELDS = [
+        'post_id', 'post_url', 'equipment_type', 'brand', 'model', 'year',
+        'size', 'price', 'city', 'state', 'resale_total_score',
+        'availability_status', 'analyzed_at', 'posted_at'
+    ]
+
+    # Perfis de projeção das consultas de leitura (None = documento inteiro)
+    PROJECTIONS = {
+        'summary': {'_id': 1, **{field: 1 for field in SUMMARY_FIELDS}},
+        'card': {
+            '_id': 1,
+            **{field: 1 for field in SUMMARY_FIELDS},
+            'brand_key': 1, 'condition': 1, 'has_repair': 1,
+            'price_negotiable': 1, 'comment_interest_level': 1,
+            'seller_name': 1, 'resale_score.classification': 1,
+            'resale_score.recommendation': 1
+        },
+        'full': None
+    }
+
+    # Colunas do resale_score (dict) no CSV; os fatores já são campos numéricos
+    CSV_RESALE_COLUMNS = [
+        'resale_score.classification',
+        'resale_score.recommendation',
+        'resale_score.breakdown'
+    ]
+
+    # ------------------------------------------------------------------
+    # Escrita
+    # ------------------------------------------------------------------
+
+    @abstractmethod
+    def save_raw_posts(self, posts: List[FacebookPost], batch_size: int = None) -> int:
+        """Upsert de posts brutos; retorna o número de posts salvos"""
+
+    @abstractmethod
+    def save_equipment_ads(self, ads: List[EquipmentAd], batch_size: int = None) -> int:
+        """Upsert de anúncios analisados; retorna o número de anúncios salvos"""
+
+    @abstractmethod
+    def update_ad_fields(self, post_id: str, fields: Dict[str, Any]) -> bool:
+        """Atualiza campos (notação com ponto) de um anúncio existente"""
+
+    @abstractmethod
+    def bulk_update_ad_fields(self, updates: Dict[str, Dict[str, Any]]) -> int:
+        """Atualiza campos de vários anúncios (post_id -> campos)"""
+
+    @abstractmethod
+    def update_engagement(self, posts: List[FacebookPost]) -> int:
+        """Atualiza engajamento e comentários dos posts brutos"""
+
+    @abstractmethod
+    def update_availability(self, statuses: Dict[str, str]) -> int:
+        """Atualiza availability_status (post_id -> AvailabilityStatus)"""
+
+    # ------------------------------------------------------------------
+    # Leitura por ID
+    # ------------------------------------------------------------------
+
+    @abstractmethod
+    def get_raw_posts_by_ids(self, post_ids: List[str]) -> Dict[str, Dict]:
+        """Posts brutos já salvos (post_id -> documento)"""
+
+    @abstractmethod
+    def get_ads_by_post_ids(self, post_ids: List[str], projection: str = 'full') -> Dict[str, Dict]:
+        """Anúncios já analisados (post_id -> documento)"""
+
+    # ------------------------------------------------------------------
+    # Ledger e fila de análise
+    # ------------------------------------------------------------------
+
+    @abstractmethod
+    def record_analysis_outcomes(self, outcomes: Dict[str, str], prompt_version: str) -> int:
+        """Registra o AnalysisStatus de cada post analisado"""
+
+    @abstractmethod
+    def get_unanalyzed_posts(
+        self,
+        limit: Optional[int] = 100,
+        include_errors: bool = False,
+        batch_size: int = 100
+    ) -> Iterator[Dict]:
+        """Posts pendentes de análise (iterável)"""
+
+    @abstractmethod
+    def enqueue_for_analysis(self, priorities: Dict[str, float], lane: str = "backlog") -> int:
+        """Coloca posts na fila de análise; retorna quantos são novos"""
+
+    @abstractmethod
+    def get_queued_posts(self, limit: Optional[int] = None, lane: str = "backlog") -> List[Dict]:
+        """Entradas livres de uma raia ({post_id, priority}), maior prioridade primeiro"""
+
+    @abstractmethod
+    def claim_queued_post(self, post_id: str, seconds: int = 600) -> bool:
+        """Reserva um post da fila; False se outro processo já o reservou"""
+
+    @abstractmethod
+    def dequeue_posts(self, post_ids: List[str]) -> int:
+        """Remove posts da fila"""
+
+    @abstractmethod
+    def load_rate_limit(self, key: str) -> Optional[Dict[str, Any]]:
+        """Estado compartilhado de um rate limit ({..., version}) ou None"""
+
+    @abstractmethod
+    def save_rate_limit(self, key: str, state: Dict[str, Any], version: Optional[int]) -> bool:
+        """Grava o estado se a versão gravada ainda for version (None = criar); False em conflito"""
+
+    # ------------------------------------------------------------------
+    # Listagens paginadas
+    # ------------------------------------------------------------------
+
+    @abstractmethod
+    def search_ads(
+        self,
+        equipment_type: Optional[str] = None,
+        brand: Optional[str] = None,
+        min_price: Optional[float] = None,
+        max_price: Optional[float] = None,
+        state: Optional[str] = None,
+        has_repair: Optional[bool] = None,
+        limit: int = 100,
+        page_token: Optional[str] = None,
+        projection: str = 'full'
+    ) -> Page:
+        """Anúncios filtrados, mais recentes primeiro"""
+
+    @abstractmethod
+    def get_recent_ads(
+        self,
+        hours: int = 24,
+        limit: int = 100,
+        page_token: Optional[str] = None,
+        projection: str = 'full'
+    ) -> Page:
+        """Anúncios analisados nas últimas `hours` horas"""
+
+    @abstractmethod
+    def get_high_potential_ads(
+        self,
+        min_score: int = 70,
+        equipment_type: Optional[str] = None,
+        limit: int = 100,
+        include_unavailable: bool = False,
+        page_token: Optional[str] = None,
+        projection: str = 'full'
+    ) -> Page:
+        """Anúncios com resale_total_score ≥ min_score, maior score primeiro"""
+
+    @abstractmethod
+    def text_search(
+        self,
+        search_text: str,
+        limit: int = 50,
+        page_token: Optional[str] = None,
+        projection: str = 'full'
+    ) -> Page:
+        """Busca full-text (description/brand/model), mais relevantes primeiro"""
+
+    # ------------------------------------------------------------------
+    # Histórico de versões
+    # ------------------------------------------------------------------
+
+    @abstractmethod
+    def get_price_drops(
+        self,
+        min_drop_pct: float = 10,
+        days: int = 30,
+        limit: int = 50,
+        include_unavailable: bool = False,
+        projection: str = 'summary'
+    ) -> List[Dict]:
+        """Anúncios (por listing_key) com queda de preço ≥ min_drop_pct% em `days` dias"""
+
+    @abstractmethod
+    def get_listing_history(self, post_id: str) -> List[Dict]:
+        """Versões do anúncio de um post (inclui reposts), mais antigas primeiro"""
+
+    # ------------------------------------------------------------------
+    # Estatísticas e exportação
+    # ------------------------------------------------------------------
+
+    @abstractmethod
+    def get_statistics(self) -> Dict[str, Any]:
+        """Estatísticas agregadas (formato de MongoDBPersistence.get_statistics)"""
+
+    @abstractmethod
+    def rebuild_statistics(self) -> Dict[str, Any]:
+        """Recalcula estatísticas mantidas incrementalmente (se houver)"""
+
+    @abstractmethod
+    def export_to_csv(
+        self,
+        output_file: str,
+        query: Dict = None,
+        columns=None,
+        batch_size: int = None
+    ) -> int:
+        """Exporta anúncios para CSV; retorna o número de linhas"""
+
+    @abstractmethod
+    def close(self):
+        """Libera a instância"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    # ------------------------------------------------------------------
+    # Auxiliares compartilhados
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def _projection(cls, profile: str) -> Optional[Dict[str, int]]:
+        """
+        Projeção de um perfil nomeado
+
+        Args:
+            profile: 'summary', 'card' ou 'full'
+
+        Returns:
+            Dicionário de projeção (None para o documento inteiro)
+        """
+        if profile not in cls.PROJECTIONS:
+            raise ValueError(
+                f"Perfil de projeção desconhecido: {profile} "
+                f"(use {', '.join(cls.PROJECTIONS)})"
+            )
+        return cls.PROJECTIONS[profile]
+
+    @staticmethod
+    def _encode_page_token(value: Any, _id: Any) -> str:
+        """Token opaco (base64 de JSON estendido) com a chave de ordenação e o _id"""
+        payload = json_util.dumps({'v': value, 'id': _id})
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+
+    @staticmethod
+    def _decode_page_token(token: str) -> Tuple[Any, Any]:
+        try:
+            payload = json_util.loads(base64.urlsafe_b64decode(token.encode()))
+            return payload['v'], payload['id']
+        except Exception:
+            raise ValueError(f"Token de página inválido: {token}")
+
+    @classmethod
+    def csv_columns(cls, columns=None) -> List[str]:
+        """
+        Colunas do CSV de anúncios
+
+        Args:
+            columns: Lista de campos (notação com ponto), nome de um perfil
+                de projeção ou None para todos os campos de EquipmentAd
+
+        Returns:
+            Lista de colunas
+        """
+        if columns is None:
+            names = []
+            for field in dataclass_fields(EquipmentAd):
+                if field.name == 'resale_score':
+                    names += cls.CSV_RESALE_COLUMNS
+                else:
+                    names.append(field.name)
+            return names
+
+        if isinstance(columns, str):
+            projection = cls._projection(columns) or {}
+            if not projection:
+                return cls.csv_columns()
+            return [field for field in projection if field != '_id']
+
+        return list(columns)
+
+    @staticmethod
+    def _csv_value(doc: Dict, column: str) -> Any:
+        """Valor de uma coluna (notação com ponto) achatado para o CSV"""
+        value = doc
+        for part in column.split('.'):
+            if not isinstance(value, dict):
+                return None
+            value = value.get(part)
+
+        if isinstance(value, list):
+            return '; '.join(str(item) for item in value)
+        if isinstance(value, dict):
+            return json_util.dumps(value, ensure_ascii=False)
+        return value
@@ -0,0 +1,307 @@
+"""
+Watcher de anúncios em tempo real (change streams de equipment_ads)
+Cada anúncio inserido ou alterado que passa nos critérios vai para um
+destino (stdout, arquivo JSONL ou webhook). O resume token é gravado a cada
+evento entregue: reiniciar continua de onde parou, sem perder anúncios.
+
+Change streams exigem replica set (um nó basta; ver README).
+"""
+import sys
+import json
+import time
+import logging
+import threading
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, asdict
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+import requests
+from pymongo.errors import OperationFailure
+from src.database import MongoDBPersistence
+from src.storage import StorageBackend
+from src.content_hash import ContentHash
+
+logger = logging.getLogger(__name__)
+
+# Códigos de erro do servidor
+CHANGE_STREAM_HISTORY_LOST = 286
+CHANGE_STREAM_NOT_SUPPORTED = 40573
+
+
+@dataclass
+class WatchCriteria:
+    """Filtro dos anúncios notificados (mesmos critérios de search/potential)"""
+    min_score: Optional[int] = 70
+    equipment_type: Optional[str] = None
+    brand: Optional[str] = None
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
+    state: Optional[str] = None
+    has_repair: Optional[bool] = None
+    include_unavailable: bool = False
+
+    def query(self) -> Dict:
+        """Filtro de equipment_ads (construtores de consulta de MongoDBPersistence)"""
+        query = MongoDBPersistence._search_query(
+            self.equipment_type, self.brand, self.min_price, self.max_price,
+            self.state, self.has_repair
+        )
+        query.update(MongoDBPersistence._high_potential_query(
+            self.min_score or 0, self.equipment_type, self.include_unavailable
+        ))
+        if self.min_score is None:
+            del query['resale_total_score']
+        return query
+
+
+# ----------------------------------------------------------------------
+# Destinos
+# ----------------------------------------------------------------------
+
+class AdSink(ABC):
+    """Destino dos eventos; emit deve falhar (exceção) se não entregou"""
+
+    @abstractmethod
+    def emit(self, event: Dict[str, Any]):
+        """Entrega um evento"""
+
+    def close(self):
+        """Libera recursos"""
+
+    @staticmethod
+    def dumps(event: Dict[str, Any]) -> str:
+        """Evento em JSON (datas como string)"""
+        return json.dumps(event, default=str, ensure_ascii=False)
+
+
+class StdoutSink(AdSink):
+    """Uma linha legível por anúncio"""
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+
+    def emit(self, event: Dict[str, Any]):
+        ad = event['ad']
+        price = f"R$ {ad['price']:.0f}" if ad.get('price') else "sem preço"
+        tag = "🆕" if event['reason'] == 'new' else "🔄"
+        changed = f" ({', '.join(event['changed'])})" if event['changed'] else ""
+        title = ' '.join(str(ad[field]) for field in ('brand', 'model', 'size') if ad.get(field))
+        place = '/'.join(ad[field] for field in ('city', 'state') if ad.get(field))
+        print(
+            f"{tag} {title or 'N/A'} | {price} | score {ad.get('resale_total_score')} | "
+            f"{place or 'N/A'}{changed}\n   {ad.get('post_url')}",
+            file=self.stream, flush=True
+        )
+
+
+class FileSink(AdSink):
+    """Acrescenta cada evento como uma linha JSON"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def emit(self, event: Dict[str, Any]):
+        self._file.write(self.dumps(event) + '\n')
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class WebhookSink(AdSink):
+    """POST JSON do evento; tenta de novo com backoff antes de desistir"""
+
+    def __init__(self, url: str, timeout: float = 10, retries: int = 3):
+        self.url = url
+        self.timeout = timeout
+        self.retries = retries
+        self.session = requests.Session()
+
+    def emit(self, event: Dict[str, Any]):
+        for attempt in range(self.retries + 1):
+            try:
+                response = self.session.post(
+                    self.url,
+                    data=self.dumps(event).encode('utf-8'),
+                    headers={'Content-Type': 'application/json'},
+                    timeout=self.timeout
+                )
+                response.raise_for_status()
+                return
+            except requests.RequestException as e:
+                if attempt == self.retries:
+                    raise
+                delay = 2 ** attempt
+                logger.warning(f"Webhook falhou ({e}); nova tentativa em {delay}s")
+                time.sleep(delay)
+
+    def close(self):
+        self.session.close()
+
+
+def build_sink(spec: Optional[str]) -> AdSink:
+    """
+    Destino a partir de uma especificação de linha de comando
+
+    Args:
+        spec: 'stdout' (default), 'file:<caminho>' ou URL http(s) do webhook
+
+    Returns:
+        AdSink
+    """
+    if not spec or spec == 'stdout':
+        return StdoutSink()
+    if spec.startswith('file:'):
+        return FileSink(spec[len('file:'):])
+    if spec.startswith(('http://', 'https://')):
+        return WebhookSink(spec)
+    raise ValueError(f"Destino desconhecido: {spec} (use stdout, file:<caminho> ou uma URL)")
+
+
+# ----------------------------------------------------------------------
+# Watcher
+# ----------------------------------------------------------------------
+
+class AdWatcher:
+    """
+    Acompanha o change stream de equipment_ads e notifica os anúncios que
+    passam nos critérios
+
+    Inserções notificam como 'new'; alterações só quando mudam um campo
+    dos critérios (ex: preço, score, disponibilidade), como 'updated'. O
+    filtro roda no servidor, sobre o documento atual (updateLookup).
+    """
+
+    STATE_COLLECTION = 'watch_state'
+
+    def __init__(
+        self,
+        db: MongoDBPersistence,
+        criteria: WatchCriteria,
+        sink: AdSink,
+        name: str = "default",
+        max_await_ms: int = 1000
+    ):
+        """
+        Args:
+            db: MongoDBPersistence
+            criteria: Filtro dos anúncios
+            sink: Destino dos eventos
+            name: Identifica o resume token (um por watcher)
+            max_await_ms: Espera máxima do servidor por eventos a cada volta
+        """
+        self.db = db
+        self.criteria = criteria
+        self.sink = sink
+        self.name = name
+        self.max_await_ms = max_await_ms
+        self.state = db.db[self.STATE_COLLECTION]
+        self._token = None
+        self._stop = threading.Event()
+
+    def pipeline(self) -> List[Dict]:
+        """Pipeline do change stream (filtro sobre fullDocument)"""
+        query = self.criteria.query()
+        triggers = [{'operationType': {'$in': ['insert', 'replace']}}] + [
+            {f'updateDescription.updatedFields.{field}': {'$exists': True}}
+            for field in query
+        ]
+        return [{'$match': {
+            'operationType': {'$in': ['insert', 'replace', 'update']},
+            **{f'fullDocument.{field}': condition for field, condition in query.items()},
+            '$or': triggers
+        }}]
+
+    @staticmethod
+    def event(change: Dict) -> Dict[str, Any]:
+        """Evento entregue ao destino a partir de uma mudança do stream"""
+        doc = change['fullDocument']
+        updated = change.get('updateDescription', {}).get('updatedFields', {})
+        return {
+            'reason': 'new' if change['operationType'] == 'insert' else 'updated',
+            'post_id': doc['post_id'],
+            'changed': sorted(
+                field for field in updated
+                if field not in (ContentHash.FIELD, 'analyzed_at')
+            ),
+            'ad': {field: doc.get(field) for field in StorageBackend.SUMMARY_FIELDS},
+            'detected_at': datetime.utcnow()
+        }
+
+    def stop(self):
+        """Pede para o run() terminar (seguro de outra thread)"""
+        self._stop.set()
+
+    def run(self, max_events: Optional[int] = None, idle_timeout: Optional[float] = None) -> int:
+        """
+        Acompanha o stream até stop(), max_events ou idle_timeout
+
+        O token só avança depois que o destino aceita o evento: se o
+        processo cair ou o destino falhar, o evento volta no próximo run().
+
+        Args:
+            max_events: Para depois de N eventos entregues
+            idle_timeout: Para depois de N segundos sem eventos
+
+        Returns:
+            Número de eventos entregues
+        """
+        self._token = self._load_token()
+        try:
+            return self._watch(max_events, idle_timeout)
+        except OperationFailure as e:
+            if e.code == CHANGE_STREAM_NOT_SUPPORTED:
+                raise RuntimeError(
+                    "Change streams exigem replica set (veja 'Watcher' no README)"
+                ) from e
+            if e.code != CHANGE_STREAM_HISTORY_LOST:
+                raise
+            # O oplog já descartou o ponto salvo: recomeça do momento atual
+            logger.error(f"Resume token do watcher '{self.name}' expirou; eventos anteriores perdidos")
+            self._save_token(None)
+            return self._watch(max_events, idle_timeout)
+
+    def _watch(self, max_events: Optional[int], idle_timeout: Optional[float]) -> int:
+        emitted = 0
+        idle_since = time.monotonic()
+        with self.db.db.equipment_ads.watch(
+            self.pipeline(),
+            full_document='updateLookup',
+            resume_after=self._token,
+            max_await_time_ms=self.max_await_ms
+        ) as stream:
+            logger.info(f"✓ Watcher '{self.name}' acompanhando equipment_ads: {asdict(self.criteria)}")
+            while stream.alive and not self._stop.is_set():
+                change = stream.try_next()
+                if change is None:
+                    # Token pós-lote: avança mesmo sem eventos que passem no filtro
+                    self._save_token(stream.resume_token)
+                    if idle_timeout and time.monotonic() - idle_since >= idle_timeout:
+                        break
+                    continue
+
+                idle_since = time.monotonic()
+                if change.get('fullDocument') is not None:
+                    self.sink.emit(self.event(change))
+                    emitted += 1
+                self._save_token(change['_id'])
+
+                if max_events and emitted >= max_events:
+                    break
+
+        return emitted
+
+    def _load_token(self) -> Optional[Dict]:
+        state = self.state.find_one({'_id': self.name})
+        return state.get('resume_token') if state else None
+
+    def _save_token(self, token: Optional[Dict]):
+        if token == self._token:
+            return
+        self.state.update_one(
+            {'_id': self.name},
+            {'$set': {'resume_token': token, 'updated_at': datetime.utcnow()}},
+            upsert=True
+        )
+        self._token = token